@@ -0,0 +1,139 @@
+"""
+Extracts selected members from downloaded zip archives.
+
+Only the members that are needed are extracted, each being streamed into a temporary
+('.part') file alongside its destination and renamed into place once its CRC has been
+verified. Members that have already been extracted, as judged by their size and CRC,
+are skipped.
+"""
+
+import concurrent.futures
+import functools
+import pathlib
+import shutil
+import typing
+import zipfile
+import zlib
+
+import themeda_preproc.utils
+
+
+def extract_archives(
+    archive_paths: typing.Sequence[pathlib.Path],
+    output_dir: pathlib.Path,
+    member_filter: typing.Callable[[str], bool],
+    n_workers: int = 4,
+    protect: bool = True,
+) -> list[pathlib.Path]:
+    """
+    Extracts the members of each archive whose filename passes `member_filter` into
+    `output_dir`, with the archives processed in parallel across `n_workers` threads.
+    The directory structure within the archives is not preserved. Returns the paths
+    to the extracted files.
+    """
+
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+        extracted = executor.map(
+            functools.partial(
+                extract_archive,
+                output_dir=output_dir,
+                member_filter=member_filter,
+                protect=protect,
+            ),
+            archive_paths,
+        )
+
+        output_paths = [
+            output_path
+            for archive_output_paths in extracted
+            for output_path in archive_output_paths
+        ]
+
+    return output_paths
+
+
+def extract_archive(
+    archive_path: pathlib.Path,
+    output_dir: pathlib.Path,
+    member_filter: typing.Callable[[str], bool],
+    protect: bool = True,
+) -> list[pathlib.Path]:
+    output_paths = []
+
+    with zipfile.ZipFile(file=archive_path) as archive:
+        for member_info in get_members(archive=archive, member_filter=member_filter):
+            output_path = output_dir / get_member_filename(member_info=member_info)
+
+            if not is_member_extracted(member_info=member_info, path=output_path):
+                extract_member(
+                    archive=archive,
+                    member_info=member_info,
+                    output_path=output_path,
+                )
+
+            if protect:
+                themeda_preproc.utils.protect_path(path=output_path)
+
+            output_paths.append(output_path)
+
+    return output_paths
+
+
+def get_members(
+    archive: zipfile.ZipFile,
+    member_filter: typing.Callable[[str], bool],
+) -> list[zipfile.ZipInfo]:
+    return [
+        member_info
+        for member_info in archive.infolist()
+        if not member_info.is_dir()
+        and member_filter(get_member_filename(member_info=member_info))
+    ]
+
+
+def get_member_filename(member_info: zipfile.ZipInfo) -> str:
+    # member names always use forward slashes
+    (*_, filename) = member_info.filename.split("/")
+    return filename
+
+
+def extract_member(
+    archive: zipfile.ZipFile,
+    member_info: zipfile.ZipInfo,
+    output_path: pathlib.Path,
+    chunk_size: int = 1024 * 1024,
+) -> None:
+    "Extracts a member into a temporary file, and renames it once complete"
+
+    partial_path = themeda_preproc.utils.get_partial_path(path=output_path)
+
+    # the CRC is checked by `zipfile` once the member has been read in full
+    with archive.open(member_info) as member, partial_path.open("wb") as handle:
+        shutil.copyfileobj(fsrc=member, fdst=handle, length=chunk_size)
+
+    partial_path.replace(target=output_path)
+
+
+def is_member_extracted(
+    member_info: zipfile.ZipInfo,
+    path: pathlib.Path,
+) -> bool:
+    if not path.exists():
+        return False
+
+    if path.stat().st_size != member_info.file_size:
+        return False
+
+    return get_crc32(path=path) == member_info.CRC
+
+
+def get_crc32(path: pathlib.Path, chunk_size: int = 1024 * 1024) -> int:
+    crc = 0
+
+    with path.open("rb") as handle:
+        for chunk in iter(functools.partial(handle.read, chunk_size), b""):
+            crc = zlib.crc32(chunk, crc)
+
+    return crc
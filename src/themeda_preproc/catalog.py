@@ -0,0 +1,333 @@
+"""
+Maintains an index of the GeoTIFF files in the `raw`, `prep`, and `chips` directories.
+
+Each file's header (transform, shape, CRS, datatype, and nodata value) is recorded
+alongside its data source, year, and grid reference (as determined from its path and
+bounds), so that subsequent stages can learn the geometry of chips without opening
+them. The index is stored as a parquet file in the `catalog` directory. Entries are
+considered current if the size and modification time of their file are unchanged;
+headers are only re-read for files that are new or have changed.
+"""
+
+import concurrent.futures
+import contextlib
+import functools
+import pathlib
+import typing
+
+import polars as pl
+
+import affine
+import rasterio
+import odc.geo
+import odc.geo.geobox
+
+import tqdm
+
+import themeda_preproc.chips
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+STAGES: typing.Final = ("raw", "prep", "chips")
+
+# the columns that together define the spatial footprint and pixel grid of a file
+GEOMETRY_COLUMNS: typing.Final = (
+    *(f"transform_{letter}" for letter in "abcdef"),
+    "height",
+    "width",
+    "crs",
+)
+
+
+def run(
+    base_output_dir: pathlib.Path,
+    cores: int = 4,
+    show_progress: bool = True,
+) -> None:
+    catalog = form_catalog(
+        base_output_dir=base_output_dir,
+        previous_catalog=load_catalog(base_output_dir=base_output_dir),
+        n_workers=cores,
+        show_progress=show_progress,
+    )
+
+    write_catalog(catalog=catalog, base_output_dir=base_output_dir)
+
+
+def get_catalog_path(base_output_dir: pathlib.Path) -> pathlib.Path:
+    return base_output_dir / "catalog" / "catalog.parquet"
+
+
+def load_catalog(
+    base_output_dir: pathlib.Path,
+) -> typing.Optional[pl.dataframe.frame.DataFrame]:
+    "Loads the catalog, if it has been formed"
+
+    catalog_path = get_catalog_path(base_output_dir=base_output_dir)
+
+    if not catalog_path.exists():
+        return None
+
+    return pl.read_parquet(source=catalog_path)
+
+
+def write_catalog(
+    catalog: pl.dataframe.frame.DataFrame,
+    base_output_dir: pathlib.Path,
+) -> None:
+    catalog_path = get_catalog_path(base_output_dir=base_output_dir)
+    catalog_path.parent.mkdir(exist_ok=True, parents=True)
+
+    partial_path = themeda_preproc.utils.get_partial_path(path=catalog_path)
+
+    catalog.write_parquet(file=partial_path)
+
+    partial_path.replace(target=catalog_path)
+
+
+def form_catalog(
+    base_output_dir: pathlib.Path,
+    previous_catalog: typing.Optional[pl.dataframe.frame.DataFrame] = None,
+    n_workers: int = 4,
+    show_progress: bool = True,
+) -> pl.dataframe.frame.DataFrame:
+    paths = [
+        path
+        for stage in STAGES
+        for path in sorted((base_output_dir / stage).rglob("*.tif"))
+    ]
+
+    catalog = get_entries(
+        paths=paths,
+        base_output_dir=base_output_dir,
+        catalog=previous_catalog,
+        n_workers=n_workers,
+        show_progress=show_progress,
+    )
+
+    return catalog
+
+
+def get_entries(
+    paths: typing.Sequence[pathlib.Path],
+    base_output_dir: pathlib.Path,
+    catalog: typing.Optional[pl.dataframe.frame.DataFrame] = None,
+    n_workers: int = 4,
+    show_progress: bool = False,
+) -> pl.dataframe.frame.DataFrame:
+    """
+    Returns the catalog entries for the given paths (in the same order), taking them
+    from `catalog` where they are current and otherwise reading the file headers
+    across a pool of `n_workers` threads.
+    """
+
+    current_rows: dict[str, dict[str, typing.Any]] = (
+        {}
+        if catalog is None
+        else {row["path"]: row for row in catalog.iter_rows(named=True)}
+    )
+
+    rows: list[typing.Optional[dict[str, typing.Any]]] = []
+    paths_to_read: dict[int, pathlib.Path] = {}
+
+    for i_path, path in enumerate(paths):
+        row = current_rows.get(
+            get_relative_path_str(path=path, base_output_dir=base_output_dir)
+        )
+
+        if row is not None and is_entry_current(entry=row, path=path):
+            rows.append(row)
+        else:
+            rows.append(None)
+            paths_to_read[i_path] = path
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=n_workers
+    ) as executor, contextlib.closing(
+        tqdm.tqdm(
+            iterable=None,
+            total=len(paths_to_read),
+            disable=not show_progress,
+        )
+    ) as progress_bar:
+        read_rows = executor.map(
+            functools.partial(read_entry, base_output_dir=base_output_dir),
+            paths_to_read.values(),
+        )
+
+        for i_path, row in zip(paths_to_read, read_rows):
+            rows[i_path] = row
+            progress_bar.update()
+
+    entries = pl.DataFrame(data=rows, schema=get_schema())
+
+    return entries
+
+
+def read_entry(
+    path: pathlib.Path,
+    base_output_dir: pathlib.Path,
+) -> dict[str, typing.Any]:
+    "Forms a catalog entry from a file's path and header"
+
+    stat = path.stat()
+
+    with rasterio.open(path) as handle:
+        transform = handle.transform
+        (height, width) = handle.shape
+        crs = None if handle.crs is None else handle.crs.to_wkt()
+        (dtype, *_) = handle.dtypes
+        nodata = handle.nodata
+
+    (stage, roi_name, source_name, year) = parse_path(
+        path=path,
+        base_output_dir=base_output_dir,
+    )
+
+    grid_ref = get_grid_ref(transform=transform, height=height, width=width)
+
+    entry = {
+        "path": get_relative_path_str(path=path, base_output_dir=base_output_dir),
+        "stage": stage,
+        "roi_name": roi_name,
+        "source_name": source_name,
+        "year": year,
+        "grid_ref_x": None if grid_ref is None else grid_ref.x,
+        "grid_ref_y": None if grid_ref is None else grid_ref.y,
+        **{f"transform_{letter}": getattr(transform, letter) for letter in "abcdef"},
+        "height": height,
+        "width": width,
+        "crs": crs,
+        "dtype": dtype,
+        "nodata": nodata,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+    return entry
+
+
+def parse_path(
+    path: pathlib.Path,
+    base_output_dir: pathlib.Path,
+) -> tuple[str, typing.Optional[str], str, typing.Optional[int]]:
+    """
+    Determines the stage, ROI name (if applicable), data source name, and year (if
+    applicable) from a path like `${STAGE}/[roi_${ROI}/]${SOURCE}/[${YEAR}/]*.tif`.
+    """
+
+    (stage, *parts) = path.relative_to(base_output_dir).parts
+
+    roi_name = None
+
+    if parts[0].startswith("roi_"):
+        (roi_dir, *parts) = parts
+        roi_name = roi_dir.removeprefix("roi_")
+
+    (source_name, *subdirs, _) = parts
+
+    year = None
+
+    if subdirs:
+        with contextlib.suppress(ValueError):
+            year = themeda_preproc.utils.num_str_to_int(num_str=subdirs[-1])
+
+    return (stage, roi_name, source_name, year)
+
+
+def get_grid_ref(
+    transform: affine.Affine,
+    height: int,
+    width: int,
+) -> typing.Optional[themeda_preproc.chips.GridRef]:
+    "Gets the grid reference of a raster, if it has the extent of a DEA chip"
+
+    chip_size_m = themeda_preproc.chips.CHIP_SIZE_M
+
+    if (abs(transform.a) * width, abs(transform.e) * height) != (
+        chip_size_m,
+        chip_size_m,
+    ):
+        return None
+
+    (left, bottom) = transform * (0, height)
+
+    try:
+        return themeda_preproc.chips.get_grid_ref_from_bounds(left=left, bottom=bottom)
+    except ValueError:
+        return None
+
+
+def query(
+    catalog: pl.dataframe.frame.DataFrame,
+    stage: typing.Optional[str] = None,
+    roi_name: typing.Optional[themeda_preproc.roi.ROIName] = None,
+    source_name: typing.Optional[themeda_preproc.source.DataSourceName] = None,
+    year: typing.Optional[int] = None,
+    grid_ref: typing.Optional[themeda_preproc.chips.GridRef] = None,
+) -> pl.dataframe.frame.DataFrame:
+    "Returns the catalog entries that match all the provided criteria"
+
+    criteria = {
+        "stage": stage,
+        "roi_name": None if roi_name is None else roi_name.value,
+        "source_name": None if source_name is None else source_name.value,
+        "year": year,
+        "grid_ref_x": None if grid_ref is None else grid_ref.x,
+        "grid_ref_y": None if grid_ref is None else grid_ref.y,
+    }
+
+    for column, value in criteria.items():
+        if value is not None:
+            catalog = catalog.filter(pl.col(column) == value)
+
+    return catalog
+
+
+def get_geobox(entry: dict[str, typing.Any]) -> odc.geo.geobox.GeoBox:
+    "Forms the geobox described by a catalog entry"
+
+    return odc.geo.geobox.GeoBox(
+        shape=(entry["height"], entry["width"]),
+        affine=affine.Affine(
+            *[entry[f"transform_{letter}"] for letter in "abcdef"],
+        ),
+        crs=odc.geo.CRS(entry["crs"]),
+    )
+
+
+def is_entry_current(entry: dict[str, typing.Any], path: pathlib.Path) -> bool:
+    if not path.exists():
+        return False
+
+    stat = path.stat()
+
+    return bool(stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"])
+
+
+def get_relative_path_str(path: pathlib.Path, base_output_dir: pathlib.Path) -> str:
+    return path.relative_to(base_output_dir).as_posix()
+
+
+def get_schema() -> dict[str, typing.Union[pl.Int64, pl.Float64, pl.Utf8]]:
+    schema = {
+        "path": pl.Utf8,
+        "stage": pl.Utf8,
+        "roi_name": pl.Utf8,
+        "source_name": pl.Utf8,
+        "year": pl.Int64,
+        "grid_ref_x": pl.Int64,
+        "grid_ref_y": pl.Int64,
+        **{f"transform_{letter}": pl.Float64 for letter in "abcdef"},
+        "height": pl.Int64,
+        "width": pl.Int64,
+        "crs": pl.Utf8,
+        "dtype": pl.Utf8,
+        "nodata": pl.Float64,
+        "size": pl.Int64,
+        "mtime_ns": pl.Int64,
+    }
+
+    return schema
@@ -1,17 +1,24 @@
+import contextlib
 import pathlib
 import functools
 import multiprocessing
-import multiprocessing.synchronize
+import typing
 
 import numpy as np
+import numpy.typing as npt
 
-import rioxarray.merge
+import xarray as xr
+
+import rioxarray  # noqa
+
+import odc.geo.xr  # noqa
 
 import polars as pl
 
 import tqdm
 
 import themeda_preproc.roi
+import themeda_preproc.chips
 import themeda_preproc.chiplets
 import themeda_preproc.chiplet_table
 import themeda_preproc.source
@@ -24,6 +31,7 @@ def run(
     base_output_dir: pathlib.Path,
     cores: int,
     base_size_pix: int = 160,
+    codec: themeda_preproc.chips.Codec = themeda_preproc.chips.Codec.LZW,
     protect: bool = True,
     show_progress: bool = True,
 ) -> None:
@@ -50,138 +58,190 @@ def run(
 
     years = sorted([chiplet_file_info.year for chiplet_file_info in chiplets_file_info])
 
+    # each task is the conversion of the chiplets within a single chip for a year
+    tasks = [
+        (year, grid_ref, chip_table)
+        for year in years
+        for (grid_ref, chip_table) in partition_table(table=table).items()
+    ]
+
+    func = functools.partial(
+        convert_chip_chiplets,
+        n_chiplets=len(table),
+        base_output_dir=base_output_dir,
+        source_name=source_name,
+        roi_name=roi_name,
+        base_size_pix=base_size_pix,
+        codec=codec,
+        protect=protect,
+    )
+
     # see https://pola-rs.github.io/polars-book/user-guide/misc/multiprocessing/
     mp = multiprocessing.get_context(method="spawn")
 
-    with mp.Manager() as manager:
-        lock = manager.RLock()
+    with mp.Pool(processes=cores) as pool, contextlib.closing(
+        tqdm.tqdm(iterable=None, total=len(tasks), disable=not show_progress)
+    ) as progress_bar:
+        for _ in pool.imap_unordered(func, tasks, chunksize=4):
+            progress_bar.update()
 
-        func = functools.partial(
-            convert_year_chiplets,
-            base_output_dir=base_output_dir,
-            source_name=source_name,
-            roi_name=roi_name,
-            table=table,
-            base_size_pix=base_size_pix,
-            protect=protect,
-            show_progress=show_progress,
-        )
-
-        with mp.Pool(
-            processes=cores,
-            initializer=tqdm.tqdm.set_lock,
-            initargs=(lock,),
-        ) as pool:
-            pool.starmap(func, enumerate(years), chunksize=1)
-
-
-def convert_year_chiplets(
-    progress_bar_position: int,
-    year: int,
+
+def partition_table(
+    table: pl.dataframe.frame.DataFrame,
+) -> dict[themeda_preproc.chips.GridRef, pl.dataframe.frame.DataFrame]:
+    "Splits the chiplet table into the rows for each chip"
+
+    partitions = table.partition_by(
+        ["chip_grid_ref_x_base", "chip_grid_ref_y_base"],
+        as_dict=True,
+    )
+
+    chip_tables = {
+        themeda_preproc.chips.GridRef(x=x, y=y): chip_table
+        for ((x, y), chip_table) in sorted(partitions.items())
+    }
+
+    return chip_tables
+
+
+def convert_chip_chiplets(
+    task: tuple[int, themeda_preproc.chips.GridRef, pl.dataframe.frame.DataFrame],
+    n_chiplets: int,
     base_output_dir: pathlib.Path,
     source_name: themeda_preproc.source.DataSourceName,
     roi_name: themeda_preproc.roi.ROIName,
-    table: pl.dataframe.frame.DataFrame,
     base_size_pix: int,
+    codec: themeda_preproc.chips.Codec,
     protect: bool,
-    show_progress: bool,
 ) -> None:
+    (year, grid_ref, chip_table) = task
+
     pad_size_pix = 0
     crs = 3577
     nodata = themeda_preproc.source.DATA_SOURCE_NODATA[source_name]
     if themeda_preproc.source.DATA_SOURCE_DTYPE[source_name] == np.float16:
         nodata = np.float32(nodata)
 
-    with themeda_preproc.chiplets.chiplets_reader(
+    output_path = get_chiplet_geotiff_path(
         source_name=source_name,
         year=year,
+        chip_x=grid_ref.x,
+        chip_y=grid_ref.y,
         roi_name=roi_name,
-        base_size_pix=base_size_pix,
-        pad_size_pix=pad_size_pix,
         base_output_dir=base_output_dir,
-    ) as chiplets:
-        chip_xys = table.select(
-            ["chip_grid_ref_x_base", "chip_grid_ref_y_base"]
-        ).unique()
-
-        progress_bar = tqdm.tqdm(
-            iterable=None,
-            total=len(chip_xys),
-            disable=not show_progress,
-            position=progress_bar_position,
-            desc=str(year),
-            leave=False,
-            dynamic_ncols=True,
-        )
-
-        for chip_xy_row in chip_xys.iter_rows(named=True):
-            table_rows = table.filter(
-                (pl.col("chip_grid_ref_x_base") == chip_xy_row["chip_grid_ref_x_base"])
-                & (
-                    pl.col("chip_grid_ref_y_base")
-                    == chip_xy_row["chip_grid_ref_y_base"]
-                )
-            )
-
-            output_path = get_chiplet_geotiff_path(
-                source_name=source_name,
-                year=year,
-                chip_x=chip_xy_row["chip_grid_ref_x_base"],
-                chip_y=chip_xy_row["chip_grid_ref_y_base"],
-                roi_name=roi_name,
-                base_output_dir=base_output_dir,
-            )
-
-            if not themeda_preproc.utils.is_path_existing_and_read_only(
-                path=output_path
-            ):
-                data_arrays = []
-
-                for row in table_rows.iter_rows(named=True):
-                    chiplet = chiplets[row["index"], ...]
-
-                    data_array = themeda_preproc.chiplets.convert_chiplet_to_data_array(
-                        chiplet=chiplet,
-                        metadata=row,
-                        pad_size_pix=pad_size_pix,
-                        base_size_pix=base_size_pix,
-                        crs=crs,
-                        nodata=nodata,
-                    )
-
-                    if themeda_preproc.source.DATA_SOURCE_DTYPE[source_name] == (
-                        np.float16
-                    ):
-                        data_array = data_array.astype(np.float32)
-
-                    data_arrays.append(data_array)
-
-                data = rioxarray.merge.merge_arrays(
-                    dataarrays=data_arrays,
-                    nodata=themeda_preproc.source.DATA_SOURCE_SENTINEL[source_name],
-                )
-
-                data.rio.set_crs(input_crs=crs, inplace=True)
-                data.rio.set_nodata(input_nodata=nodata, inplace=True)
-
-                data = data.odc.assign_crs(crs=data.rio.crs)
-
-                data.rio.to_raster(
-                    raster_path=output_path,
-                    compress="lzw",
-                )
-
-                data.close()
-
-                for data_array in data_arrays:
-                    data_array.close()
-
-                if protect:
-                    themeda_preproc.utils.protect_path(path=output_path)
+    )
 
-            progress_bar.update()
+    if themeda_preproc.utils.is_path_existing_and_read_only(path=output_path):
+        return
+
+    chiplets = np.memmap(
+        filename=themeda_preproc.chiplets.get_chiplet_path(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+            base_output_dir=base_output_dir,
+            denan=True,
+        ),
+        dtype=themeda_preproc.source.DATA_SOURCE_DTYPE[source_name],
+        mode="r",
+        shape=(n_chiplets,) + (base_size_pix,) * 2,
+    )
+
+    data = assemble_chip(
+        chiplets=chiplets,
+        chip_table=chip_table,
+        base_size_pix=base_size_pix,
+        fill_value=themeda_preproc.source.DATA_SOURCE_SENTINEL[source_name],
+    )
+
+    # close the handle
+    # see https://github.com/numpy/numpy/issues/13510
+    assert hasattr(chiplets, "_mmap")
+    chiplets._mmap.close()
+
+    if data.dtype == np.float16:
+        data = data.astype(np.float32)
+
+    data.rio.set_crs(input_crs=crs, inplace=True)
+    data.rio.set_nodata(input_nodata=nodata, inplace=True)
+
+    data = data.odc.assign_crs(crs=data.rio.crs)
+
+    themeda_preproc.chips.write_chip(
+        chip=data,
+        path=output_path,
+        resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[source_name],
+        codec=codec,
+        # the chips are already being written in parallel
+        n_threads=1,
+    )
+
+    data.close()
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=output_path)
+
+
+def assemble_chip(
+    chiplets: npt.NDArray,
+    chip_table: pl.dataframe.frame.DataFrame,
+    base_size_pix: int,
+    fill_value: typing.Union[int, float],
+) -> xr.DataArray:
+    """
+    Forms the raster covering the extent of the chiplets within a chip, by placing
+    each (unpadded) chiplet at its position in the chip. Any locations without a
+    chiplet are set to `fill_value`.
+    """
+
+    i_x_bases = chip_table["chip_i_x_base"].to_numpy()
+    i_y_bases = chip_table["chip_i_y_base"].to_numpy()
+
+    (i_x_start, i_y_start) = (i_x_bases.min(), i_y_bases.min())
+
+    data = np.full(
+        shape=(
+            i_y_bases.max() + base_size_pix - i_y_start,
+            i_x_bases.max() + base_size_pix - i_x_start,
+        ),
+        fill_value=fill_value,
+        dtype=chiplets.dtype,
+    )
+
+    # read the chiplets in index order, which is their order on disk
+    chip_table = chip_table.sort(by="index")
+
+    chip_chiplets = chiplets[chip_table["index"].to_numpy()]
+
+    for chiplet, i_x_base, i_y_base in zip(
+        chip_chiplets,
+        chip_table["chip_i_x_base"].to_numpy() - i_x_start,
+        chip_table["chip_i_y_base"].to_numpy() - i_y_start,
+    ):
+        data[
+            i_y_base : i_y_base + base_size_pix,
+            i_x_base : i_x_base + base_size_pix,
+        ] = chiplet
+
+    # this goes from the index space of the *chip* to coordinates
+    transform = themeda_preproc.chiplets.get_transform_from_row(
+        row=chip_table.row(0, named=True)
+    )
+
+    (n_y, n_x) = data.shape
+
+    # the chip transform has no rotation, so each axis can be transformed separately
+    (x, _) = transform * (np.arange(i_x_start, i_x_start + n_x) + 0.5, 0.5)
+    (_, y) = transform * (0.5, np.arange(i_y_start, i_y_start + n_y) + 0.5)
+
+    data_array = xr.DataArray(
+        data=data,
+        dims=("y", "x"),
+        coords={"x": x, "y": y},
+    )
 
-    progress_bar.close()
+    return data_array
 
 
 def get_chiplet_geotiff_path(
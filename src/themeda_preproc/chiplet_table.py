@@ -1,12 +1,14 @@
 import typing
 import contextlib
 import collections
+import dataclasses
+import hashlib
+import json
 import pathlib
 import types
 
 import numpy as np
-
-import xarray as xr
+import numpy.typing as npt
 
 import polars as pl
 
@@ -15,14 +17,42 @@ import tqdm
 import shapely
 import affine
 
+import odc.geo.geobox
+
 import themeda_preproc.roi
 import themeda_preproc.chips
+import themeda_preproc.land_cover.utils
+import themeda_preproc.utils
+
+
+# the tables that have been loaded in this process, keyed by their path and the size
+# and modification time of their file
+TABLE_CACHE: typing.Final[
+    dict[tuple[pathlib.Path, int, int], pl.dataframe.frame.DataFrame]
+] = {}
+
+
+@dataclasses.dataclass(frozen=True)
+class Lattice:
+    """
+    A dense lookup from position on the regular grid of chiplets to chiplet index (or
+    -1, where there is no chiplet), with a border of one position around the chiplets.
+    Position (row, column) on the grid is at `indices[row - row_offset, column -
+    col_offset]`, with rows increasing southwards.
+    """
+
+    indices: npt.NDArray[np.int64]
+    col_offset: int
+    row_offset: int
+    pixel_size_m: float
+    base_size_pix: int
 
 
 def run(
     roi_name: themeda_preproc.roi.ROIName,
     base_output_dir: pathlib.Path,
     pad_size_pix: int,
+    base_size_pix: int = 160,
     protect: bool = True,
     show_progress: bool = True,
 ) -> None:
@@ -48,37 +78,13 @@ def run(
         pad_size_pix=pad_size_pix,
     )
 
-    ref_data_source = "land_cover"
-
-    ref_chips_base_dir = (
-        base_output_dir / "chips" / f"roi_{roi_name.value}" / ref_data_source
-    )
-
-    (ref_year, *_) = sorted(
-        [
-            ref_chip_year_path
-            for ref_chip_year_path in ref_chips_base_dir.glob("*")
-            if ref_chip_year_path.is_dir()
-        ]
-    )
-
-    ref_chips_dir = ref_chips_base_dir / ref_year
-
-    ref_chips_paths = sorted(
-        [ref_chip_path for ref_chip_path in ref_chips_dir.glob("*.tif")]
+    ref_geoboxes = themeda_preproc.land_cover.utils.load_reference_geoboxes(
+        base_output_dir=base_output_dir,
+        roi_name=roi_name,
     )
 
-    ref_chips: list[xr.DataArray] = [
-        themeda_preproc.chips.read_chip(
-            path=ref_chip_path,
-            chunks="auto",
-            load_data=False,
-        )
-        for ref_chip_path in ref_chips_paths
-    ]
-
     table = form_chiplet_table(
-        chips=ref_chips,
+        geoboxes=list(ref_geoboxes.values()),
         roi=roi,
         pad_size_pix=pad_size_pix,
         rand_seed=rand_seed,
@@ -87,8 +93,27 @@ def run(
 
     table.write_parquet(file=table_path)
 
+    # form the lattice lookup alongside the table, now that the table is complete
+    (lattice_path, lattice_info_path) = get_lattice_paths(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    write_lattice(
+        lattice=get_lattice(table=table, base_size_pix=base_size_pix),
+        lattice_path=lattice_path,
+        info_path=lattice_info_path,
+        key=get_lattice_key(table_path=table_path, base_size_pix=base_size_pix),
+    )
+
+    table_info_path = get_table_info_path(table_path=table_path)
+
+    write_table_info(table=table, table_path=table_path, info_path=table_info_path)
+
     if protect:
-        themeda_preproc.utils.protect_path(path=table_path)
+        for path in [table_path, table_info_path, lattice_path, lattice_info_path]:
+            themeda_preproc.utils.protect_path(path=path)
 
 
 def get_table_path(
@@ -123,13 +148,97 @@ def load_table(
         pad_size_pix=pad_size_pix,
     )
 
-    table = pl.read_parquet(source=table_path)
+    stat = table_path.stat()
+
+    key = (table_path, stat.st_size, stat.st_mtime_ns)
+
+    if key not in TABLE_CACHE:
+        # only keep the current version of each table
+        for outdated_key in [
+            cached_key for cached_key in TABLE_CACHE if cached_key[0] == table_path
+        ]:
+            del TABLE_CACHE[outdated_key]
+
+        TABLE_CACHE[key] = pl.read_parquet(source=table_path)
+
+    # a (cheap) copy, so that the cached table is not changed by any modifications
+    table = TABLE_CACHE[key].clone()
 
     return table
 
 
+def clear_table_cache() -> None:
+    "Removes all the tables that have been loaded in this process from the cache"
+
+    TABLE_CACHE.clear()
+
+
+def get_n_chiplets(
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int,
+) -> int:
+    """
+    Gets the number of chiplets in a table from the info file alongside the table, so
+    that the table itself does not need to be read. The info file is formed if it is
+    absent or if the table has changed since it was formed.
+    """
+
+    table_path = get_table_path(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    info_path = get_table_info_path(table_path=table_path)
+
+    info = load_info(info_path=info_path)
+
+    if info is None or info["key"] != get_table_key(table_path=table_path):
+        table = load_table(
+            roi_name=roi_name,
+            base_output_dir=base_output_dir,
+            pad_size_pix=pad_size_pix,
+        )
+
+        write_table_info(table=table, table_path=table_path, info_path=info_path)
+
+        return len(table)
+
+    n_chiplets: int = info["n_chiplets"]
+
+    return n_chiplets
+
+
+def write_table_info(
+    table: pl.dataframe.frame.DataFrame,
+    table_path: pathlib.Path,
+    info_path: pathlib.Path,
+) -> None:
+    info = {"key": get_table_key(table_path=table_path), "n_chiplets": len(table)}
+
+    # replace rather than overwrite, as a previous info file may be protected, and
+    # so that readers in other processes never see a missing or partial file
+    with themeda_preproc.utils.replacing_path(path=info_path) as temp_path:
+        temp_path.write_text(json.dumps(info))
+
+
+def get_table_key(table_path: pathlib.Path) -> str:
+    "Forms a key that changes if the chiplet table changes"
+
+    stat = table_path.stat()
+
+    inputs = {"table": (table_path.name, stat.st_size, stat.st_mtime_ns)}
+
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def get_table_info_path(table_path: pathlib.Path) -> pathlib.Path:
+    return table_path.with_suffix(".json")
+
+
 def form_chiplet_table(
-    chips: list[xr.DataArray],
+    geoboxes: list[odc.geo.geobox.GeoBox],
     roi: themeda_preproc.roi.RegionOfInterest,
     pad_size_pix: int,
     rand_seed: int,
@@ -140,16 +249,16 @@ def form_chiplet_table(
     with contextlib.closing(
         tqdm.tqdm(
             iterable=None,
-            total=len(chips),
+            total=len(geoboxes),
             disable=not show_progress,
         )
     ) as progress_bar:
         items = []
 
-        for chip in chips:
+        for geobox in geoboxes:
             items.append(
                 form_chiplet_table_entry(
-                    chip=chip,
+                    geobox=geobox,
                     roi=roi,
                     base_size_pix=base_size_pix,
                     pad_size_pix=pad_size_pix,
@@ -187,14 +296,17 @@ def form_chiplet_table(
 
 
 def form_chiplet_table_entry(
-    chip: xr.DataArray,
+    geobox: odc.geo.geobox.GeoBox,
     roi: themeda_preproc.roi.RegionOfInterest,
     base_size_pix: int,
     pad_size_pix: int,
 ) -> pl.dataframe.frame.DataFrame:
-    chip_transform = chip.rio.transform()
+    chip_transform = geobox.affine
 
-    chip_grid_ref = themeda_preproc.chips.get_grid_ref_from_chip(chip=chip)
+    chip_grid_ref = themeda_preproc.chips.get_grid_ref_from_bounds(
+        left=geobox.boundingbox.left,
+        bottom=geobox.boundingbox.bottom,
+    )
 
     schema = get_schema()
 
@@ -210,14 +322,12 @@ def form_chiplet_table_entry(
         },
     }
 
-    roi_contains_chip = roi.shape.contains(
-        other=chip.odc.geobox.boundingbox.polygon.geom
-    )
+    roi_contains_chip = roi.shape.contains(other=geobox.boundingbox.polygon.geom)
 
     rows = []
 
-    for chip_i_x_base in range(0, chip.sizes["x"], base_size_pix):
-        for chip_i_y_base in range(0, chip.sizes["y"], base_size_pix):
+    for chip_i_x_base in range(0, geobox.width, base_size_pix):
+        for chip_i_y_base in range(0, geobox.height, base_size_pix):
             (base_bbox, padded_bbox) = (
                 get_bbox(
                     i_x_base=chip_i_x_base,
@@ -335,3 +445,270 @@ def get_rand_seed(roi_name: themeda_preproc.roi.ROIName, pad_size_pix: int) -> i
     )
 
     return rand_seed_lut[(roi_name.value, pad_size_pix)]
+
+
+def get_lattice_coords(
+    table: pl.dataframe.frame.DataFrame,
+    base_size_pix: int = 160,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Gets the position of each chiplet (ordered by its index) on the regular grid that
+    the chiplets all sit on, as (column, row) arrays. Rows increase southwards.
+    """
+
+    table = table.sort(by="index")
+
+    (pixel_size_m,) = table["chip_transform_i_to_coords_coeff_a"].unique()
+
+    chiplet_size_m = pixel_size_m * base_size_pix
+
+    if not float(chiplet_size_m).is_integer():
+        raise ValueError("Unexpected chiplet size")
+
+    chiplet_size_m = int(chiplet_size_m)
+
+    (left, top) = (table[column].to_numpy() for column in ["bbox_left", "bbox_top"])
+
+    if np.any(left % chiplet_size_m != 0) or np.any(top % chiplet_size_m != 0):
+        raise ValueError("Chiplets are not aligned to a regular grid")
+
+    i_col = (left // chiplet_size_m).astype(np.int64)
+    i_row = (-top // chiplet_size_m).astype(np.int64)
+
+    return (i_col, i_row)
+
+
+def get_lattice(
+    table: pl.dataframe.frame.DataFrame,
+    base_size_pix: int = 160,
+) -> Lattice:
+    "Forms the lattice lookup for the chiplets in a table"
+
+    (i_col, i_row) = get_lattice_coords(table=table, base_size_pix=base_size_pix)
+
+    if len(set(zip(i_col.tolist(), i_row.tolist()))) != len(i_col):
+        raise ValueError("Multiple chiplets at the same position")
+
+    col_offset = int(i_col.min()) - 1
+    row_offset = int(i_row.min()) - 1
+
+    indices = np.full(
+        shape=(i_row.max() - row_offset + 2, i_col.max() - col_offset + 2),
+        fill_value=-1,
+        dtype=np.int64,
+    )
+
+    indices[i_row - row_offset, i_col - col_offset] = np.sort(table["index"])
+
+    (pixel_size_m,) = table["chip_transform_i_to_coords_coeff_a"].unique()
+
+    return Lattice(
+        indices=indices,
+        col_offset=col_offset,
+        row_offset=row_offset,
+        pixel_size_m=float(pixel_size_m),
+        base_size_pix=base_size_pix,
+    )
+
+
+def load_lattice(
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int = 0,
+    base_size_pix: int = 160,
+) -> Lattice:
+    """
+    Loads the lattice lookup for a chiplet table, after forming it if it is absent or
+    outdated. The lookup is memory-mapped (read-only), so it can be shared across
+    processes without copying.
+    """
+
+    table_path = get_table_path(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    (lattice_path, info_path) = get_lattice_paths(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    key = get_lattice_key(table_path=table_path, base_size_pix=base_size_pix)
+
+    info = load_info(info_path=info_path)
+
+    if info is None or info["key"] != key or not lattice_path.exists():
+        lattice = get_lattice(
+            table=load_table(
+                roi_name=roi_name,
+                base_output_dir=base_output_dir,
+                pad_size_pix=pad_size_pix,
+            ),
+            base_size_pix=base_size_pix,
+        )
+
+        info = write_lattice(
+            lattice=lattice,
+            lattice_path=lattice_path,
+            info_path=info_path,
+            key=key,
+        )
+
+    lattice = Lattice(
+        indices=np.load(file=lattice_path, mmap_mode="r"),
+        col_offset=info["col_offset"],
+        row_offset=info["row_offset"],
+        pixel_size_m=info["pixel_size_m"],
+        base_size_pix=info["base_size_pix"],
+    )
+
+    return lattice
+
+
+def write_lattice(
+    lattice: Lattice,
+    lattice_path: pathlib.Path,
+    info_path: pathlib.Path,
+    key: str,
+) -> dict[str, typing.Any]:
+    """
+    Writes the lattice lookup and then its info file, each via a uniquely-named file
+    that replaces the previous version - as readers in several processes may form the
+    lookup at the same time.
+    """
+
+    with themeda_preproc.utils.replacing_path(path=lattice_path) as temp_path:
+        with temp_path.open("wb") as handle:
+            np.save(file=handle, arr=lattice.indices)
+
+    info = {
+        "key": key,
+        "col_offset": lattice.col_offset,
+        "row_offset": lattice.row_offset,
+        "pixel_size_m": lattice.pixel_size_m,
+        "base_size_pix": lattice.base_size_pix,
+    }
+
+    with themeda_preproc.utils.replacing_path(path=info_path) as temp_path:
+        temp_path.write_text(json.dumps(info))
+
+    return info
+
+
+def load_info(
+    info_path: pathlib.Path,
+) -> typing.Optional[dict[str, typing.Any]]:
+    "Loads an info file, if it exists and is complete"
+
+    with contextlib.suppress(FileNotFoundError, json.JSONDecodeError):
+        info: dict[str, typing.Any] = json.loads(info_path.read_text())
+        return info
+
+    return None
+
+
+def get_lattice_key(table_path: pathlib.Path, base_size_pix: int) -> str:
+    "Forms a key that changes if the chiplet table or the chiplet size change"
+
+    stat = table_path.stat()
+
+    inputs = {
+        "table": (table_path.name, stat.st_size, stat.st_mtime_ns),
+        "base_size_pix": base_size_pix,
+    }
+
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def get_lattice_paths(
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int,
+) -> tuple[pathlib.Path, pathlib.Path]:
+    "Gets the paths to the lattice lookup and its info file, alongside the table"
+
+    table_path = get_table_path(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    lattice_stem = f"chiplet_lattice_roi_{roi_name.value}_pad_{pad_size_pix}"
+
+    return (
+        table_path.with_name(f"{lattice_stem}.npy"),
+        table_path.with_name(f"{lattice_stem}.json"),
+    )
+
+
+def get_point_locations(
+    lattice: Lattice,
+    x: npt.NDArray[np.float64],
+    y: npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Gets the index of the (unpadded) chiplet that contains each point, given in the
+    coordinates of the chiplet table, and the row and column of the pixel within the
+    chiplet that contains the point. Points that are not within a chiplet have an
+    index of -1.
+    """
+
+    # the position on the lattice, and the position within the chiplet, in pixels
+    (i_col, i_col_pix) = np.divmod(
+        np.floor(x / lattice.pixel_size_m), lattice.base_size_pix
+    )
+    (i_row, i_row_pix) = np.divmod(
+        np.floor(-y / lattice.pixel_size_m), lattice.base_size_pix
+    )
+
+    i_lattice_col = i_col.astype(np.int64) - lattice.col_offset
+    i_lattice_row = i_row.astype(np.int64) - lattice.row_offset
+
+    (n_lattice_rows, n_lattice_cols) = lattice.indices.shape
+
+    is_in_lattice = (
+        (i_lattice_col >= 0)
+        & (i_lattice_col < n_lattice_cols)
+        & (i_lattice_row >= 0)
+        & (i_lattice_row < n_lattice_rows)
+    )
+
+    indices = np.full(shape=len(x), fill_value=-1, dtype=np.int64)
+
+    indices[is_in_lattice] = lattice.indices[
+        i_lattice_row[is_in_lattice], i_lattice_col[is_in_lattice]
+    ]
+
+    return (indices, i_row_pix.astype(np.int64), i_col_pix.astype(np.int64))
+
+
+def get_neighbour_indices(lattice: Lattice) -> npt.NDArray[np.int64]:
+    """
+    Gets the indices of the chiplets in the 3x3 neighbourhood of each chiplet, as an
+    array of shape (n_chiplets, 3, 3) where the second and third axes are the row
+    (north to south) and column (west to east) offsets. The centre of each
+    neighbourhood is the chiplet itself, and neighbours that are not in the table
+    have an index of -1.
+    """
+
+    indices = np.asarray(lattice.indices)
+
+    # the lattice positions of the chiplets, in index order
+    (i_row, i_col) = np.nonzero(indices >= 0)
+    order = np.argsort(indices[i_row, i_col])
+    (i_row, i_col) = (i_row[order], i_col[order])
+
+    neighbour_indices = np.stack(
+        [
+            np.stack(
+                [indices[i_row + d_row, i_col + d_col] for d_col in [-1, 0, 1]],
+                axis=-1,
+            )
+            for d_row in [-1, 0, 1]
+        ],
+        axis=-2,
+    )
+
+    return neighbour_indices
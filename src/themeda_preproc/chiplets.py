@@ -1,10 +1,15 @@
 import pathlib
 import typing
+import os
+import collections
+import threading
+import types
 import multiprocessing
 import multiprocessing.synchronize
 import functools
 import dataclasses
 import contextlib
+import math
 
 import numpy as np
 import numpy.typing as npt
@@ -15,6 +20,8 @@ import polars as pl
 
 import affine
 
+import numba
+
 import tqdm
 
 import themeda_preproc.source
@@ -22,9 +29,28 @@ import themeda_preproc.roi
 import themeda_preproc.chips
 import themeda_preproc.packet
 import themeda_preproc.chiplet_table
+import themeda_preproc.pad_chiplets
 import themeda_preproc.utils
 
 
+# the data sources whose values fit within two bits, and so can be stored packed
+PACKABLE_SOURCES: typing.Final = (
+    themeda_preproc.source.DataSourceName.FIRE_SCAR_EARLY,
+    themeda_preproc.source.DataSourceName.FIRE_SCAR_LATE,
+)
+
+PACKED_BITS: typing.Final = 2
+PACKED_PIX_PER_BYTE: typing.Final = 8 // PACKED_BITS
+
+# the bit position of each pixel within a packed byte
+PACKED_SHIFTS: typing.Final = np.arange(0, 8, PACKED_BITS, dtype=np.uint8)
+
+# the largest finite float16 value, and the exponent (as from `math.frexp`) of the
+# smallest normal float16 value
+FLOAT16_MAX: typing.Final = float(np.finfo(np.float16).max)
+FLOAT16_MIN_EXPONENT: typing.Final = -13
+
+
 @dataclasses.dataclass(frozen=True)
 class ChipletFilenameInfo:
     path: pathlib.Path
@@ -33,6 +59,228 @@ class ChipletFilenameInfo:
     pad_size_pix: int
     year: int
     denan: bool = False
+    packed: bool = False
+
+
+@dataclasses.dataclass(frozen=True)
+class PaddedChiplets:
+    """
+    Padded chiplets that are assembled, when indexed, from unpadded chiplets with
+    the padding taken from each chiplet's neighbours (see
+    `chiplet_table.get_neighbour_indices`). Padding from outside the chiplet set
+    (i.e., outside the ROI) is filled with `nodata`. Indexing with an array of
+    indices gathers the batch with a single read of the unpadded chiplets.
+    """
+
+    chiplets: npt.NDArray[typing.Any]
+    neighbour_indices: npt.NDArray[np.int64]
+    pad_size_pix: int
+    nodata: typing.Union[int, float]
+
+    def __len__(self) -> int:
+        return len(self.chiplets)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        (*other_shape, base_size_pix, _) = self.chiplets.shape
+        padded_size_pix = base_size_pix + self.pad_size_pix * 2
+        return (*other_shape, padded_size_pix, padded_size_pix)
+
+    def __getitem__(
+        self,
+        indices: typing.Union[int, slice, typing.Sequence[int], npt.NDArray[np.int64]],
+    ) -> npt.NDArray[typing.Any]:
+        is_single = isinstance(indices, (int, np.integer))
+
+        # resolves slices and negative indices
+        chiplet_indices = np.atleast_1d(np.arange(len(self))[indices])
+
+        padded = themeda_preproc.pad_chiplets.get_padded_chiplets(
+            chiplets=self.chiplets,
+            indices=chiplet_indices,
+            neighbour_indices=self.neighbour_indices,
+            pad_size_pix=self.pad_size_pix,
+            nodata=self.nodata,
+        )
+
+        return padded[0] if is_single else padded
+
+
+ChipletsKey = tuple[
+    themeda_preproc.source.DataSourceName, int, themeda_preproc.roi.ROIName, int, bool
+]
+
+
+class ChipletsPool:
+    """
+    Provides memory-mapped chiplets for any (source, year, ROI, padding, de-NaN)
+    combination, opening them on demand and keeping up to `max_handles` of them (and,
+    if `max_bytes` is given, up to that total size) open for re-use. When a limit is
+    reached, the least-recently-used chiplets are evicted by dropping the pool's
+    reference, rather than closing the handle, so that any chiplets still in use
+    elsewhere remain valid; the handle is closed once nothing refers to it. The pool
+    (including its lock) is reset in a child process after a fork, and is emptied when
+    pickled, so each process opens its own handles.
+    """
+
+    __slots__ = (
+        "base_output_dir",
+        "base_size_pix",
+        "max_handles",
+        "max_bytes",
+        "_handles",
+        "_lock",
+        "_pid",
+    )
+
+    def __init__(
+        self,
+        base_output_dir: pathlib.Path,
+        base_size_pix: int = 160,
+        max_handles: int = 64,
+        max_bytes: typing.Optional[int] = None,
+    ) -> None:
+        if max_handles < 1:
+            raise ValueError("The pool needs to be able to hold at least one handle")
+
+        self.base_output_dir = base_output_dir
+        self.base_size_pix = base_size_pix
+        self.max_handles = max_handles
+        self.max_bytes = max_bytes
+
+        self._reset()
+
+    def _reset(self) -> None:
+        self._handles: collections.OrderedDict[
+            ChipletsKey, np.memmap[typing.Any, typing.Any]
+        ] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def __getstate__(self) -> dict[str, typing.Any]:
+        return {
+            "base_output_dir": self.base_output_dir,
+            "base_size_pix": self.base_size_pix,
+            "max_handles": self.max_handles,
+            "max_bytes": self.max_bytes,
+        }
+
+    def __setstate__(self, state: dict[str, typing.Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+
+        self._reset()
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def __enter__(self) -> "ChipletsPool":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: typing.Optional[type[BaseException]],
+        exc_value: typing.Optional[BaseException],
+        traceback: typing.Optional[types.TracebackType],
+    ) -> None:
+        self.clear()
+
+    @property
+    def n_bytes(self) -> int:
+        "The total size of the chiplets that are held by the pool"
+        return sum(handle.nbytes for handle in self._handles.values())
+
+    def get(
+        self,
+        source_name: themeda_preproc.source.DataSourceName,
+        year: int,
+        roi_name: themeda_preproc.roi.ROIName,
+        pad_size_pix: int,
+        denan: bool = True,
+    ) -> np.memmap[typing.Any, typing.Any]:
+        key = (source_name, year, roi_name, pad_size_pix, denan)
+
+        self._reset_if_forked()
+
+        with self._lock:
+            if key in self._handles:
+                self._handles.move_to_end(key)
+                return self._handles[key]
+
+        # opened without holding the lock, so that other threads aren't held up
+        handle = load_chiplets(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+            base_output_dir=self.base_output_dir,
+            base_size_pix=self.base_size_pix,
+            denan=denan,
+        )
+
+        assert isinstance(handle, np.memmap)
+
+        with self._lock:
+            # another thread may have opened the same chiplets in the meantime
+            if key in self._handles:
+                self._handles.move_to_end(key)
+                return self._handles[key]
+
+            self._handles[key] = handle
+
+            self._evict()
+
+            return handle
+
+    def _reset_if_forked(self) -> None:
+        """
+        Drops the handles that were inherited from a parent process, along with the
+        lock - which another thread in the parent may have held during the fork.
+        """
+
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def _evict(self) -> None:
+        "Drops the least-recently-used handles until the pool is within its limits"
+
+        while len(self._handles) > 1 and (
+            len(self._handles) > self.max_handles
+            or (self.max_bytes is not None and self.n_bytes > self.max_bytes)
+        ):
+            self._handles.popitem(last=False)
+
+    def clear(self) -> None:
+        "Drops all the handles held by the pool"
+
+        self._reset_if_forked()
+
+        with self._lock:
+            self._handles.clear()
+
+
+@dataclasses.dataclass(frozen=True)
+class PackedChiplets:
+    """
+    Chiplets that are stored with two bits per pixel (see `pack_chiplets`), and that
+    are unpacked when indexed.
+    """
+
+    chiplets: npt.NDArray[np.uint8]
+
+    def __len__(self) -> int:
+        return len(self.chiplets)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        (*other_shape, n_packed_cols) = self.chiplets.shape
+        return (*other_shape, n_packed_cols * PACKED_PIX_PER_BYTE)
+
+    def __getitem__(
+        self,
+        indices: typing.Union[int, slice, typing.Sequence[int], npt.NDArray[np.int64]],
+    ) -> npt.NDArray[np.uint8]:
+        return unpack_chiplets(packed=np.asarray(self.chiplets[indices]))
 
 
 def form_chiplets(
@@ -146,7 +394,7 @@ def form_year_chiplets(
         dtype=themeda_preproc.source.DATA_SOURCE_DTYPE[source_name],
         mode="w+",
         shape=get_array_shape(
-            table=table,
+            n_chiplets=len(table),
             base_size_pix=base_size_pix,
             pad_size_pix=pad_size_pix,
         ),
@@ -240,6 +488,138 @@ def chiplets_reader(
         chiplets._mmap.close()
 
 
+@contextlib.contextmanager
+def padded_chiplets_reader(
+    source_name: themeda_preproc.source.DataSourceName,
+    year: int,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    base_size_pix: int = 160,
+    denan: bool = True,
+) -> typing.Generator[PaddedChiplets, None, None]:
+    """
+    Provides chiplets with `pad_size_pix` padding, formed on-the-fly from the
+    unpadded chiplets so that the padded chiplets do not need to be stored.
+    """
+
+    lattice = themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=0,
+        base_size_pix=base_size_pix,
+    )
+
+    neighbour_indices = themeda_preproc.chiplet_table.get_neighbour_indices(
+        lattice=lattice
+    )
+
+    with chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+        denan=denan,
+    ) as chiplets:
+        yield PaddedChiplets(
+            chiplets=chiplets,
+            neighbour_indices=neighbour_indices,
+            pad_size_pix=pad_size_pix,
+            nodata=themeda_preproc.source.DATA_SOURCE_NODATA[source_name],
+        )
+
+
+@contextlib.contextmanager
+def packed_chiplets_reader(
+    source_name: themeda_preproc.source.DataSourceName,
+    year: int,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    base_size_pix: int = 160,
+) -> typing.Generator[PackedChiplets, None, None]:
+    "Provides chiplets from their packed storage, which are unpacked when indexed"
+
+    n_chiplets = themeda_preproc.chiplet_table.get_n_chiplets(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    (_, n_rows, n_cols) = get_array_shape(
+        n_chiplets=n_chiplets,
+        base_size_pix=base_size_pix,
+        pad_size_pix=pad_size_pix,
+    )
+
+    chiplets = np.memmap(
+        filename=get_chiplet_path(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+            base_output_dir=base_output_dir,
+            packed=True,
+        ),
+        dtype=np.uint8,
+        mode="r",
+        shape=(n_chiplets, n_rows, n_cols // PACKED_PIX_PER_BYTE),
+    )
+
+    try:
+        yield PackedChiplets(chiplets=chiplets)
+    finally:
+        assert hasattr(chiplets, "_mmap")
+        chiplets._mmap.close()
+
+
+def pack_chiplets(chiplets: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    """
+    Packs chiplets with values from 0 to 3 into two bits per pixel, with each byte
+    holding four horizontally-adjacent pixels (the first in the lowest bits).
+    """
+
+    max_val = (1 << PACKED_BITS) - 1
+
+    if chiplets.size > 0 and int(chiplets.max()) > max_val:
+        raise ValueError(
+            f"Chiplets with values above {max_val} ({int(chiplets.max())}) cannot be "
+            + "packed"
+        )
+
+    (*other_shape, n_cols) = chiplets.shape
+
+    if n_cols % PACKED_PIX_PER_BYTE != 0:
+        raise ValueError(
+            f"The chiplet width ({n_cols}) needs to be a multiple of "
+            + f"{PACKED_PIX_PER_BYTE} to be packed"
+        )
+
+    grouped = chiplets.astype(np.uint8).reshape(
+        *other_shape, n_cols // PACKED_PIX_PER_BYTE, PACKED_PIX_PER_BYTE
+    )
+
+    packed: npt.NDArray[np.uint8] = np.bitwise_or.reduce(
+        grouped << PACKED_SHIFTS, axis=-1
+    )
+
+    return packed
+
+
+def unpack_chiplets(packed: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+    "Unpacks chiplets that have been packed by `pack_chiplets`"
+
+    (*other_shape, n_packed_cols) = packed.shape
+
+    unpacked: npt.NDArray[np.uint8] = (
+        (packed[..., np.newaxis] >> PACKED_SHIFTS) & ((1 << PACKED_BITS) - 1)
+    ).reshape(*other_shape, n_packed_cols * PACKED_PIX_PER_BYTE)
+
+    return unpacked
+
+
 def load_chiplets(
     source_name: themeda_preproc.source.DataSourceName,
     year: int,
@@ -259,7 +639,8 @@ def load_chiplets(
         denan=denan,
     )
 
-    table = themeda_preproc.chiplet_table.load_table(
+    # the shape only needs the number of chiplets, which avoids reading the table
+    n_chiplets = themeda_preproc.chiplet_table.get_n_chiplets(
         roi_name=roi_name,
         base_output_dir=base_output_dir,
         pad_size_pix=pad_size_pix,
@@ -270,7 +651,7 @@ def load_chiplets(
         dtype=themeda_preproc.source.DATA_SOURCE_DTYPE[source_name],
         mode="r",
         shape=get_array_shape(
-            table=table,
+            n_chiplets=n_chiplets,
             base_size_pix=base_size_pix,
             pad_size_pix=pad_size_pix,
         ),
@@ -285,12 +666,116 @@ def load_chiplets(
         return chiplets_handle
 
 
+def prepare_chiplets(
+    chiplets: npt.NDArray[typing.Any],
+    fill_nan: bool = True,
+    log_transform: bool = False,
+    mean: float = 0.0,
+    sd: float = 1.0,
+    out: typing.Optional[npt.NDArray[np.float32]] = None,
+) -> npt.NDArray[np.float32]:
+    """
+    Converts raw chiplets, with shape (n_chiplets, y, x), into float32 chiplets that
+    are ready for use. NaNs are replaced with the mean of the non-NaN values in their
+    chiplet (or with zero, if the chiplet is all NaN; as in `denan_chiplets`), the
+    values are log-transformed (if `log_transform`) and then standardised using
+    `mean` and `sd`. The result is written into `out`, if provided, which can be a
+    (strided) view into a larger array.
+    """
+
+    if chiplets.ndim != 3:
+        raise ValueError("Expected chiplets with dimensions of (chiplet, y, x)")
+
+    if out is None:
+        out = np.empty(shape=chiplets.shape, dtype=np.float32)
+
+    # the only full-size pass outside the kernel, which cannot operate on float16
+    np.copyto(dst=out, src=chiplets, casting="safe")
+
+    prepare_chiplets_kernel(
+        data=out,
+        fill_nan=fill_nan,
+        log_transform=log_transform,
+        mean=float(mean),
+        sd=float(sd),
+    )
+
+    return out
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)  # type: ignore
+def prepare_chiplets_kernel(
+    data: npt.NDArray[np.float32],
+    fill_nan: bool,
+    log_transform: bool,
+    mean: float,
+    sd: float,
+) -> None:
+    "Fills NaNs, log-transforms, and standardises the chiplets in-place, in one pass"
+
+    (n_chiplets, n_rows, n_cols) = data.shape
+
+    for i_chiplet in range(n_chiplets):
+        fill_val = 0.0
+
+        if fill_nan:
+            total = 0.0
+            count = 0
+
+            for i_row in range(n_rows):
+                for i_col in range(n_cols):
+                    value = data[i_chiplet, i_row, i_col]
+
+                    if not np.isnan(value):
+                        total += value
+                        count += 1
+
+            if count > 0:
+                # as the de-NaN stage stores the mean as float16
+                fill_val = round_to_float16(value=total / count)
+
+        for i_row in range(n_rows):
+            for i_col in range(n_cols):
+                value = data[i_chiplet, i_row, i_col]
+
+                if fill_nan and np.isnan(value):
+                    value = fill_val
+
+                if log_transform:
+                    value = np.log(value)
+
+                data[i_chiplet, i_row, i_col] = (value - mean) / sd
+
+
+@numba.jit(nopython=True, nogil=True, cache=True)  # type: ignore
+def round_to_float16(value: float) -> float:
+    """
+    Rounds a value to the nearest float16 value (with ties to even), as numba does not
+    support float16.
+    """
+
+    if np.isnan(value) or value == 0.0:
+        return value
+
+    (_, exponent) = math.frexp(value)
+
+    # the spacing of float16 values around the value, which is fixed for subnormals
+    spacing = math.ldexp(1.0, max(exponent, FLOAT16_MIN_EXPONENT) - 11)
+
+    rounded = float(np.round(value / spacing)) * spacing
+
+    if abs(rounded) > FLOAT16_MAX:
+        rounded = math.copysign(math.inf, value)
+
+    return rounded
+
+
 def get_array_shape(
-    table: pl.dataframe.frame.DataFrame,
+    n_chiplets: int,
     base_size_pix: int,
     pad_size_pix: int,
 ) -> tuple[int, int, int]:
-    shape = (len(table),) + ((base_size_pix + pad_size_pix * 2),) * 2
+    shape = (n_chiplets,) + ((base_size_pix + pad_size_pix * 2),) * 2
 
     return shape
 
@@ -302,8 +787,14 @@ def get_chiplet_path(
     pad_size_pix: int,
     base_output_dir: pathlib.Path,
     denan: bool = False,
+    packed: bool = False,
 ) -> pathlib.Path:
-    if denan and themeda_preproc.source.is_data_source_continuous(
+    if packed and source_name not in PACKABLE_SOURCES:
+        raise ValueError(f"Chiplets for {source_name} cannot be stored packed")
+
+    if packed:
+        suffix = "-packed"
+    elif denan and themeda_preproc.source.is_data_source_continuous(
         source_name=source_name
     ):
         suffix = "-denan"
@@ -336,8 +827,9 @@ def parse_chiplet_filename(filename: pathlib.Path) -> ChipletFilenameInfo:
     roi_name = themeda_preproc.roi.ROIName(components.pop())
     assert components.pop() == "roi"
     year = int(components.pop())
-    assert components[0] in ["chiplets", "chiplets-denan"]
+    assert components[0] in ["chiplets", "chiplets-denan", "chiplets-packed"]
     denan = components[0] == "chiplets-denan"
+    packed = components[0] == "chiplets-packed"
     source_name = themeda_preproc.source.DataSourceName("_".join(components[1:]))
 
     return ChipletFilenameInfo(
@@ -347,9 +839,40 @@ def parse_chiplet_filename(filename: pathlib.Path) -> ChipletFilenameInfo:
         year=year,
         pad_size_pix=pad_size_pix,
         denan=denan,
+        packed=packed,
     )
 
 
+def get_chiplet_years(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    denan: bool = False,
+    packed: bool = False,
+) -> list[int]:
+    "Gets the years for which chiplets have been formed"
+
+    chiplet_dir = get_chiplet_path(
+        source_name=source_name,
+        year=0,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        denan=denan,
+        packed=packed,
+    ).parent
+
+    years = sorted(
+        parse_chiplet_filename(filename=path).year for path in chiplet_dir.glob("*.npy")
+    )
+
+    if not years:
+        raise ValueError(f"No chiplets found in {chiplet_dir}")
+
+    return years
+
+
 def get_transform_from_row(row: dict[str, typing.Any]) -> affine.Affine:
     return affine.Affine(
         **{
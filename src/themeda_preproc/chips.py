@@ -1,15 +1,45 @@
 import dataclasses
+import enum
 import warnings
 import pathlib
+import types
 import typing
 
+import numpy as np
+
 import xarray as xr
 
 import odc.geo.xr  # noqa
 
+import rasterio.enums
 import rioxarray
 
 
+# the DEA chips each cover a 100 km x 100 km area
+CHIP_SIZE_M: typing.Final = 100_000
+
+# the size of the internal tiles in written GeoTIFF files
+BLOCK_SIZE_PIX: typing.Final = 512
+
+
+class Codec(enum.Enum):
+    LZW = "lzw"
+    DEFLATE = "deflate"
+    ZSTD = "zstd"
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+
+# compression levels for the codecs that support them
+CODEC_LEVEL = types.MappingProxyType(
+    {
+        Codec.DEFLATE: 6,
+        Codec.ZSTD: 9,
+    }
+)
+
+
 @dataclasses.dataclass(frozen=True)
 class GridRef:
     x: int
@@ -62,13 +92,62 @@ def read_chip(
     return handle
 
 
+def write_chip(
+    chip: xr.DataArray,
+    path: pathlib.Path,
+    resampling: rasterio.enums.Resampling = rasterio.enums.Resampling.nearest,
+    codec: Codec = Codec.LZW,
+    n_threads: typing.Optional[int] = None,
+) -> None:
+    """
+    Writes a chip to disk as a tiled cloud-optimised GeoTIFF, with internal overviews
+    formed using `resampling`. Compression uses `n_threads` threads (or all the
+    available cores, if `None`).
+    """
+
+    chip.rio.to_raster(
+        raster_path=path,
+        **get_write_profile(
+            dtype=chip.dtype,
+            resampling=resampling,
+            codec=codec,
+            n_threads=n_threads,
+        ),
+    )
+
+
+def get_write_profile(
+    dtype: np.dtype[typing.Any],
+    resampling: rasterio.enums.Resampling = rasterio.enums.Resampling.nearest,
+    codec: Codec = Codec.LZW,
+    n_threads: typing.Optional[int] = None,
+) -> dict[str, typing.Any]:
+    profile: dict[str, typing.Any] = {
+        "driver": "COG",
+        "compress": codec.value,
+        "blocksize": BLOCK_SIZE_PIX,
+        "overview_resampling": resampling.name.upper(),
+        "num_threads": "ALL_CPUS" if n_threads is None else str(n_threads),
+    }
+
+    if codec in CODEC_LEVEL:
+        # floating-point values need their own predictor
+        profile["predictor"] = 3 if np.issubdtype(dtype, np.floating) else 2
+        profile["level"] = CODEC_LEVEL[codec]
+
+    return profile
+
+
 def get_grid_ref_from_chip(chip: xr.DataArray) -> GridRef:
-    scale_factor = 100_000
     bbox = chip.odc.geobox.boundingbox
-    x = bbox.left / scale_factor
-    y = bbox.bottom / scale_factor
+    return get_grid_ref_from_bounds(left=bbox.left, bottom=bbox.bottom)
+
+
+def get_grid_ref_from_bounds(left: float, bottom: float) -> GridRef:
+    x = left / CHIP_SIZE_M
+    y = bottom / CHIP_SIZE_M
 
-    if not x.is_integer() and y.is_integer():
+    if not (x.is_integer() and y.is_integer()):
         raise ValueError("Unexpected values")
 
     x = int(x)
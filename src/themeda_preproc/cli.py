@@ -6,8 +6,10 @@ import inspect
 
 import numpy as np
 
+import themeda_preproc.chips
 import themeda_preproc.roi
 import themeda_preproc.source
+import themeda_preproc.utils
 
 
 def main() -> None:
@@ -55,6 +57,29 @@ def main() -> None:
         help="Show a progress bar, if applicable",
     )
 
+    parser.add_argument(
+        "-materialise_strategy",
+        required=False,
+        choices=list(themeda_preproc.utils.MaterialiseStrategy),
+        type=themeda_preproc.utils.MaterialiseStrategy,
+        default=themeda_preproc.utils.MaterialiseStrategy.REFLINK,
+        help=(
+            "How files that are unchanged between stages are duplicated, if "
+            + "applicable (falls back to copying if unsupported)"
+        ),
+    )
+
+    parser.add_argument(
+        "-codec",
+        required=False,
+        choices=list(themeda_preproc.chips.Codec),
+        type=themeda_preproc.chips.Codec,
+        default=themeda_preproc.chips.Codec(
+            os.environ.get("THEMEDA_PREPROC_CODEC", default="lzw")
+        ),
+        help="Compression used when writing GeoTIFF files, if applicable",
+    )
+
     subparsers = parser.add_subparsers(dest="command")
 
     roi_parser = subparsers.add_parser(
@@ -107,6 +132,11 @@ def main() -> None:
         help="Plot a map of the data source for each year",
     )
 
+    mosaic_parser = subparsers.add_parser(
+        "mosaic",
+        help="Form (or update) the low-resolution mosaics used for the maps",
+    )
+
     transect_parser = subparsers.add_parser(
         "transect",
         help="Extract data along the NATT",
@@ -122,6 +152,31 @@ def main() -> None:
         help="Compares the hashes of all files in the output directory",
     )
 
+    derive_chiplets_parser = subparsers.add_parser(
+        "derive_chiplets",
+        help="Derive the chiplets for a ROI from those of a ROI that contains it",
+    )
+
+    pack_chiplets_parser = subparsers.add_parser(
+        "pack_chiplets",
+        help="Store the chiplets of the fire scar data sources with two bits per pixel",
+    )
+
+    delta_chiplets_parser = subparsers.add_parser(
+        "delta_chiplets",
+        help="Store the chiplets of a categorical data source as changes across years",
+    )
+
+    export_shards_parser = subparsers.add_parser(
+        "export_shards",
+        help="Export the chiplets into shuffled shards for sequential reading",
+    )
+
+    subparsers.add_parser(
+        "catalog",
+        help="Index the headers of the GeoTIFF files in the output directory",
+    )
+
     pad_chiplets_parser = subparsers.add_parser(
         "pad_chiplets",
         help="Converts chiplets without padding to have padding",
@@ -138,6 +193,11 @@ def main() -> None:
         plot_maps_parser,
         transect_parser,
         pad_chiplets_parser,
+        derive_chiplets_parser,
+        mosaic_parser,
+        export_shards_parser,
+        pack_chiplets_parser,
+        delta_chiplets_parser,
     ]:
         parser_needing_roi_name.add_argument(
             "-roi_name",
@@ -156,6 +216,10 @@ def main() -> None:
         plot_maps_parser,
         transect_parser,
         stats_parser,
+        derive_chiplets_parser,
+        mosaic_parser,
+        pack_chiplets_parser,
+        delta_chiplets_parser,
     ]:
         parser_needing_source_name.add_argument(
             "-source_name",
@@ -164,11 +228,34 @@ def main() -> None:
             type=themeda_preproc.source.DataSourceName,
         )
 
+    for parser_needing_source_names in [export_shards_parser]:
+        parser_needing_source_names.add_argument(
+            "-source_names",
+            nargs="+",
+            choices=list(themeda_preproc.source.DataSourceName),
+            type=themeda_preproc.source.DataSourceName,
+            default=list(themeda_preproc.source.DataSourceName),
+        )
+
+    for parser_needing_shard_size in [export_shards_parser]:
+        parser_needing_shard_size.add_argument(
+            "-shard_size",
+            type=int,
+            default=256,
+            help="Number of chiplets in each shard",
+        )
+
     for parser_needing_base_size_pix in [
         chiplet_table_parser,
         to_chiplets_parser,
         chiplets_to_geotiff_parser,
         pad_chiplets_parser,
+        derive_chiplets_parser,
+        mosaic_parser,
+        transect_parser,
+        export_shards_parser,
+        pack_chiplets_parser,
+        delta_chiplets_parser,
     ]:
         parser_needing_base_size_pix.add_argument(
             "-base_size_pix",
@@ -182,6 +269,10 @@ def main() -> None:
         denan_chiplets_parser,
         chiplets_to_geotiff_parser,
         pad_chiplets_parser,
+        derive_chiplets_parser,
+        export_shards_parser,
+        pack_chiplets_parser,
+        delta_chiplets_parser,
     ]:
         parser_needing_pad_size_pix.add_argument(
             "-pad_size_pix",
@@ -189,7 +280,7 @@ def main() -> None:
             default=32,
         )
 
-    for parser_needing_resolution in [plot_maps_parser]:
+    for parser_needing_resolution in [plot_maps_parser, mosaic_parser]:
         parser_needing_resolution.add_argument(
             "-resolution",
             type=float,
@@ -210,6 +301,23 @@ def main() -> None:
             default=False,
         )
 
+    for parser_needing_n_download_workers in [acquire_parser]:
+        parser_needing_n_download_workers.add_argument(
+            "-n_download_workers",
+            type=int,
+            default=8,
+            help="Number of files to download concurrently, if applicable",
+        )
+
+    for parser_needing_parent_roi_name in [derive_chiplets_parser]:
+        parser_needing_parent_roi_name.add_argument(
+            "-parent_roi_name",
+            choices=list(themeda_preproc.roi.ROIName),
+            type=themeda_preproc.roi.ROIName,
+            default=themeda_preproc.roi.ROIName("australia"),
+            help="ROI that contains the ROI and whose chiplets have been formed",
+        )
+
     for parser_needing_hash_db_path in [
         form_hash_db_parser,
         check_against_hash_db_parser,
@@ -284,6 +392,18 @@ def main() -> None:
         runner_function = "run_check_against_hash_db"
     elif args.command == "pad_chiplets":
         runner_str = "themeda_preproc.pad_chiplets"
+    elif args.command == "derive_chiplets":
+        runner_str = "themeda_preproc.derive_chiplets"
+    elif args.command == "mosaic":
+        runner_str = "themeda_preproc.mosaic"
+    elif args.command == "pack_chiplets":
+        runner_str = "themeda_preproc.pack_chiplets"
+    elif args.command == "delta_chiplets":
+        runner_str = "themeda_preproc.delta_chiplets"
+    elif args.command == "export_shards":
+        runner_str = "themeda_preproc.shards"
+    elif args.command == "catalog":
+        runner_str = "themeda_preproc.catalog"
     else:
         handler_name = themeda_preproc.source.DATA_SOURCE_HANDLER[args.source_name]
         runner_str = f"themeda_preproc.{handler_name}.{args.command}"
@@ -4,15 +4,12 @@ years and months.
 """
 
 import pathlib
-import contextlib
 import typing
 
 import siphon.catalog
 
-import tqdm
-
 import themeda_preproc.source
-import themeda_preproc.utils
+import themeda_preproc.download
 
 
 def run(
@@ -20,6 +17,7 @@ def run(
     base_output_dir: pathlib.Path,
     protect: bool = True,
     show_progress: bool = True,
+    n_download_workers: int = 8,
 ) -> None:
     # only consider this and subsequent years
     start_year: typing.Final = 1988
@@ -40,7 +38,9 @@ def run(
     ]:
         catalog = catalog.catalog_refs[ref_name].follow()
 
-    to_download = {}
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    to_download = []
 
     for year, year_data in catalog.catalog_refs.items():
         if len(year) != 4 or not year.isnumeric():
@@ -56,22 +56,17 @@ def run(
             if not dataset_name.endswith(".nc"):
                 raise ValueError(f"Unexpected dataset name ({dataset_name})")
 
-            local_path = output_dir / dataset_name
-
-            if not local_path.exists():
-                to_download[dataset] = local_path
-
-    with contextlib.closing(
-        tqdm.tqdm(
-            iterable=None,
-            total=len(to_download),
-            disable=not show_progress,
-        )
-    ) as progress_bar:
-        for dataset, local_path in to_download.items():
-            dataset.download(filename=str(local_path))
-
-            if protect:
-                themeda_preproc.utils.protect_path(path=local_path)
-
-            progress_bar.update()
+            # existing files are checked for completeness by the downloader
+            to_download.append(
+                themeda_preproc.download.DownloadItem(
+                    url=dataset.access_urls["HTTPServer"],
+                    path=output_dir / dataset_name,
+                )
+            )
+
+    themeda_preproc.download.download_files(
+        items=to_download,
+        n_workers=n_download_workers,
+        protect=protect,
+        show_progress=show_progress,
+    )
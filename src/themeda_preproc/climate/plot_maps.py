@@ -15,6 +15,7 @@ def run(
     protect: bool = True,
     resolution: typing.Optional[typing.Union[float, int]] = 1_000,
     headless: bool = True,
+    cores: int = 4,
 ) -> None:
     if source_name == themeda_preproc.source.DataSourceName.RAIN:
         cbar_label = "Annual rainfall (mm)"
@@ -36,5 +37,6 @@ def run(
         protect=protect,
         resolution=resolution,
         headless=headless,
+        cores=cores,
         set_minmax_across_years=True,
     )
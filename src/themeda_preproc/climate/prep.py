@@ -8,6 +8,7 @@ import xarray as xr
 
 import tqdm
 
+import themeda_preproc.chips
 import themeda_preproc.source
 import themeda_preproc.utils
 import themeda_preproc.land_cover.utils
@@ -24,6 +25,7 @@ class ChipPathInfo:
 def run(
     source_name: themeda_preproc.source.DataSourceName,
     base_output_dir: pathlib.Path,
+    codec: themeda_preproc.chips.Codec = themeda_preproc.chips.Codec.LZW,
     protect: bool = True,
     show_progress: bool = True,
 ) -> None:
@@ -67,9 +69,13 @@ def run(
                 )
 
                 # and save
-                data.rio.to_raster(
-                    raster_path=output_path,
-                    compress="lzw",
+                themeda_preproc.chips.write_chip(
+                    chip=data,
+                    path=output_path,
+                    resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[
+                        source_name
+                    ],
+                    codec=codec,
                 )
 
                 data.close()
@@ -0,0 +1,383 @@
+"""
+Stores the chiplets of a categorical data source (such as land cover) across years as
+a keyframe (the chiplets for the first year) and, for each subsequent year, the
+pixels that have changed since the previous year.
+
+The changes are stored as flat arrays of the chiplet index, pixel position (within
+the flattened chiplet), and new value of each changed pixel, ordered by year and then
+by chiplet - along with the number of changed pixels for each chiplet in each year,
+which locates the changes for a chiplet and also summarises how much it has changed.
+The chiplets for any years are reconstructed by applying the changes to the keyframe.
+"""
+
+import contextlib
+import dataclasses
+import functools
+import json
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import tqdm
+
+import themeda_preproc.chiplets
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+# the arrays that are stored, alongside the info file
+ARRAY_NAMES: typing.Final = ("keyframe", "n_changed", "chiplet", "pixel", "value")
+
+
+@dataclasses.dataclass(frozen=True)
+class DeltaChiplets:
+    years: list[int]
+    keyframe: npt.NDArray[np.uint8]
+    # the number of changed pixels, with shape of (n_years - 1, n_chiplets)
+    n_changed: npt.NDArray[np.uint32]
+    chiplet: npt.NDArray[np.uint32]
+    pixel: npt.NDArray[np.unsignedinteger[typing.Any]]
+    value: npt.NDArray[np.uint8]
+
+
+def run(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    base_size_pix: int = 160,
+    protect: bool = True,
+    show_progress: bool = True,
+) -> None:
+    if themeda_preproc.source.is_data_source_continuous(source_name=source_name):
+        raise ValueError("Only useful to run this on categorical data sources")
+
+    (info_path, array_paths) = get_delta_paths(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+    )
+
+    # the info is written last, so its presence means that the encoding is complete
+    if themeda_preproc.utils.is_path_existing_and_read_only(path=info_path):
+        print(f"Path {info_path} exists and is protected; skipping")
+        return
+
+    info_path.unlink(missing_ok=True)
+
+    years = themeda_preproc.chiplets.get_chiplet_years(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+    )
+
+    reader = functools.partial(
+        themeda_preproc.chiplets.chiplets_reader,
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+        denan=False,
+    )
+
+    with reader(year=years[0]) as keyframe:
+        (n_chiplets, n_rows, n_cols) = keyframe.shape
+        save_array(path=array_paths["keyframe"], array=keyframe)
+
+    n_changed = np.zeros(shape=(len(years) - 1, n_chiplets), dtype=np.uint32)
+
+    # the changes for each year are appended to the files as they are found, so that
+    # only one year of changes is held in memory at a time
+    with contextlib.ExitStack() as stack:
+        appenders = [
+            stack.enter_context(array_appender(path=array_paths[name], dtype=dtype))
+            for (name, dtype) in zip(
+                ARRAY_NAMES[2:],
+                [np.uint32, get_pixel_dtype(n_pixels=n_rows * n_cols), np.uint8],
+            )
+        ]
+
+        progress_bar = stack.enter_context(
+            contextlib.closing(
+                tqdm.tqdm(
+                    iterable=None,
+                    total=len(years) - 1,
+                    disable=not show_progress,
+                )
+            )
+        )
+
+        for i_year, (prev_year, year) in enumerate(zip(years[:-1], years[1:])):
+            with reader(year=prev_year) as prev_chiplets, reader(year=year) as chiplets:
+                changes = get_changes(prev_chiplets=prev_chiplets, chiplets=chiplets)
+
+            n_changed[i_year] = np.bincount(changes[0], minlength=n_chiplets)
+
+            for append, array in zip(appenders, changes):
+                append(array)
+
+            progress_bar.update()
+
+    save_array(path=array_paths["n_changed"], array=n_changed)
+
+    info_path.write_text(json.dumps({"years": years}))
+
+    if protect:
+        for path in [*array_paths.values(), info_path]:
+            themeda_preproc.utils.protect_path(path=path)
+
+
+def get_changes(
+    prev_chiplets: npt.NDArray[np.uint8],
+    chiplets: npt.NDArray[np.uint8],
+    block_size: int = 1024,
+) -> tuple[
+    npt.NDArray[np.uint32],
+    npt.NDArray[np.unsignedinteger[typing.Any]],
+    npt.NDArray[np.uint8],
+]:
+    """
+    Gets the chiplet index, flattened pixel position, and new value of each pixel
+    that differs between two sets of chiplets, ordered by chiplet and then pixel.
+    """
+
+    (n_chiplets, n_rows, n_cols) = chiplets.shape
+
+    pixel_dtype = get_pixel_dtype(n_pixels=n_rows * n_cols)
+
+    changes: list[
+        tuple[
+            npt.NDArray[np.uint32],
+            npt.NDArray[np.unsignedinteger[typing.Any]],
+            npt.NDArray[np.uint8],
+        ]
+    ] = [
+        (
+            np.zeros(0, dtype=np.uint32),
+            np.zeros(0, dtype=pixel_dtype),
+            np.zeros(0, dtype=np.uint8),
+        )
+    ]
+
+    for i_block_start in range(0, n_chiplets, block_size):
+        block = slice(i_block_start, i_block_start + block_size)
+
+        (block_prev, block_curr) = (
+            np.asarray(curr_chiplets[block]).reshape(-1, n_rows * n_cols)
+            for curr_chiplets in [prev_chiplets, chiplets]
+        )
+
+        (i_chiplet, i_pixel) = np.nonzero(block_prev != block_curr)
+
+        # converted to the stored types for each block, to limit the peak memory
+        changes.append(
+            (
+                (i_chiplet + i_block_start).astype(np.uint32),
+                i_pixel.astype(pixel_dtype),
+                block_curr[i_chiplet, i_pixel].astype(np.uint8),
+            )
+        )
+
+    return (
+        np.concatenate([chiplet for (chiplet, _, _) in changes]),
+        np.concatenate([pixel for (_, pixel, _) in changes]),
+        np.concatenate([value for (_, _, value) in changes]),
+    )
+
+
+def get_pixel_dtype(n_pixels: int) -> np.dtype[typing.Any]:
+    "Gets the smallest type that can store the position of a pixel within a chiplet"
+    return np.min_scalar_type(n_pixels - 1)
+
+
+def load_delta_chiplets(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+) -> DeltaChiplets:
+    "Loads the (memory-mapped) keyframe and changes"
+
+    (info_path, array_paths) = get_delta_paths(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+    )
+
+    if not info_path.exists():
+        raise ValueError(f"No delta-encoded chiplets found at {info_path.parent}")
+
+    info = json.loads(info_path.read_text())
+
+    return DeltaChiplets(
+        years=info["years"],
+        **{
+            name: np.load(file=path, mmap_mode="r")
+            for (name, path) in array_paths.items()
+        },
+    )
+
+
+def reconstruct_chiplets(
+    delta_chiplets: DeltaChiplets,
+    years: typing.Sequence[int],
+    indices: typing.Optional[npt.ArrayLike] = None,
+) -> npt.NDArray[np.uint8]:
+    """
+    Reconstructs the chiplets with the given indices (or all chiplets, if not
+    provided) for each of the years, as an array with dimensions of (year, chiplet, y,
+    x). The changes for each year are applied to all the chiplets at once.
+    """
+
+    missing_years = set(years) - set(delta_chiplets.years)
+
+    if missing_years:
+        raise ValueError(f"Years {sorted(missing_years)} are not available")
+
+    (n_chiplets, n_rows, n_cols) = delta_chiplets.keyframe.shape
+
+    chiplet_indices = (
+        np.arange(n_chiplets)
+        if indices is None
+        else np.atleast_1d(np.asarray(indices, dtype=np.int64))
+    )
+
+    # the position of the first change of each (year, chiplet) within the changes
+    n_changed = np.asarray(delta_chiplets.n_changed, dtype=np.int64)
+    offsets = (np.cumsum(n_changed) - n_changed.ravel()).reshape(n_changed.shape)
+
+    frame = np.array(delta_chiplets.keyframe[chiplet_indices]).reshape(
+        len(chiplet_indices), n_rows * n_cols
+    )
+
+    output = np.empty(
+        shape=(len(years), len(chiplet_indices), n_rows, n_cols),
+        dtype=frame.dtype,
+    )
+
+    if len(years) == 0:
+        return output
+
+    for i_year, year in enumerate(delta_chiplets.years):
+        if i_year > 0:
+            counts = n_changed[i_year - 1, chiplet_indices]
+            starts = offsets[i_year - 1, chiplet_indices]
+
+            # the positions of the changes for all the chiplets, in one array
+            count_starts = np.cumsum(counts) - counts
+            positions = np.repeat(starts - count_starts, counts) + np.arange(
+                counts.sum()
+            )
+
+            frame[
+                np.repeat(np.arange(len(chiplet_indices)), counts),
+                delta_chiplets.pixel[positions],
+            ] = delta_chiplets.value[positions]
+
+        for i_output, output_year in enumerate(years):
+            if output_year == year:
+                output[i_output] = frame.reshape(-1, n_rows, n_cols)
+
+        if year >= max(years):
+            break
+
+    return output
+
+
+def get_n_changed(delta_chiplets: DeltaChiplets) -> xr.DataArray:
+    "Gets the number of pixels in each chiplet that changed from the previous year"
+
+    (_, n_chiplets) = delta_chiplets.n_changed.shape
+
+    return xr.DataArray(
+        data=np.asarray(delta_chiplets.n_changed),
+        dims=("year", "chiplet"),
+        coords={"year": delta_chiplets.years[1:], "chiplet": np.arange(n_chiplets)},
+    )
+
+
+def save_array(path: pathlib.Path, array: npt.NDArray[typing.Any]) -> None:
+    partial_path = themeda_preproc.utils.get_partial_path(path=path)
+
+    with partial_path.open("wb") as handle:
+        np.save(file=handle, arr=array)
+
+    partial_path.replace(target=path)
+
+
+@contextlib.contextmanager
+def array_appender(
+    path: pathlib.Path,
+    dtype: npt.DTypeLike,
+) -> typing.Iterator[typing.Callable[[npt.NDArray[typing.Any]], None]]:
+    """
+    Writes a one-dimensional array to a NumPy file in parts, via a function that
+    appends each part, without needing to hold the whole array in memory.
+    """
+
+    partial_path = themeda_preproc.utils.get_partial_path(path=path)
+
+    header = {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),  # type: ignore
+        "fortran_order": False,
+        "shape": (0,),
+    }
+
+    n_items = 0
+
+    with partial_path.open("wb") as handle:
+        np.lib.format.write_array_header_1_0(handle, header)  # type: ignore
+        data_start = handle.tell()
+
+        def append(array: npt.NDArray[typing.Any]) -> None:
+            nonlocal n_items
+            handle.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+            n_items += len(array)
+
+        yield append
+
+        # the header is padded so that the length can grow without changing its size
+        handle.seek(0)
+        np.lib.format.write_array_header_1_0(  # type: ignore
+            handle, {**header, "shape": (n_items,)}
+        )
+
+        if handle.tell() != data_start:
+            raise ValueError(f"Unable to update the header of {partial_path}")
+
+    partial_path.replace(target=path)
+
+
+def get_delta_paths(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+) -> tuple[pathlib.Path, dict[str, pathlib.Path]]:
+    "Gets the paths to the info file and to each of the stored arrays"
+
+    delta_dir = (
+        base_output_dir
+        / "chiplets-delta"
+        / f"roi_{roi_name.value}"
+        / f"pad_{pad_size_pix}"
+        / source_name.value
+    )
+
+    delta_dir.mkdir(exist_ok=True, parents=True)
+
+    stem = f"chiplets-delta_{source_name.value}_roi_{roi_name.value}_pad_{pad_size_pix}"
+
+    return (
+        delta_dir / f"{stem}_info.json",
+        {name: delta_dir / f"{stem}_{name}.npy" for name in ARRAY_NAMES},
+    )
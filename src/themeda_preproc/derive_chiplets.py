@@ -0,0 +1,268 @@
+"""
+Derives the chiplets for a ROI from the chiplets for a ROI that contains it (e.g.,
+savanna from australia) by gathering the relevant chiplets, rather than forming them
+again from the chips.
+
+The chiplets are matched by their chip grid reference and their pixel offsets within
+the chip. The padding of a derived chiplet is set to nodata where it falls within a
+chip that is not part of the derived ROI, as is the case when the chiplets are formed
+from the chips directly. The land cover relabelling that depends on ROI overlap
+(assigning the ocean label) is always relative to the australia coastline, so the
+gathered chiplets need no further relabelling.
+"""
+
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import polars as pl
+
+import tqdm
+
+import themeda_preproc.source
+import themeda_preproc.roi
+import themeda_preproc.chips
+import themeda_preproc.chiplet_table
+import themeda_preproc.chiplets
+import themeda_preproc.utils
+
+
+MATCH_COLUMNS: typing.Final = (
+    "chip_grid_ref_x_base",
+    "chip_grid_ref_y_base",
+    "chip_i_x_base",
+    "chip_i_y_base",
+)
+
+
+def run(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int,
+    parent_roi_name: themeda_preproc.roi.ROIName,
+    base_size_pix: int = 160,
+    protect: bool = True,
+    show_progress: bool = True,
+) -> None:
+    (table, parent_table) = (
+        themeda_preproc.chiplet_table.load_table(
+            roi_name=curr_roi_name,
+            base_output_dir=base_output_dir,
+            pad_size_pix=pad_size_pix,
+        )
+        for curr_roi_name in [roi_name, parent_roi_name]
+    )
+
+    parent_indices = get_parent_indices(table=table, parent_table=parent_table)
+
+    pad_masks = get_pad_masks(
+        table=table,
+        base_size_pix=base_size_pix,
+        pad_size_pix=pad_size_pix,
+    )
+
+    years = themeda_preproc.chiplets.get_chiplet_years(
+        source_name=source_name,
+        roi_name=parent_roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+    )
+
+    for year in tqdm.tqdm(iterable=years, disable=not show_progress):
+        derive_year_chiplets(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            parent_roi_name=parent_roi_name,
+            pad_size_pix=pad_size_pix,
+            base_output_dir=base_output_dir,
+            parent_indices=parent_indices,
+            pad_masks=pad_masks,
+            base_size_pix=base_size_pix,
+            protect=protect,
+        )
+
+
+def derive_year_chiplets(
+    source_name: themeda_preproc.source.DataSourceName,
+    year: int,
+    roi_name: themeda_preproc.roi.ROIName,
+    parent_roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    parent_indices: npt.NDArray[np.int64],
+    pad_masks: list[tuple[int, slice, slice]],
+    base_size_pix: int = 160,
+    protect: bool = True,
+    block_size: int = 1024,
+) -> None:
+    output_path = themeda_preproc.chiplets.get_chiplet_path(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+    )
+
+    if themeda_preproc.utils.is_path_existing_and_read_only(path=output_path):
+        return
+
+    n_chiplets = len(parent_indices)
+
+    chiplets = np.memmap(
+        filename=output_path,
+        dtype=themeda_preproc.source.DATA_SOURCE_DTYPE[source_name],
+        mode="w+",
+        shape=(n_chiplets,) + (base_size_pix + pad_size_pix * 2,) * 2,
+    )
+
+    with themeda_preproc.chiplets.chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=parent_roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+        denan=False,
+    ) as parent_chiplets:
+        for i_block_start in range(0, n_chiplets, block_size):
+            block = slice(i_block_start, i_block_start + block_size)
+            chiplets[block] = parent_chiplets[parent_indices[block]]
+
+    nodata = themeda_preproc.source.DATA_SOURCE_NODATA[source_name]
+
+    for index, rows, cols in pad_masks:
+        chiplets[index, rows, cols] = nodata
+
+    # write changes to disk
+    chiplets.flush()
+
+    # close the handle
+    # see https://github.com/numpy/numpy/issues/13510
+    assert hasattr(chiplets, "_mmap")
+    chiplets._mmap.close()
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=output_path)
+
+
+def get_parent_indices(
+    table: pl.dataframe.frame.DataFrame,
+    parent_table: pl.dataframe.frame.DataFrame,
+) -> npt.NDArray[np.int64]:
+    "Gets the index of the matching parent chiplet for each chiplet, in index order"
+
+    match_columns = list(MATCH_COLUMNS)
+
+    matched = (
+        table.select([*match_columns, "index"])
+        .join(
+            other=parent_table.select(
+                [*match_columns, pl.col("index").alias("parent_index")]
+            ),
+            on=match_columns,
+            how="left",
+        )
+        .sort(by="index")
+    )
+
+    n_unmatched = matched["parent_index"].null_count()
+
+    if n_unmatched > 0:
+        raise ValueError(
+            f"{n_unmatched} chiplets are not present in the parent ROI; "
+            + "they need to be formed from the chips"
+        )
+
+    parent_indices: npt.NDArray[np.int64] = (
+        matched["parent_index"].to_numpy().astype(np.int64)
+    )
+
+    return parent_indices
+
+
+def get_pad_masks(
+    table: pl.dataframe.frame.DataFrame,
+    base_size_pix: int,
+    pad_size_pix: int,
+) -> list[tuple[int, slice, slice]]:
+    """
+    Gets the regions of the padded chiplets (as index, row slice, and column slice)
+    that fall within chips that are not part of the table's ROI.
+    """
+
+    grid_refs = {
+        themeda_preproc.chips.GridRef(x=x, y=y)
+        for (x, y) in table.select(
+            ["chip_grid_ref_x_base", "chip_grid_ref_y_base"]
+        ).iter_rows()
+    }
+
+    pad_masks = []
+
+    for row in table.iter_rows(named=True):
+        chip_size_pix = themeda_preproc.chips.CHIP_SIZE_M / abs(
+            row["chip_transform_i_to_coords_coeff_a"]
+        )
+
+        if not chip_size_pix.is_integer():
+            raise ValueError("Unexpected chip size")
+
+        for d_row in [-1, 0, 1]:
+            rows = get_neighbour_chip_overlap(
+                i_base=row["chip_i_y_base"],
+                d_chip=d_row,
+                chip_size_pix=int(chip_size_pix),
+                base_size_pix=base_size_pix,
+                pad_size_pix=pad_size_pix,
+            )
+
+            for d_col in [-1, 0, 1]:
+                cols = get_neighbour_chip_overlap(
+                    i_base=row["chip_i_x_base"],
+                    d_chip=d_col,
+                    chip_size_pix=int(chip_size_pix),
+                    base_size_pix=base_size_pix,
+                    pad_size_pix=pad_size_pix,
+                )
+
+                if rows is None or cols is None:
+                    continue
+
+                # grid refs increase northwards, whereas rows increase southwards
+                neighbour_grid_ref = themeda_preproc.chips.GridRef(
+                    x=row["chip_grid_ref_x_base"] + d_col,
+                    y=row["chip_grid_ref_y_base"] - d_row,
+                )
+
+                if neighbour_grid_ref not in grid_refs:
+                    pad_masks.append((row["index"], rows, cols))
+
+    return pad_masks
+
+
+def get_neighbour_chip_overlap(
+    i_base: int,
+    d_chip: int,
+    chip_size_pix: int,
+    base_size_pix: int,
+    pad_size_pix: int,
+) -> typing.Optional[slice]:
+    """
+    Gets the region, along one axis of a padded chiplet, that falls within the chip
+    that is `d_chip` chips away from the chiplet's chip (or `None` if none does).
+    """
+
+    i_padded_start = i_base - pad_size_pix
+    i_padded_stop = i_base + base_size_pix + pad_size_pix
+
+    i_start = max(d_chip * chip_size_pix, i_padded_start)
+    i_stop = min((d_chip + 1) * chip_size_pix, i_padded_stop)
+
+    if i_stop <= i_start:
+        return None
+
+    return slice(i_start - i_padded_start, i_stop - i_padded_start)
@@ -0,0 +1,222 @@
+"""
+Downloads collections of files over HTTP(S) concurrently.
+
+Each file is written to a temporary ('.part') file alongside its destination and only
+renamed into place once it has been completely received and its size verified (see
+`themeda_preproc.utils.download_file`), so that an existing file at the destination
+can be assumed to be complete.
+"""
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import functools
+import pathlib
+import time
+import typing
+
+import requests
+import requests.adapters
+
+import tqdm
+
+import themeda_preproc.utils
+
+
+T = typing.TypeVar("T")
+
+
+@dataclasses.dataclass(frozen=True)
+class DownloadItem:
+    url: str
+    path: pathlib.Path
+    expected_size: typing.Optional[int] = None
+
+
+def download_files(
+    items: typing.Sequence[DownloadItem],
+    n_workers: int = 8,
+    n_attempts: int = 4,
+    backoff_s: float = 2.0,
+    protect: bool = True,
+    show_progress: bool = True,
+) -> None:
+    """
+    Downloads each of the items using a pool of `n_workers` threads, skipping those
+    that already exist locally with the expected size. Each download is attempted up
+    to `n_attempts` times, with an exponentially-increasing delay (starting at
+    `backoff_s` seconds) between attempts. A `ValueError` that describes each of the
+    unsuccessful downloads is raised once all the items have been processed.
+    """
+
+    with get_session(pool_size=n_workers) as session:
+        run_downloads(
+            func=functools.partial(
+                download_item,
+                session=session,
+                n_attempts=n_attempts,
+                backoff_s=backoff_s,
+                protect=protect,
+            ),
+            items=items,
+            describe=lambda item: item.url,
+            n_workers=n_workers,
+            show_progress=show_progress,
+        )
+
+
+def run_downloads(
+    func: typing.Callable[[T], None],
+    items: typing.Sequence[T],
+    describe: typing.Callable[[T], str],
+    n_workers: int = 8,
+    show_progress: bool = True,
+) -> None:
+    """
+    Calls `func` with each of the items using a pool of `n_workers` threads. A
+    `ValueError` that describes (via `describe`) each of the items for which `func`
+    was unsuccessful is raised once all the items have been processed.
+    """
+
+    failures: list[tuple[T, BaseException]] = []
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=n_workers
+    ) as executor, contextlib.closing(
+        tqdm.tqdm(
+            iterable=None,
+            total=len(items),
+            disable=not show_progress,
+        )
+    ) as progress_bar:
+        futures = {executor.submit(func, item): item for item in items}
+
+        for future in concurrent.futures.as_completed(futures):
+            exception = future.exception()
+
+            if exception is not None:
+                failures.append((futures[future], exception))
+
+            progress_bar.update()
+
+    if failures:
+        raise ValueError(
+            f"{len(failures)} / {len(items)} downloads failed:\n"
+            + "\n".join(
+                f"{describe(item)}: {exception}" for (item, exception) in failures
+            )
+        )
+
+
+def download_item(
+    item: DownloadItem,
+    session: requests.Session,
+    n_attempts: int = 4,
+    backoff_s: float = 2.0,
+    protect: bool = True,
+) -> None:
+    # the check for an existing download queries the server, so is also retried
+    call_with_retry(
+        func=functools.partial(download_if_incomplete, item=item, session=session),
+        n_attempts=n_attempts,
+        backoff_s=backoff_s,
+        exceptions=(requests.RequestException, ValueError),
+    )
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=item.path)
+
+
+def download_if_incomplete(item: DownloadItem, session: requests.Session) -> None:
+    if not is_download_complete(item=item, session=session):
+        themeda_preproc.utils.download_file(
+            url=item.url,
+            output_path=item.path,
+            expected_size=item.expected_size,
+            session=session,
+        )
+
+
+def call_with_retry(
+    func: typing.Callable[[], T],
+    n_attempts: int,
+    backoff_s: float,
+    exceptions: tuple[type[BaseException], ...] = (Exception,),
+    is_retryable: typing.Optional[typing.Callable[[BaseException], bool]] = None,
+) -> T:
+    """
+    Calls `func` until it succeeds or it has been attempted `n_attempts` times, with
+    an exponentially-increasing delay between attempts. Only errors that are one of
+    the `exceptions` (and, if provided, that pass `is_retryable`) are retried.
+    """
+
+    for i_attempt in range(n_attempts - 1):
+        try:
+            return func()
+        except exceptions as exception:
+            if is_retryable is not None and not is_retryable(exception):
+                raise
+
+        time.sleep(backoff_s * 2**i_attempt)
+
+    # final attempt, in which any errors are propagated
+    return func()
+
+
+def is_download_complete(
+    item: DownloadItem,
+    session: requests.Session,
+) -> bool:
+    """
+    Determines whether the file at the item's path has already been downloaded, by
+    comparing its size with the expected size (or, if that isn't known, the size that
+    the server reports).
+    """
+
+    if not item.path.exists():
+        return False
+
+    expected_size = item.expected_size
+
+    if expected_size is None:
+        expected_size = get_remote_size(url=item.url, session=session)
+
+    # if the server won't tell us the size, we have to trust that it is complete
+    if expected_size is None:
+        return True
+
+    return item.path.stat().st_size == expected_size
+
+
+def get_remote_size(
+    url: str,
+    session: requests.Session,
+) -> typing.Optional[int]:
+    response = session.head(url=url, allow_redirects=True)
+
+    if not response.ok:
+        raise ValueError(
+            f"Error querying {url}; response code was {response.status_code}"
+        )
+
+    size: typing.Optional[int] = themeda_preproc.utils.get_content_length(
+        response=response
+    )
+
+    return size
+
+
+def get_session(pool_size: int) -> requests.Session:
+    "Creates a session whose connection pool can serve `pool_size` threads"
+
+    session = requests.Session()
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+
+    for prefix in ["http://", "https://"]:
+        session.mount(prefix=prefix, adapter=adapter)
+
+    return session
@@ -1,22 +1,23 @@
 """
-Acquires the land use data by downloading the zipped data from the relevant websites.
-
-Needs to be unzipped manually after this (in the same directory), to give:
-srtm-1sec-demh-v1-COG.tif
+Acquires the elevation data by downloading the zipped data from the relevant website
+and extracting the DEM (srtm-1sec-demh-v1-COG.tif) into the same directory.
 """
 
 import pathlib
 
 import themeda_preproc.source
 import themeda_preproc.utils
+import themeda_preproc.archive
 
 
 def run(
     source_name: themeda_preproc.source.DataSourceName,
     base_output_dir: pathlib.Path,
     protect: bool = True,
+    n_download_workers: int = 8,
 ) -> None:
     output_dir = base_output_dir / "raw" / source_name.value
+    output_dir.mkdir(exist_ok=True, parents=True)
 
     url = "/".join(
         [
@@ -34,7 +35,15 @@ def run(
         themeda_preproc.utils.download_file(
             url=url,
             output_path=local_path,
+            n_parallel=n_download_workers,
         )
 
     if protect:
         themeda_preproc.utils.protect_path(path=local_path)
+
+    themeda_preproc.archive.extract_archives(
+        archive_paths=[local_path],
+        output_dir=output_dir,
+        member_filter=lambda filename: filename == "srtm-1sec-demh-v1-COG.tif",
+        protect=protect,
+    )
@@ -15,6 +15,7 @@ def run(
     protect: bool = True,
     resolution: typing.Optional[typing.Union[float, int]] = 1_000,
     headless: bool = True,
+    cores: int = 4,
 ) -> None:
     customiser = functools.partial(
         themeda_preproc.vis.maps.generic_continuous_customiser,
@@ -29,4 +30,5 @@ def run(
         protect=protect,
         resolution=resolution,
         headless=headless,
+        cores=cores,
     )
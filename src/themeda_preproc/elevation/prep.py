@@ -1,5 +1,4 @@
 import pathlib
-import shutil
 
 import themeda_preproc.source
 import themeda_preproc.utils
@@ -9,6 +8,9 @@ def run(
     source_name: themeda_preproc.source.DataSourceName,
     base_output_dir: pathlib.Path,
     protect: bool = True,
+    materialise_strategy: themeda_preproc.utils.MaterialiseStrategy = (
+        themeda_preproc.utils.MaterialiseStrategy.REFLINK
+    ),
 ) -> None:
     raw_dir = base_output_dir / "raw" / source_name.value
     prep_dir = base_output_dir / "prep" / source_name.value
@@ -27,10 +29,9 @@ def run(
     output_path = output_dir / f"{source_name.value}_{year}.tif"
 
     if not themeda_preproc.utils.is_path_existing_and_read_only(path=output_path):
-        shutil.copy2(
+        themeda_preproc.utils.materialise_file(
             src=raw_chip_path,
             dst=output_path,
+            strategy=materialise_strategy,
+            protect=protect,
         )
-
-        if protect:
-            themeda_preproc.utils.protect_path(path=output_path)
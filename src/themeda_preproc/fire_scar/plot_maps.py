@@ -22,6 +22,7 @@ def run(
     protect: bool = True,
     resolution: typing.Optional[typing.Union[float, int]] = 1_000,
     headless: bool = True,
+    cores: int = 4,
 ) -> None:
     themeda_preproc.vis.maps.plot_years(
         source_name=source_name,
@@ -31,6 +32,7 @@ def run(
         protect=protect,
         resolution=resolution,
         headless=headless,
+        cores=cores,
     )
 
 
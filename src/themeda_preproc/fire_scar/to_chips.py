@@ -12,6 +12,7 @@ import odc.geo.geom
 
 import tqdm
 
+import themeda_preproc.chips
 import themeda_preproc.source
 import themeda_preproc.roi
 import themeda_preproc.utils
@@ -22,6 +23,7 @@ def run(
     source_name: themeda_preproc.source.DataSourceName,
     roi_name: themeda_preproc.roi.ROIName,
     base_output_dir: pathlib.Path,
+    codec: themeda_preproc.chips.Codec = themeda_preproc.chips.Codec.LZW,
     protect: bool = True,
     show_progress: bool = True,
 ) -> None:
@@ -74,9 +76,13 @@ def run(
                         dea_chip=base_chip,
                     )
 
-                    chip.rio.to_raster(
-                        raster_path=output_path,
-                        compress="lzw",
+                    themeda_preproc.chips.write_chip(
+                        chip=chip,
+                        path=output_path,
+                        resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[
+                            source_name
+                        ],
+                        codec=codec,
                     )
 
                     if protect:
@@ -5,14 +5,45 @@ spatial regions from the DEA database.
 
 import pathlib
 import contextlib
+import dataclasses
+import functools
+import hashlib
+import typing
 
 import boto3
 import botocore
-
-import tqdm
+import botocore.client
+import botocore.exceptions
 
 import themeda_preproc.source
 import themeda_preproc.utils
+import themeda_preproc.download
+
+if typing.TYPE_CHECKING:
+    import mypy_boto3_s3
+
+
+# error codes of S3 responses that indicate a request may succeed if repeated
+RETRYABLE_ERROR_CODES: typing.Final = frozenset(
+    [
+        "SlowDown",
+        "RequestTimeout",
+        "InternalError",
+        "ServiceUnavailable",
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+    ]
+)
+
+HTTP_SERVER_ERROR: typing.Final = 500
+
+
+@dataclasses.dataclass(frozen=True)
+class S3Object:
+    key: str
+    size: int
+    etag: str
 
 
 def run(
@@ -20,6 +51,7 @@ def run(
     base_output_dir: pathlib.Path,
     protect: bool = True,
     show_progress: bool = True,
+    n_download_workers: int = 8,
 ) -> None:
     output_dir = base_output_dir / "raw" / source_name.value
 
@@ -27,47 +59,208 @@ def run(
     product = "ga_ls_landcover_class_cyear_2"
 
     with contextlib.closing(
-        boto3.client(
-            "s3",
-            config=botocore.client.Config(signature_version=botocore.UNSIGNED),
-        )
+        get_client(max_pool_connections=n_download_workers)
     ) as client:
-        paginator = client.get_paginator("list_objects")
+        download_objects(
+            client=client,
+            bucket=bucket,
+            prefix=f"derivative/{product}/1-0-0/",
+            output_dir=output_dir,
+            key_filter=lambda key: key.endswith("level4.tif"),
+            n_workers=n_download_workers,
+            protect=protect,
+            show_progress=show_progress,
+        )
+
+
+def get_client(
+    max_pool_connections: int = 10,
+    endpoint_url: typing.Optional[str] = None,
+) -> "mypy_boto3_s3.S3Client":
+    """
+    Creates an anonymous S3 client, optionally for an alternative (S3-compatible)
+    endpoint. The client can be shared across threads.
+    """
+
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=botocore.client.Config(
+            signature_version=botocore.UNSIGNED,
+            max_pool_connections=max_pool_connections,
+        ),
+    )
+
+
+def download_objects(
+    client: "mypy_boto3_s3.S3Client",
+    bucket: str,
+    prefix: str,
+    output_dir: pathlib.Path,
+    key_filter: typing.Optional[typing.Callable[[str], bool]] = None,
+    n_workers: int = 8,
+    n_attempts: int = 4,
+    backoff_s: float = 2.0,
+    protect: bool = True,
+    show_progress: bool = True,
+) -> None:
+    """
+    Downloads the objects in the bucket under `prefix` (and that pass the optional
+    `key_filter`) into `output_dir` using a pool of `n_workers` threads. Objects that
+    have already been downloaded, as judged by their size and ETag, are skipped.
+    """
+
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    objects = [
+        s3_object
+        for s3_object in list_objects(client=client, bucket=bucket, prefix=prefix)
+        if key_filter is None or key_filter(s3_object.key)
+    ]
+
+    themeda_preproc.download.run_downloads(
+        func=lambda s3_object: download_object(
+            client=client,
+            bucket=bucket,
+            s3_object=s3_object,
+            local_path=output_dir / pathlib.Path(s3_object.key).name,
+            n_attempts=n_attempts,
+            backoff_s=backoff_s,
+            protect=protect,
+        ),
+        items=objects,
+        describe=lambda s3_object: s3_object.key,
+        n_workers=n_workers,
+        show_progress=show_progress,
+    )
+
 
-        pages = paginator.paginate(
-            Bucket=bucket,
-            Prefix=f"derivative/{product}/1-0-0/",
+def list_objects(
+    client: "mypy_boto3_s3.S3Client",
+    bucket: str,
+    prefix: str,
+) -> list[S3Object]:
+    paginator = client.get_paginator("list_objects_v2")
+
+    pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
+
+    objects = [
+        S3Object(key=item["Key"], size=item["Size"], etag=item["ETag"].strip('"'))
+        for page in pages
+        for item in page.get("Contents", [])
+    ]
+
+    return objects
+
+
+def download_object(
+    client: "mypy_boto3_s3.S3Client",
+    bucket: str,
+    s3_object: S3Object,
+    local_path: pathlib.Path,
+    n_attempts: int = 4,
+    backoff_s: float = 2.0,
+    protect: bool = True,
+) -> None:
+    if not is_local_file_current(s3_object=s3_object, local_path=local_path):
+        themeda_preproc.download.call_with_retry(
+            func=functools.partial(
+                download_object_atomic,
+                client=client,
+                bucket=bucket,
+                s3_object=s3_object,
+                local_path=local_path,
+            ),
+            n_attempts=n_attempts,
+            backoff_s=backoff_s,
+            exceptions=(
+                botocore.exceptions.BotoCoreError,
+                botocore.exceptions.ClientError,
+                ValueError,
+            ),
+            is_retryable=is_retryable_error,
         )
 
-        to_download = {}
-
-        for page in pages:
-            for item in page["Contents"]:
-                path = pathlib.Path(item["Key"])
-
-                if path.name.endswith("level4.tif"):
-                    local_path = output_dir / path.name
-
-                    if not themeda_preproc.utils.is_path_existing_and_read_only(
-                        path=local_path
-                    ):
-                        to_download[item["Key"]] = local_path
-
-        with contextlib.closing(
-            tqdm.tqdm(
-                iterable=None,
-                total=len(to_download),
-                disable=not show_progress,
-            )
-        ) as progress_bar:
-            for file_key, local_path in to_download.items():
-                client.download_file(
-                    Bucket=bucket,
-                    Key=file_key,
-                    Filename=str(local_path),
-                )
-
-                if protect:
-                    themeda_preproc.utils.protect_path(path=local_path)
-
-                progress_bar.update()
+    if protect:
+        themeda_preproc.utils.protect_path(path=local_path)
+
+
+def is_retryable_error(exception: BaseException) -> bool:
+    "Determines whether an error from S3 is transient (e.g., throttling or 5xx)"
+
+    if not isinstance(exception, botocore.exceptions.ClientError):
+        return True
+
+    code = exception.response.get("Error", {}).get("Code", "")
+    status = exception.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+
+    return code in RETRYABLE_ERROR_CODES or status >= HTTP_SERVER_ERROR
+
+
+def download_object_atomic(
+    client: "mypy_boto3_s3.S3Client",
+    bucket: str,
+    s3_object: S3Object,
+    local_path: pathlib.Path,
+    chunk_size: int = 1024 * 1024,
+) -> None:
+    "Downloads an object into a temporary file, and renames it once complete"
+
+    partial_path = themeda_preproc.utils.get_partial_path(path=local_path)
+
+    response = client.get_object(Bucket=bucket, Key=s3_object.key)
+
+    with contextlib.closing(response["Body"]) as body, partial_path.open(
+        "wb"
+    ) as handle:
+        for chunk in body.iter_chunks(chunk_size=chunk_size):
+            handle.write(chunk)
+
+    n_bytes = partial_path.stat().st_size
+
+    if n_bytes != s3_object.size:
+        raise ValueError(
+            f"Incomplete download of {s3_object.key}; "
+            + f"received {n_bytes} of {s3_object.size} bytes"
+        )
+
+    partial_path.replace(target=local_path)
+
+
+def is_local_file_current(
+    s3_object: S3Object,
+    local_path: pathlib.Path,
+) -> bool:
+    """
+    Determines whether a local file matches an S3 object. The sizes are compared and,
+    if the file is not protected (and hence may be a leftover from an interrupted or
+    modified download) and the object's ETag is an MD5 hash, so are the contents.
+    """
+
+    if not local_path.exists():
+        return False
+
+    if local_path.stat().st_size != s3_object.size:
+        return False
+
+    # objects uploaded in multiple parts have ETags that aren't a simple hash
+    if themeda_preproc.utils.is_path_existing_and_read_only(
+        path=local_path
+    ) or not is_etag_md5(etag=s3_object.etag):
+        return True
+
+    return get_md5(path=local_path) == s3_object.etag
+
+
+def is_etag_md5(etag: str) -> bool:
+    return len(etag) == 32 and all(char in "0123456789abcdef" for char in etag)
+
+
+def get_md5(path: pathlib.Path, chunk_size: int = 1024 * 1024) -> str:
+    md5 = hashlib.md5()
+
+    with path.open("rb") as handle:
+        for chunk in iter(functools.partial(handle.read, chunk_size), b""):
+            md5.update(chunk)
+
+    return md5.hexdigest()
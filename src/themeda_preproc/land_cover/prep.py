@@ -1,13 +1,16 @@
 import pathlib
+import typing
 import types
 import collections
 import contextlib
-import shutil
+
+import polars as pl
 
 import tqdm
 
 import themeda_preproc.source
 import themeda_preproc.utils
+import themeda_preproc.catalog
 import themeda_preproc.land_cover.utils
 
 
@@ -15,7 +18,11 @@ def run(
     source_name: themeda_preproc.source.DataSourceName,
     base_output_dir: pathlib.Path,
     protect: bool = True,
+    materialise_strategy: themeda_preproc.utils.MaterialiseStrategy = (
+        themeda_preproc.utils.MaterialiseStrategy.REFLINK
+    ),
     show_progress: bool = True,
+    cores: int = 4,
 ) -> None:
     raw_dir = base_output_dir / "raw" / source_name.value
     prep_dir = base_output_dir / "prep" / source_name.value
@@ -41,6 +48,13 @@ def run(
     # define the expected year count as the most common across the locations
     ((expected_n_years, _),) = n_years_counter.most_common(n=1)
 
+    valid_grid_refs = get_valid_grid_refs(
+        raw_chip_path_info=raw_chip_path_info,
+        expected_n_years=expected_n_years,
+        base_output_dir=base_output_dir,
+        n_workers=cores,
+    )
+
     with contextlib.closing(
         tqdm.tqdm(
             iterable=None,
@@ -48,11 +62,9 @@ def run(
             disable=not show_progress,
         )
     ) as progress_bar:
-        for grid_ref_raw_path_info in raw_chip_path_info.values():
-            if not is_grid_ref_valid(
-                grid_ref_raw_chip_path_info=grid_ref_raw_path_info,
-                expected_n_years=expected_n_years,
-            ):
+        for grid_ref, grid_ref_raw_path_info in raw_chip_path_info.items():
+            if grid_ref not in valid_grid_refs:
+                progress_bar.update()
                 continue
 
             for chip_path_info in grid_ref_raw_path_info:
@@ -63,52 +75,71 @@ def run(
                 if not themeda_preproc.utils.is_path_existing_and_read_only(
                     path=output_path
                 ):
-                    shutil.copy2(
+                    themeda_preproc.utils.materialise_file(
                         src=chip_path_info.path,
                         dst=output_path,
+                        strategy=materialise_strategy,
+                        protect=protect,
                     )
 
-                    if protect:
-                        themeda_preproc.utils.protect_path(path=output_path)
-
             progress_bar.update()
 
 
-def is_grid_ref_valid(
-    grid_ref_raw_chip_path_info: list[themeda_preproc.chips.ChipPathInfo],
+def get_valid_grid_refs(
+    raw_chip_path_info: typing.Mapping[
+        themeda_preproc.chips.GridRef, list[themeda_preproc.chips.ChipPathInfo]
+    ],
     expected_n_years: int,
-) -> bool:
-    n_years = len(grid_ref_raw_chip_path_info)
+    base_output_dir: pathlib.Path,
+    n_workers: int = 4,
+) -> set[themeda_preproc.chips.GridRef]:
+    """
+    Determines the grid refs that have chips for the expected number of years, with
+    the same geometry in each year. The chip headers are read concurrently (or taken
+    from the catalog, where current).
+    """
+
+    candidates = {
+        grid_ref: grid_ref_raw_chip_path_info
+        for (grid_ref, grid_ref_raw_chip_path_info) in raw_chip_path_info.items()
+        if len(grid_ref_raw_chip_path_info) == expected_n_years
+    }
+
+    entries = themeda_preproc.catalog.get_entries(
+        paths=[
+            chip_path_info.path
+            for grid_ref_raw_chip_path_info in candidates.values()
+            for chip_path_info in grid_ref_raw_chip_path_info
+        ],
+        base_output_dir=base_output_dir,
+        catalog=themeda_preproc.catalog.load_catalog(base_output_dir=base_output_dir),
+        n_workers=n_workers,
+    )
 
-    if n_years != expected_n_years:
-        return False
+    valid_grid_refs = set()
 
-    reference_chip = themeda_preproc.chips.read_chip(
-        path=grid_ref_raw_chip_path_info[0].path,
-        load_data=False,
-    )
+    # the entries are in the same order as the paths
+    offset = 0
+
+    for grid_ref, grid_ref_raw_chip_path_info in candidates.items():
+        grid_ref_entries = entries.slice(
+            offset=offset,
+            length=len(grid_ref_raw_chip_path_info),
+        )
+
+        if is_grid_ref_valid(grid_ref_entries=grid_ref_entries):
+            valid_grid_refs.add(grid_ref)
+
+        offset += len(grid_ref_raw_chip_path_info)
+
+    return valid_grid_refs
+
+
+def is_grid_ref_valid(grid_ref_entries: pl.dataframe.frame.DataFrame) -> bool:
+    "Determines whether the chips at a grid ref all have the same geometry"
+
+    n_geometries = grid_ref_entries.select(
+        themeda_preproc.catalog.GEOMETRY_COLUMNS
+    ).n_unique()
 
-    for comparison_chip_path_info in grid_ref_raw_chip_path_info[1:]:
-        with contextlib.closing(
-            themeda_preproc.chips.read_chip(
-                path=comparison_chip_path_info.path,
-                load_data=False,
-            )
-        ) as comparison_chip:
-            ok = all(
-                [
-                    reference_chip.x.equals(comparison_chip.x),
-                    reference_chip.y.equals(comparison_chip.y),
-                    reference_chip.rio.bounds() == comparison_chip.rio.bounds(),
-                    reference_chip.rio.crs == comparison_chip.rio.crs,
-                    reference_chip.rio.shape == comparison_chip.rio.shape,
-                    reference_chip.rio.transform() == comparison_chip.rio.transform(),
-                ],
-            )
-
-            if not ok:
-                return False
-
-    reference_chip.close()
-
-    return True
+    return bool(n_geometries == 1)
@@ -2,15 +2,15 @@ import pathlib
 import types
 import collections
 import contextlib
-import shutil
 
-import odc.geo.xr  # noqa
+import odc.geo.geobox
 
 import tqdm
 
 import themeda_preproc.source
 import themeda_preproc.roi
 import themeda_preproc.utils
+import themeda_preproc.catalog
 import themeda_preproc.land_cover.utils
 
 
@@ -19,6 +19,9 @@ def run(
     roi_name: themeda_preproc.roi.ROIName,
     base_output_dir: pathlib.Path,
     protect: bool = True,
+    materialise_strategy: themeda_preproc.utils.MaterialiseStrategy = (
+        themeda_preproc.utils.MaterialiseStrategy.REFLINK
+    ),
     show_progress: bool = True,
 ) -> None:
     roi = themeda_preproc.roi.RegionOfInterest(
@@ -48,6 +51,16 @@ def run(
     # make immutable
     prep_chip_path_info = types.MappingProxyType(prep_chip_path_info)
 
+    # the first chip at each location represents the geometry for all the years
+    representative_entries = themeda_preproc.catalog.get_entries(
+        paths=[
+            representative_chip_path_info.path
+            for (representative_chip_path_info, *_) in prep_chip_path_info.values()
+        ],
+        base_output_dir=base_output_dir,
+        catalog=themeda_preproc.catalog.load_catalog(base_output_dir=base_output_dir),
+    )
+
     with contextlib.closing(
         tqdm.tqdm(
             iterable=None,
@@ -55,11 +68,12 @@ def run(
             disable=not show_progress,
         )
     ) as progress_bar:
-        for grid_ref_path_info in prep_chip_path_info.values():
-            (representative_chip, *_) = grid_ref_path_info
-
+        for grid_ref_path_info, representative_entry in zip(
+            prep_chip_path_info.values(),
+            representative_entries.iter_rows(named=True),
+        ):
             if not is_grid_ref_valid(
-                grid_ref_chip_path_info=representative_chip,
+                geobox=themeda_preproc.catalog.get_geobox(entry=representative_entry),
                 roi=roi,
             ):
                 continue
@@ -72,29 +86,22 @@ def run(
                 if not themeda_preproc.utils.is_path_existing_and_read_only(
                     path=output_path
                 ):
-                    shutil.copy2(
+                    themeda_preproc.utils.materialise_file(
                         src=chip_path_info.path,
                         dst=output_path,
+                        strategy=materialise_strategy,
+                        protect=protect,
                     )
 
-                    if protect:
-                        themeda_preproc.utils.protect_path(path=output_path)
-
             progress_bar.update()
 
 
 def is_grid_ref_valid(
-    grid_ref_chip_path_info: themeda_preproc.chips.ChipPathInfo,
+    geobox: odc.geo.geobox.GeoBox,
     roi: themeda_preproc.roi.RegionOfInterest,
 ) -> bool:
-    with contextlib.closing(
-        themeda_preproc.chips.read_chip(
-            path=grid_ref_chip_path_info.path,
-            load_data=False,
-        )
-    ) as reference_chip:
-        chip_bounds = reference_chip.odc.geobox.boundingbox.polygon.geom
+    chip_bounds = geobox.boundingbox.polygon.geom
 
-        intersects: bool = chip_bounds.intersects(other=roi.shape)
+    intersects: bool = chip_bounds.intersects(other=roi.shape)
 
     return intersects
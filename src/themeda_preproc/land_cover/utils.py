@@ -3,24 +3,58 @@ import types
 
 import xarray as xr
 
+import odc.geo.geobox
+
 import themeda_preproc.chips
 import themeda_preproc.roi
+import themeda_preproc.catalog
 
 
-def load_reference_chips(
+def load_reference_geoboxes(
     base_output_dir: pathlib.Path,
     roi_name: themeda_preproc.roi.ROIName,
-) -> types.MappingProxyType[themeda_preproc.chips.GridRef, xr.DataArray]:
-    base_chip_dir = base_output_dir / "chips" / f"roi_{roi_name.value}" / "land_cover"
+    n_workers: int = 4,
+) -> types.MappingProxyType[themeda_preproc.chips.GridRef, odc.geo.geobox.GeoBox]:
+    """
+    Gets the geoboxes of the DEA chips, using the catalog where it is current and
+    otherwise reading the chip headers.
+    """
+
+    chip_dir = get_reference_chip_dir(
+        base_output_dir=base_output_dir, roi_name=roi_name
+    )
 
-    # work out which DEA chip year to use as the reference
-    (base_chip_ref_year, *_) = (
-        int(base_chip_year_path.name)
-        for base_chip_year_path in sorted(base_chip_dir.glob("*"))
-        if base_chip_year_path.is_dir()
+    chip_paths = sorted(chip_dir.glob("*.tif"))
+
+    entries = themeda_preproc.catalog.get_entries(
+        paths=chip_paths,
+        base_output_dir=base_output_dir,
+        catalog=themeda_preproc.catalog.load_catalog(base_output_dir=base_output_dir),
+        n_workers=n_workers,
     )
 
-    chip_dir = base_chip_dir / str(base_chip_ref_year)
+    base_geoboxes: dict[themeda_preproc.chips.GridRef, odc.geo.geobox.GeoBox] = {}
+
+    for base_chip_path, entry in zip(chip_paths, entries.iter_rows(named=True)):
+        base_chip_path_info = parse_chip_path(path=base_chip_path)
+
+        if base_chip_path_info.grid_ref in base_geoboxes:
+            raise ValueError("Unexpected grid ref duplication")
+
+        base_geoboxes[
+            base_chip_path_info.grid_ref
+        ] = themeda_preproc.catalog.get_geobox(entry=entry)
+
+    return types.MappingProxyType(base_geoboxes)
+
+
+def load_reference_chips(
+    base_output_dir: pathlib.Path,
+    roi_name: themeda_preproc.roi.ROIName,
+) -> types.MappingProxyType[themeda_preproc.chips.GridRef, xr.DataArray]:
+    chip_dir = get_reference_chip_dir(
+        base_output_dir=base_output_dir, roi_name=roi_name
+    )
 
     # load all the DEA chips
     base_chips: dict[themeda_preproc.chips.GridRef, xr.DataArray] = {}
@@ -43,6 +77,22 @@ def load_reference_chips(
     return base_chips
 
 
+def get_reference_chip_dir(
+    base_output_dir: pathlib.Path,
+    roi_name: themeda_preproc.roi.ROIName,
+) -> pathlib.Path:
+    base_chip_dir = base_output_dir / "chips" / f"roi_{roi_name.value}" / "land_cover"
+
+    # work out which DEA chip year to use as the reference
+    (base_chip_ref_year, *_) = (
+        int(base_chip_year_path.name)
+        for base_chip_year_path in sorted(base_chip_dir.glob("*"))
+        if base_chip_year_path.is_dir()
+    )
+
+    return base_chip_dir / str(base_chip_ref_year)
+
+
 def parse_chip_path(path: pathlib.Path) -> themeda_preproc.chips.ChipPathInfo:
     "Parses the metadata in a chip filename"
 
@@ -1,19 +1,24 @@
 """
-Acquires the land use data by downloading the zipped data from the relevant websites.
+Acquires the land use data by downloading the zipped data from the relevant websites
+and extracting the NLUM GeoTIFFs into the same directory.
 """
 
+import fnmatch
 import pathlib
 
 import themeda_preproc.source
 import themeda_preproc.utils
+import themeda_preproc.archive
 
 
 def run(
     source_name: themeda_preproc.source.DataSourceName,
     base_output_dir: pathlib.Path,
     protect: bool = True,
+    n_download_workers: int = 8,
 ) -> None:
     output_dir = base_output_dir / "raw" / source_name.value
+    output_dir.mkdir(exist_ok=True, parents=True)
 
     urls = [
         "https://anrdl-integration-web-catalog-saxfirxkxt.s3-ap-southeast-2.amazonaws.com/warehouse/luav4g9abl078/luav4g9abl07811a01egialb132.zip",
@@ -22,16 +27,27 @@ def run(
         "https://www.agriculture.gov.au/sites/default/files/documents/nlum_alumv8_250m_2015_16_alb.zip",
     ]
 
+    local_paths = []
+
     for url in urls:
         (*_, filename) = url.split("/")
 
         local_path = output_dir / filename
+        local_paths.append(local_path)
 
         if not local_path.exists():
             themeda_preproc.utils.download_file(
                 url=url,
                 output_path=local_path,
+                n_parallel=n_download_workers,
             )
 
             if protect:
                 themeda_preproc.utils.protect_path(path=local_path)
+
+    themeda_preproc.archive.extract_archives(
+        archive_paths=local_paths,
+        output_dir=output_dir,
+        member_filter=lambda filename: fnmatch.fnmatch(filename, "NLUM*.tif"),
+        protect=protect,
+    )
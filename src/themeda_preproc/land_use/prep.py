@@ -1,8 +1,8 @@
 import pathlib
-import shutil
 
 import xarray as xr
 
+import themeda_preproc.chips
 import themeda_preproc.source
 import themeda_preproc.utils
 import themeda_preproc.land_cover.utils
@@ -12,7 +12,11 @@ import themeda_preproc.land_use.labels
 def run(
     source_name: themeda_preproc.source.DataSourceName,
     base_output_dir: pathlib.Path,
+    codec: themeda_preproc.chips.Codec = themeda_preproc.chips.Codec.LZW,
     protect: bool = True,
+    materialise_strategy: themeda_preproc.utils.MaterialiseStrategy = (
+        themeda_preproc.utils.MaterialiseStrategy.REFLINK
+    ),
 ) -> None:
     raw_dir = base_output_dir / "raw" / source_name.value
     prep_dir = base_output_dir / "prep" / source_name.value
@@ -31,21 +35,27 @@ def run(
             # the land use code based on a LUT
             if chip_path.name.startswith("lu"):
                 chip = convert_chip_value_to_land_use_code(chip_path=chip_path)
-                chip.rio.to_raster(
-                    raster_path=output_path,
-                    compress="lzw",
+                themeda_preproc.chips.write_chip(
+                    chip=chip,
+                    path=output_path,
+                    resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[
+                        source_name
+                    ],
+                    codec=codec,
                 )
 
-            # otherwise, we can just copy the file
+                if protect:
+                    themeda_preproc.utils.protect_path(path=output_path)
+
+            # otherwise, we can just link to (or copy) the file
             else:
-                shutil.copy2(
+                themeda_preproc.utils.materialise_file(
                     src=chip_path,
                     dst=output_path,
+                    strategy=materialise_strategy,
+                    protect=protect,
                 )
 
-            if protect:
-                themeda_preproc.utils.protect_path(path=output_path)
-
 
 def convert_chip_value_to_land_use_code(chip_path: pathlib.Path) -> xr.DataArray:
     lu_code_lut = themeda_preproc.land_use.labels.get_lu_code_lut(
@@ -7,10 +7,12 @@ import xarray as xr
 
 import rasterio
 
-import odc.geo.xr  # noqa
+import odc.geo.xr
+import odc.geo.geobox
 
 import tqdm
 
+import themeda_preproc.chips
 import themeda_preproc.source
 import themeda_preproc.roi
 import themeda_preproc.utils
@@ -22,6 +24,7 @@ def run(
     source_name: themeda_preproc.source.DataSourceName,
     roi_name: themeda_preproc.roi.ROIName,
     base_output_dir: pathlib.Path,
+    codec: themeda_preproc.chips.Codec = themeda_preproc.chips.Codec.LZW,
     protect: bool = True,
     show_progress: bool = True,
 ) -> None:
@@ -30,15 +33,15 @@ def run(
     chip_dir = base_output_dir / "chips" / f"roi_{roi_name.value}" / source_name.value
     chip_dir.mkdir(exist_ok=True, parents=True)
 
-    # load all the DEA chips
-    ref_chips = themeda_preproc.land_cover.utils.load_reference_chips(
+    # load the geometry of all the DEA chips
+    ref_geoboxes = themeda_preproc.land_cover.utils.load_reference_geoboxes(
         base_output_dir=base_output_dir,
         roi_name=roi_name,
     )
 
     years = themeda_preproc.utils.get_years_in_path(path=prep_dir)
 
-    n_total_conversions = len(years) * len(ref_chips)
+    n_total_conversions = len(years) * len(ref_geoboxes)
 
     with contextlib.closing(
         tqdm.tqdm(
@@ -66,7 +69,7 @@ def run(
                 masked=True,
             )
 
-            for grid_ref, base_chip in ref_chips.items():
+            for grid_ref, ref_geobox in ref_geoboxes.items():
                 output_path = (
                     year_chip_dir
                     / f"{source_name.value}_roi_{roi_name.value}_{year}_{grid_ref}.tif"
@@ -77,12 +80,16 @@ def run(
                 ):
                     converted_chip = convert_chip(
                         land_use_chip=land_use_chip,
-                        dea_chip=base_chip,
+                        ref_geobox=ref_geobox,
                     )
 
-                    converted_chip.rio.to_raster(
-                        raster_path=output_path,
-                        compress="lzw",
+                    themeda_preproc.chips.write_chip(
+                        chip=converted_chip,
+                        path=output_path,
+                        resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[
+                            source_name
+                        ],
+                        codec=codec,
                     )
 
                     if protect:
@@ -93,7 +100,7 @@ def run(
 
 def convert_chip(
     land_use_chip: xr.DataArray,
-    dea_chip: xr.DataArray,
+    ref_geobox: odc.geo.geobox.GeoBox,
 ) -> xr.DataArray:
     source_name = themeda_preproc.source.DataSourceName("land_use")
     nodata_val = themeda_preproc.source.DATA_SOURCE_NODATA[source_name]
@@ -101,7 +108,7 @@ def convert_chip(
     interp_method = rasterio.enums.Resampling.nearest
 
     land_use_chip_resampled = land_use_chip.odc.reproject(
-        how=dea_chip.odc.geobox,
+        how=ref_geobox,
         resampling=interp_method,
     ).compute()
 
@@ -113,7 +120,7 @@ def convert_chip(
 
     land_use_chip_resampled = land_use_chip_resampled.astype(np.uint16)
 
-    land_use_chip_resampled.rio.set_crs(input_crs=dea_chip.rio.crs, inplace=True)
+    land_use_chip_resampled.rio.set_crs(input_crs=ref_geobox.crs.to_wkt(), inplace=True)
     land_use_chip_resampled.rio.set_nodata(input_nodata=nodata_val, inplace=True)
 
     return land_use_chip_resampled
@@ -0,0 +1,239 @@
+"""
+Loads batches of chiplets across data sources and years, for use in training models.
+
+Each batch is an array with dimensions of (chiplet, year, source, y, x), formed by
+gathering the chiplets of the batch from each (source, year) array in a single read.
+The chiplets within each batch are sorted by their index, so that the reads are as
+local as possible, and batches are read ahead of their use by a pool of background
+threads. The chiplet arrays are held open by a `chiplets.ChipletsPool`. Continuous
+data sources are converted (and optionally de-NaN-ed and normalised) as they are read,
+via `chiplets.prepare_chiplets`.
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import themeda_preproc.chiplets
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.summary_stats
+
+
+@dataclasses.dataclass(frozen=True)
+class Batch:
+    indices: npt.NDArray[np.int64]
+    data: npt.NDArray[np.float32]
+
+
+@dataclasses.dataclass(frozen=True)
+class Normaliser:
+    mean: float
+    sd: float
+    log_transformed: bool = False
+
+
+def iter_batches(
+    indices: npt.ArrayLike,
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    years: typing.Sequence[int],
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int = 0,
+    batch_size: int = 32,
+    base_size_pix: int = 160,
+    normalise: bool = False,
+    log_transformed: bool = False,
+    denan_at_read: bool = False,
+    shuffle: bool = False,
+    rand_seed: typing.Optional[int] = None,
+    drop_last: bool = False,
+    n_workers: int = 4,
+    n_prefetch: int = 4,
+    pool: typing.Optional[themeda_preproc.chiplets.ChipletsPool] = None,
+) -> typing.Iterator[Batch]:
+    """
+    Yields batches of the chiplets with the given indices (e.g., those in a subset of
+    the chiplet table). Years that are not available for a data source are missing
+    (NaN). If `normalise` is set, continuous data sources are standardised using
+    their summary statistics (after a log transform, if `log_transformed`). If
+    `denan_at_read` is set, continuous data sources are read from the original
+    chiplets and their NaNs are filled as they are read, rather than being read from
+    the de-NaN-ed chiplets. Up to `n_prefetch` batches are read ahead.
+    """
+
+    indices = np.asarray(indices, dtype=np.int64)
+
+    if shuffle:
+        indices = np.random.default_rng(seed=rand_seed).permutation(indices)
+
+    batch_indices = [
+        np.sort(indices[i_start : i_start + batch_size])
+        for i_start in range(0, len(indices), batch_size)
+    ]
+
+    if drop_last and len(batch_indices) > 0 and len(batch_indices[-1]) < batch_size:
+        batch_indices.pop()
+
+    source_years = {
+        source_name: set(
+            themeda_preproc.chiplets.get_chiplet_years(
+                source_name=source_name,
+                roi_name=roi_name,
+                pad_size_pix=pad_size_pix,
+                base_output_dir=base_output_dir,
+                denan=not denan_at_read,
+            )
+        )
+        for source_name in source_names
+    }
+
+    normalisers = (
+        get_normalisers(
+            source_names=source_names,
+            roi_name=roi_name,
+            base_output_dir=base_output_dir,
+            log_transformed=log_transformed,
+        )
+        if normalise
+        else {}
+    )
+
+    if pool is None:
+        pool = themeda_preproc.chiplets.ChipletsPool(
+            base_output_dir=base_output_dir,
+            base_size_pix=base_size_pix,
+            max_handles=max(len(source_names) * len(years), 1),
+        )
+
+    def load(curr_indices: npt.NDArray[np.int64]) -> Batch:
+        assert pool is not None
+
+        return load_batch(
+            indices=curr_indices,
+            source_names=source_names,
+            years=years,
+            source_years=source_years,
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+            base_size_pix=base_size_pix,
+            normalisers=normalisers,
+            denan_at_read=denan_at_read,
+            pool=pool,
+        )
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=n_workers)
+
+    try:
+        pending: collections.deque[
+            concurrent.futures.Future[Batch]
+        ] = collections.deque()
+
+        for curr_indices in batch_indices:
+            pending.append(executor.submit(load, curr_indices))
+
+            if len(pending) > n_prefetch:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+    finally:
+        # the batches that have been read ahead are not needed if iteration stops
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def load_batch(
+    indices: npt.NDArray[np.int64],
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    years: typing.Sequence[int],
+    source_years: typing.Mapping[themeda_preproc.source.DataSourceName, set[int]],
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_size_pix: int,
+    normalisers: typing.Mapping[themeda_preproc.source.DataSourceName, Normaliser],
+    denan_at_read: bool,
+    pool: themeda_preproc.chiplets.ChipletsPool,
+) -> Batch:
+    """
+    Reads a batch of chiplets, with sorted indices, from each (source, year) array,
+    where the year is one of the `source_years` that are available for the source.
+    """
+
+    size_pix = base_size_pix + pad_size_pix * 2
+
+    data = np.full(
+        shape=(len(indices), len(years), len(source_names), size_pix, size_pix),
+        fill_value=np.nan,
+        dtype=np.float32,
+    )
+
+    for i_year, year in enumerate(years):
+        for i_source, source_name in enumerate(source_names):
+            if year not in source_years[source_name]:
+                continue
+
+            chiplets = pool.get(
+                source_name=source_name,
+                year=year,
+                roi_name=roi_name,
+                pad_size_pix=pad_size_pix,
+                denan=not denan_at_read,
+            )
+
+            if not themeda_preproc.source.is_data_source_continuous(
+                source_name=source_name
+            ):
+                data[:, i_year, i_source] = chiplets[indices]
+                continue
+
+            normaliser = normalisers.get(source_name, Normaliser(mean=0.0, sd=1.0))
+
+            # converts and normalises directly into the batch
+            themeda_preproc.chiplets.prepare_chiplets(
+                chiplets=chiplets[indices],
+                fill_nan=denan_at_read,
+                log_transform=normaliser.log_transformed,
+                mean=normaliser.mean,
+                sd=normaliser.sd,
+                out=data[:, i_year, i_source],
+            )
+
+    return Batch(indices=indices, data=data)
+
+
+def get_normalisers(
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    log_transformed: bool = False,
+) -> dict[themeda_preproc.source.DataSourceName, Normaliser]:
+    "Gets the normalisation for each continuous data source from its summary stats"
+
+    normalisers = {}
+
+    for source_name in source_names:
+        if not themeda_preproc.source.is_data_source_continuous(
+            source_name=source_name
+        ):
+            continue
+
+        stats = themeda_preproc.summary_stats.load_stats(
+            source_name=source_name,
+            roi_name=roi_name,
+            base_output_dir=base_output_dir,
+            log_transformed=log_transformed,
+        )
+
+        normalisers[source_name] = Normaliser(
+            mean=stats.mean,
+            sd=stats.sd,
+            log_transformed=stats.log_transformed,
+        )
+
+    return normalisers
@@ -0,0 +1,355 @@
+"""
+Forms low-resolution mosaics of the chiplets for each year of a data source, for use
+in visualisations.
+
+Each mosaic is formed directly from the (unpadded) chiplets by reducing each chiplet
+in blocks - via the mean for continuous data sources and via the block centre for
+categorical data sources - and placing it at its location. The mosaics are cached in
+the `mosaics` directory as GeoTIFF files, alongside a JSON file that records the
+range of the data values and a key describing the inputs. A cached mosaic is re-used
+as long as its inputs are unchanged.
+"""
+
+import contextlib
+import dataclasses
+import hashlib
+import json
+import pathlib
+import typing
+import warnings
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import rasterio.enums
+import rioxarray  # noqa
+
+import polars as pl
+
+import tqdm
+
+import themeda_preproc.chips
+import themeda_preproc.chiplets
+import themeda_preproc.chiplet_table
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+@dataclasses.dataclass(frozen=True)
+class Mosaic:
+    data: xr.DataArray
+    min_val: typing.Union[int, float]
+    max_val: typing.Union[int, float]
+
+
+def run(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int] = 1_000,
+    base_size_pix: int = 160,
+    show_progress: bool = True,
+) -> None:
+    years = themeda_preproc.chiplets.get_chiplet_years(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=base_output_dir,
+        denan=True,
+    )
+
+    for year in tqdm.tqdm(iterable=years, disable=not show_progress):
+        get_mosaic(
+            source_name=source_name,
+            roi_name=roi_name,
+            year=year,
+            base_output_dir=base_output_dir,
+            resolution=resolution,
+            base_size_pix=base_size_pix,
+        )
+
+
+def get_mosaic(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    year: int,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int] = 1_000,
+    base_size_pix: int = 160,
+) -> Mosaic:
+    "Loads the mosaic from the cache, after forming it if it is absent or outdated"
+
+    (mosaic_path, info_path) = get_mosaic_paths(
+        source_name=source_name,
+        roi_name=roi_name,
+        year=year,
+        base_output_dir=base_output_dir,
+        resolution=resolution,
+    )
+
+    key = get_mosaic_key(
+        source_name=source_name,
+        roi_name=roi_name,
+        year=year,
+        base_output_dir=base_output_dir,
+        resolution=resolution,
+        base_size_pix=base_size_pix,
+    )
+
+    info = load_mosaic_info(info_path=info_path)
+
+    if info is None or info["key"] != key or not mosaic_path.exists():
+        mosaic = form_mosaic(
+            source_name=source_name,
+            roi_name=roi_name,
+            year=year,
+            base_output_dir=base_output_dir,
+            resolution=resolution,
+            base_size_pix=base_size_pix,
+        )
+
+        write_mosaic(
+            mosaic=mosaic,
+            mosaic_path=mosaic_path,
+            info_path=info_path,
+            key=key,
+            resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[source_name],
+        )
+
+        return mosaic
+
+    mosaic = Mosaic(
+        data=themeda_preproc.chips.read_chip(path=mosaic_path, load_data=True),
+        min_val=info["min_val"],
+        max_val=info["max_val"],
+    )
+
+    return mosaic
+
+
+def form_mosaic(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    year: int,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int] = 1_000,
+    base_size_pix: int = 160,
+    block_size: int = 4096,
+) -> Mosaic:
+    table = themeda_preproc.chiplet_table.load_table(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=0,
+    )
+
+    (native_resolution,) = table["chip_transform_i_to_coords_coeff_a"].unique()
+
+    factor = resolution / native_resolution
+
+    if not (factor.is_integer() and base_size_pix % factor == 0):
+        raise ValueError(
+            f"The resolution ({resolution}) needs to be an integer multiple of the "
+            + f"chiplet resolution ({native_resolution}) that divides the chiplets"
+        )
+
+    factor = int(factor)
+    reduced_size_pix = base_size_pix // factor
+
+    sentinel = themeda_preproc.source.DATA_SOURCE_SENTINEL[source_name]
+    is_continuous = themeda_preproc.source.is_data_source_continuous(
+        source_name=source_name
+    )
+
+    (left, top) = (table["bbox_left"].min(), table["bbox_top"].max())
+
+    i_cols = ((table["bbox_left"] - left) / resolution).cast(pl.Int64).to_numpy()
+    i_rows = ((top - table["bbox_top"]) / resolution).cast(pl.Int64).to_numpy()
+
+    data = np.full(
+        shape=(
+            int(i_rows.max()) + reduced_size_pix,
+            int(i_cols.max()) + reduced_size_pix,
+        ),
+        fill_value=sentinel,
+        dtype=np.float32 if is_continuous else np.uint8,
+    )
+
+    indices = table["index"].to_numpy()
+
+    with themeda_preproc.chiplets.chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+    ) as chiplets:
+        for i_block_start in range(0, len(chiplets), block_size):
+            block = slice(i_block_start, i_block_start + block_size)
+
+            reduced_chiplets = reduce_chiplets(
+                chiplets=chiplets[block],
+                factor=factor,
+                average=is_continuous,
+            )
+
+            is_in_block = (indices >= block.start) & (indices < block.stop)
+
+            for index, i_row, i_col in zip(
+                indices[is_in_block], i_rows[is_in_block], i_cols[is_in_block]
+            ):
+                data[
+                    i_row : i_row + reduced_size_pix,
+                    i_col : i_col + reduced_size_pix,
+                ] = reduced_chiplets[index - block.start]
+
+    (n_rows, n_cols) = data.shape
+
+    data_array = xr.DataArray(
+        data=data,
+        dims=("y", "x"),
+        coords={
+            "x": left + (np.arange(n_cols) + 0.5) * resolution,
+            "y": top - (np.arange(n_rows) + 0.5) * resolution,
+        },
+    )
+
+    data_array.rio.write_crs(input_crs=3577, inplace=True)
+    data_array.rio.write_nodata(input_nodata=sentinel, inplace=True)
+
+    valid_data = data[np.isfinite(data) if is_continuous else data != sentinel]
+
+    (min_val, max_val) = (
+        (valid_data.min().item(), valid_data.max().item())
+        if valid_data.size > 0
+        else (sentinel, sentinel)
+    )
+
+    return Mosaic(data=data_array, min_val=min_val, max_val=max_val)
+
+
+def reduce_chiplets(
+    chiplets: npt.NDArray,
+    factor: int,
+    average: bool,
+) -> npt.NDArray:
+    """
+    Reduces the resolution of a set of chiplets by `factor`, either by averaging (and
+    ignoring NaNs) or by taking the value at the centre of each block.
+    """
+
+    if not average:
+        offset = factor // 2
+        return chiplets[:, offset::factor, offset::factor]
+
+    (n_chiplets, n_rows, n_cols) = chiplets.shape
+
+    blocks = chiplets.astype(np.float32).reshape(
+        n_chiplets, n_rows // factor, factor, n_cols // factor, factor
+    )
+
+    # blocks that are all NaN are expected
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        reduced: npt.NDArray = np.nanmean(blocks, axis=(2, 4))
+
+    return reduced
+
+
+def write_mosaic(
+    mosaic: Mosaic,
+    mosaic_path: pathlib.Path,
+    info_path: pathlib.Path,
+    key: str,
+    resampling: rasterio.enums.Resampling = rasterio.enums.Resampling.nearest,
+) -> None:
+    mosaic_path.parent.mkdir(exist_ok=True, parents=True)
+
+    # remove the info first so that a partially-written cache is never seen as current
+    info_path.unlink(missing_ok=True)
+
+    partial_path = themeda_preproc.utils.get_partial_path(path=mosaic_path)
+
+    themeda_preproc.chips.write_chip(
+        chip=mosaic.data,
+        path=partial_path,
+        resampling=resampling,
+    )
+
+    partial_path.replace(target=mosaic_path)
+
+    info = {"key": key, "min_val": mosaic.min_val, "max_val": mosaic.max_val}
+
+    info_path.write_text(json.dumps(info))
+
+
+def load_mosaic_info(info_path: pathlib.Path) -> typing.Optional[dict[str, typing.Any]]:
+    if not info_path.exists():
+        return None
+
+    with contextlib.suppress(json.JSONDecodeError):
+        info: dict[str, typing.Any] = json.loads(info_path.read_text())
+        return info
+
+    return None
+
+
+def get_mosaic_key(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    year: int,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int],
+    base_size_pix: int,
+) -> str:
+    "Forms a key that changes if any of the inputs to a mosaic change"
+
+    input_paths = [
+        themeda_preproc.chiplets.get_chiplet_path(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            pad_size_pix=0,
+            base_output_dir=base_output_dir,
+            denan=True,
+        ),
+        themeda_preproc.chiplet_table.get_table_path(
+            roi_name=roi_name,
+            base_output_dir=base_output_dir,
+            pad_size_pix=0,
+        ),
+    ]
+
+    inputs = {
+        "paths": [
+            (path.name, path.stat().st_size, path.stat().st_mtime_ns)
+            for path in input_paths
+        ],
+        "resolution": float(resolution),
+        "base_size_pix": base_size_pix,
+    }
+
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def get_mosaic_paths(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    year: int,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int],
+) -> tuple[pathlib.Path, pathlib.Path]:
+    "Gets the paths to the mosaic GeoTIFF and its info file"
+
+    mosaic_dir = (
+        base_output_dir / "mosaics" / f"roi_{roi_name.value}" / source_name.value
+    )
+
+    mosaic_stem = (
+        f"mosaic_{source_name.value}_{year}_roi_{roi_name.value}_res_{resolution:g}"
+    )
+
+    return (mosaic_dir / f"{mosaic_stem}.tif", mosaic_dir / f"{mosaic_stem}.json")
@@ -0,0 +1,125 @@
+"""
+Converts the chiplets of data sources with small counts (the fire scars) into a
+packed storage, with two bits per pixel; see `chiplets.pack_chiplets`. The packed
+chiplets can be read via `chiplets.packed_chiplets_reader`.
+"""
+
+import contextlib
+import pathlib
+
+import numpy as np
+
+import tqdm
+
+import themeda_preproc.source
+import themeda_preproc.roi
+import themeda_preproc.chiplets
+import themeda_preproc.utils
+
+
+def run(
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    base_size_pix: int = 160,
+    protect: bool = True,
+    show_progress: bool = True,
+) -> None:
+    if source_name not in themeda_preproc.chiplets.PACKABLE_SOURCES:
+        raise ValueError(f"Chiplets for {source_name} cannot be stored packed")
+
+    years = themeda_preproc.chiplets.get_chiplet_years(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+    )
+
+    with contextlib.closing(
+        tqdm.tqdm(
+            iterable=None,
+            total=len(years),
+            disable=not show_progress,
+        )
+    ) as progress_bar:
+        for year in years:
+            pack_year_chiplets(
+                source_name=source_name,
+                year=year,
+                roi_name=roi_name,
+                pad_size_pix=pad_size_pix,
+                base_output_dir=base_output_dir,
+                base_size_pix=base_size_pix,
+                protect=protect,
+            )
+
+            progress_bar.update()
+
+
+def pack_year_chiplets(
+    source_name: themeda_preproc.source.DataSourceName,
+    year: int,
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    base_output_dir: pathlib.Path,
+    base_size_pix: int = 160,
+    protect: bool = True,
+    block_size: int = 1024,
+) -> None:
+    output_path = themeda_preproc.chiplets.get_chiplet_path(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        packed=True,
+    )
+
+    if themeda_preproc.utils.is_path_existing_and_read_only(path=output_path):
+        return
+
+    # written to a partial path, so that a packing that fails (such as from values
+    # that are out of range) does not leave an output behind
+    partial_path = themeda_preproc.utils.get_partial_path(path=output_path)
+
+    with themeda_preproc.chiplets.chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+        denan=False,
+    ) as chiplets:
+        (n_chiplets, n_rows, n_cols) = chiplets.shape
+
+        packed_chiplets = np.memmap(
+            filename=partial_path,
+            dtype=np.uint8,
+            mode="w+",
+            shape=(
+                n_chiplets,
+                n_rows,
+                n_cols // themeda_preproc.chiplets.PACKED_PIX_PER_BYTE,
+            ),
+        )
+
+        try:
+            for i_block_start in range(0, n_chiplets, block_size):
+                block = slice(i_block_start, i_block_start + block_size)
+                packed_chiplets[block] = themeda_preproc.chiplets.pack_chiplets(
+                    chiplets=np.asarray(chiplets[block])
+                )
+        except ValueError:
+            partial_path.unlink()
+            raise
+
+        packed_chiplets.flush()
+        assert hasattr(packed_chiplets, "_mmap")
+        packed_chiplets._mmap.close()
+
+    partial_path.replace(target=output_path)
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=output_path)
@@ -11,10 +11,6 @@ import polars as pl
 
 import tqdm
 
-import affine
-
-import rioxarray.merge
-
 import themeda_preproc.roi
 import themeda_preproc.chips
 import themeda_preproc.chiplet_table
@@ -58,10 +54,6 @@ def run(
         pad_size_pix=0,
     )
 
-    # insert an empty axis if chiplets are 3D
-    if chiplets.ndim == 3:
-        chiplets = np.expand_dims(a=chiplets, axis=1)
-
     output_spatial_dim_size = base_size_pix + pad_size_pix * 2
     output_shape: typing.Union[tuple[int, int, int, int], tuple[int, int, int]]
     if n_in_extra_dim > 0:
@@ -81,67 +73,41 @@ def run(
 
     nodata = 0 if dtype == np.uint8 else np.nan
 
-    # store the transforms so we don't have to recalculate
-    transforms: dict[themeda_preproc.chips.GridRef, affine.Affine] = {}
+    # the padded chiplets need to be at the same positions as the unpadded chiplets
+    (nopad_positions, pad_positions) = (
+        table.sort(by="index").select(["bbox_left", "bbox_top"]).to_numpy()
+        for table in [nopad_table, pad_table]
+    )
+
+    if not np.array_equal(nopad_positions, pad_positions):
+        raise ValueError("Chiplet tables are inconsistent")
+
+    lattice = themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=0,
+        base_size_pix=base_size_pix,
+    )
+
+    neighbour_indices = themeda_preproc.chiplet_table.get_neighbour_indices(
+        lattice=lattice
+    )
 
     with contextlib.closing(
         tqdm.tqdm(
             iterable=None,
-            total=int(np.prod(chiplets.shape[:2])),
+            total=len(nopad_table),
             disable=not show_progress,
         )
     ) as progress_bar:
-        # consider each entry in the additional dim separately, because memory
-        for i_extra_dim in range(chiplets.shape[1]):
-            data_array = rioxarray.merge.merge_arrays(
-                dataarrays=[
-                    themeda_preproc.chiplets.convert_chiplet_to_data_array(
-                        chiplet=chiplets[i_chiplet, i_extra_dim, :, :],
-                        metadata=row,
-                        pad_size_pix=0,
-                        base_size_pix=base_size_pix,
-                        nodata=nodata,
-                    )
-                    for (i_chiplet, row) in enumerate(nopad_table.iter_rows(named=True))
-                ],
-                nodata=nodata,
-            )
-
-            for row in pad_table.iter_rows(named=True):
-                grid_ref = themeda_preproc.chips.GridRef(
-                    x=row["chip_grid_ref_x_base"],
-                    y=row["chip_grid_ref_y_base"],
-                )
-
-                if grid_ref not in transforms:
-                    transforms[
-                        grid_ref
-                    ] = themeda_preproc.chiplets.get_transform_from_row(row=row)
-
-                try:
-                    padded_chiplet = themeda_preproc.chiplets.get_chiplet_from_packet(
-                        packet=data_array,
-                        chip_i_x_base=row["chip_i_x_base"],
-                        chip_i_y_base=row["chip_i_y_base"],
-                        chip_i_to_coords_transform=transforms[grid_ref],
-                        base_size_pix=base_size_pix,
-                        pad_size_pix=pad_size_pix,
-                        method="nearest",
-                    )
-
-                except KeyError as err:
-                    print("---")
-                    print(err.args)
-                    print(row)
-                    print(grid_ref)
-                    continue
-
-                if n_in_extra_dim > 0:
-                    padded_chiplets[row["index"], i_extra_dim, ...] = padded_chiplet
-                else:
-                    padded_chiplets[row["index"], ...] = padded_chiplet
-
-                progress_bar.update()
+        pad_chiplets(
+            chiplets=chiplets,
+            padded_chiplets=padded_chiplets,
+            neighbour_indices=neighbour_indices,
+            pad_size_pix=pad_size_pix,
+            nodata=nodata,
+            progress_bar=progress_bar,
+        )
 
     padded_chiplets.flush()
     assert hasattr(padded_chiplets, "_mmap")
@@ -151,6 +117,98 @@ def run(
         themeda_preproc.utils.protect_path(path=output_path)
 
 
+def pad_chiplets(
+    chiplets: npt.NDArray[typing.Any],
+    padded_chiplets: npt.NDArray[typing.Any],
+    neighbour_indices: npt.NDArray[np.int64],
+    pad_size_pix: int,
+    nodata: typing.Union[int, float],
+    block_size: int = 256,
+    progress_bar: typing.Optional["tqdm.tqdm[typing.Any]"] = None,
+) -> None:
+    """
+    Writes padded versions of the unpadded `chiplets` (of shape (n_chiplets, ...,
+    base_size_pix, base_size_pix)) into `padded_chiplets`, taking the padding from the
+    chiplets' neighbours (see `chiplet_table.get_neighbour_indices`). The chiplets
+    are processed in blocks of `block_size`, so that only the chiplets in a block and
+    their neighbours need to be held in memory.
+    """
+
+    n_chiplets = len(chiplets)
+
+    for i_block_start in range(0, n_chiplets, block_size):
+        indices = np.arange(i_block_start, min(i_block_start + block_size, n_chiplets))
+
+        padded_chiplets[indices] = get_padded_chiplets(
+            chiplets=chiplets,
+            indices=indices,
+            neighbour_indices=neighbour_indices,
+            pad_size_pix=pad_size_pix,
+            nodata=nodata,
+        )
+
+        if progress_bar is not None:
+            progress_bar.update(n=len(indices))
+
+
+def get_padded_chiplets(
+    chiplets: npt.NDArray[typing.Any],
+    indices: npt.NDArray[np.int64],
+    neighbour_indices: npt.NDArray[np.int64],
+    pad_size_pix: int,
+    nodata: typing.Union[int, float],
+) -> npt.NDArray[typing.Any]:
+    """
+    Assembles padded versions of the chiplets at `indices` from the unpadded
+    `chiplets`, with padding from outside the chiplet set filled with `nodata`.
+    """
+
+    (*_, base_size_pix, _) = chiplets.shape
+
+    if pad_size_pix > base_size_pix:
+        raise ValueError("The padding cannot be larger than the chiplet size")
+
+    block_neighbour_indices = neighbour_indices[indices]
+
+    # read each required chiplet once, in index order (which suits memmaps)
+    required_indices = np.unique(block_neighbour_indices)
+    required_indices = required_indices[required_indices >= 0]
+
+    required_chiplets = chiplets[required_indices]
+
+    # where each neighbour can be found in the required chiplets
+    neighbour_positions = np.asarray(
+        np.searchsorted(required_indices, block_neighbour_indices)
+    )
+
+    padded_size_pix = base_size_pix + pad_size_pix * 2
+
+    padded = np.full(
+        shape=(len(indices), *chiplets.shape[1:-2], padded_size_pix, padded_size_pix),
+        fill_value=nodata,
+        dtype=chiplets.dtype,
+    )
+
+    # the (output, input) slices along a spatial axis for offsets of -1, 0, and 1
+    slices = (
+        (slice(0, pad_size_pix), slice(base_size_pix - pad_size_pix, base_size_pix)),
+        (slice(pad_size_pix, pad_size_pix + base_size_pix), slice(0, base_size_pix)),
+        (slice(pad_size_pix + base_size_pix, padded_size_pix), slice(0, pad_size_pix)),
+    )
+
+    for i_row_offset, (output_rows, input_rows) in enumerate(slices):
+        for i_col_offset, (output_cols, input_cols) in enumerate(slices):
+            is_present = block_neighbour_indices[:, i_row_offset, i_col_offset] >= 0
+
+            positions = neighbour_positions[is_present, i_row_offset, i_col_offset]
+
+            padded[is_present, ..., output_rows, output_cols] = required_chiplets[
+                positions, ..., input_rows, input_cols
+            ]
+
+    return padded
+
+
 def add_padding_to_packet(
     packet: xr.DataArray,
     pad_size_pix: int,
@@ -178,7 +236,7 @@ def load_chiplets(
     pad_size_pix: int = 0,
 ) -> np.memmap[typing.Any, np.dtype[typing.Any]]:
     shape = themeda_preproc.chiplets.get_array_shape(
-        table=chiplet_table,
+        n_chiplets=len(chiplet_table),
         base_size_pix=base_size_pix,
         pad_size_pix=pad_size_pix,
     )
@@ -0,0 +1,287 @@
+"""
+Queries the values of data sources at arbitrary locations, directly from the chiplets.
+
+Locations can be given as points, or as lines or polygons (which are converted into
+points along the line or at the pixel centres within the polygon), in any coordinate
+reference system. Each point is located within the (unpadded) chiplets using the
+chiplet table, and the values at those positions are then gathered from the chiplets
+for each data source and year - so only the parts of the chiplets that contain the
+points are read.
+"""
+
+import concurrent.futures
+import functools
+import pathlib
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import xarray as xr
+
+import shapely
+
+import themeda_preproc.chiplets
+import themeda_preproc.chiplet_table
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+# the coordinate reference system of the chiplets
+CHIPLET_CRS: typing.Final = 3577
+
+
+def query_points(
+    x: npt.ArrayLike,
+    y: npt.ArrayLike,
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    crs: int = 4326,
+    years: typing.Optional[typing.Sequence[int]] = None,
+    base_size_pix: int = 160,
+    n_workers: int = 4,
+) -> xr.DataArray:
+    """
+    Gets the values at each point, with coordinates in `crs`, for each data source and
+    year, as an array with dimensions of (source_name, year, point). If `years` is not
+    provided, all the years that are available for any of the data sources are used.
+    Values are missing (NaN) where a point is not within the chiplets or where the
+    data source does not have a year.
+    """
+
+    (x, y) = (np.atleast_1d(np.asarray(coords, dtype=float)) for coords in (x, y))
+
+    (chiplet_x, chiplet_y) = themeda_preproc.utils.get_shape_transformer(
+        src_crs=crs,
+        dst_crs=CHIPLET_CRS,
+    ).transform(xx=x, yy=y, errcheck=True)
+
+    lattice = themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=0,
+        base_size_pix=base_size_pix,
+    )
+
+    (indices, i_rows, i_cols) = themeda_preproc.chiplet_table.get_point_locations(
+        lattice=lattice,
+        x=np.asarray(chiplet_x),
+        y=np.asarray(chiplet_y),
+    )
+
+    source_years = {
+        source_name: themeda_preproc.chiplets.get_chiplet_years(
+            source_name=source_name,
+            roi_name=roi_name,
+            pad_size_pix=0,
+            base_output_dir=base_output_dir,
+            denan=True,
+        )
+        for source_name in source_names
+    }
+
+    if years is None:
+        years = sorted(set().union(*source_years.values()))
+
+    values = np.full(
+        shape=(len(source_names), len(years), len(x)),
+        fill_value=np.nan,
+        dtype=np.float32,
+    )
+
+    tasks = [
+        (i_source, i_year, source_name, year)
+        for (i_source, source_name) in enumerate(source_names)
+        for (i_year, year) in enumerate(years)
+        if year in source_years[source_name]
+    ]
+
+    sampler = functools.partial(
+        sample_year_chiplets,
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        indices=indices,
+        i_rows=i_rows,
+        i_cols=i_cols,
+        base_size_pix=base_size_pix,
+    )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+        task_values = executor.map(
+            lambda task: sampler(source_name=task[2], year=task[3]),
+            tasks,
+        )
+
+        for (i_source, i_year, *_), task_value in zip(tasks, task_values):
+            values[i_source, i_year, :] = task_value
+
+    values[..., indices < 0] = np.nan
+
+    data = xr.DataArray(
+        data=values,
+        dims=("source_name", "year", "point"),
+        coords={
+            "source_name": [source_name.value for source_name in source_names],
+            "year": np.array(years),
+            "x": ("point", x),
+            "y": ("point", y),
+        },
+    )
+
+    return data
+
+
+def query_line(
+    line: shapely.LineString,
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    crs: int = 4326,
+    spacing_m: float = 25.0,
+    years: typing.Optional[typing.Sequence[int]] = None,
+    base_size_pix: int = 160,
+    n_workers: int = 4,
+) -> xr.DataArray:
+    """
+    Gets the values at points spaced every `spacing_m` metres along a line, with the
+    distance of each point from the start of the line as the `distance` coordinate.
+    """
+
+    (x, y, distance) = get_line_points(line=line, crs=crs, spacing_m=spacing_m)
+
+    data = query_points(
+        x=x,
+        y=y,
+        source_names=source_names,
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        crs=CHIPLET_CRS,
+        years=years,
+        base_size_pix=base_size_pix,
+        n_workers=n_workers,
+    )
+
+    return data.assign_coords(distance=("point", distance))
+
+
+def query_polygon(
+    polygon: shapely.Polygon,
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    crs: int = 4326,
+    pixel_size_m: float = 25.0,
+    years: typing.Optional[typing.Sequence[int]] = None,
+    base_size_pix: int = 160,
+    n_workers: int = 4,
+) -> xr.DataArray:
+    "Gets the values at the centre of each pixel that is within a polygon"
+
+    (x, y) = get_polygon_points(polygon=polygon, crs=crs, pixel_size_m=pixel_size_m)
+
+    return query_points(
+        x=x,
+        y=y,
+        source_names=source_names,
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        crs=CHIPLET_CRS,
+        years=years,
+        base_size_pix=base_size_pix,
+        n_workers=n_workers,
+    )
+
+
+def get_line_points(
+    line: shapely.LineString,
+    crs: int = 4326,
+    spacing_m: float = 25.0,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Gets the (x, y) chiplet coordinates of points spaced every `spacing_m` metres along
+    a line (including its end), along with their distance along the line.
+    """
+
+    line = themeda_preproc.utils.transform_shape(
+        src_crs=crs,
+        dst_crs=CHIPLET_CRS,
+        shape=line,
+    )
+
+    distance = np.append(np.arange(0, line.length, spacing_m), line.length)
+
+    points = shapely.line_interpolate_point(line=line, distance=distance)
+
+    return (shapely.get_x(points), shapely.get_y(points), distance)
+
+
+def get_polygon_points(
+    polygon: shapely.Polygon,
+    crs: int = 4326,
+    pixel_size_m: float = 25.0,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    "Gets the (x, y) chiplet coordinates of the pixel centres within a polygon"
+
+    polygon = themeda_preproc.utils.transform_shape(
+        src_crs=crs,
+        dst_crs=CHIPLET_CRS,
+        shape=polygon,
+    )
+
+    (left, bottom, right, top) = polygon.bounds
+
+    (x_centres, y_centres) = (
+        (np.arange(np.floor(low / pixel_size_m), np.ceil(high / pixel_size_m)) + 0.5)
+        * pixel_size_m
+        for (low, high) in [(left, right), (bottom, top)]
+    )
+
+    # rows from north to south, as for the chiplets
+    (x, y) = (coords.ravel() for coords in np.meshgrid(x_centres, y_centres[::-1]))
+
+    is_within = shapely.contains_xy(polygon, x, y)
+
+    return (x[is_within], y[is_within])
+
+
+def sample_year_chiplets(
+    year: int,
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    indices: npt.NDArray[np.int64],
+    i_rows: npt.NDArray[np.int64],
+    i_cols: npt.NDArray[np.int64],
+    base_size_pix: int = 160,
+) -> npt.NDArray:
+    """
+    Gathers the values at the given chiplet indices and pixel positions from a year's
+    (unpadded) chiplets. Positions with an index of -1 are given the sentinel value.
+    """
+
+    dtype = themeda_preproc.source.DATA_SOURCE_DTYPE[source_name]
+
+    values = np.full(
+        shape=len(indices),
+        fill_value=themeda_preproc.source.DATA_SOURCE_SENTINEL[source_name],
+        # as for the GeoTIFF representation
+        dtype=np.float32 if dtype == np.float16 else dtype,
+    )
+
+    is_valid = indices >= 0
+
+    with themeda_preproc.chiplets.chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+    ) as chiplets:
+        values[is_valid] = chiplets[
+            indices[is_valid], i_rows[is_valid], i_cols[is_valid]
+        ]
+
+    return values
@@ -0,0 +1,366 @@
+"""
+Exports the chiplets into shard files that can be read sequentially, for training.
+
+Each shard is a tar file that contains up to `shard_size` chiplets, with the data for
+each chiplet stored as one NumPy (`.npy`) member per data source - named as
+`{index}.{source_name}.npy` and with dimensions of (year, y, x) - so that all the
+data for a chiplet is contiguous within the shard. The chiplets are split by their
+`subset_num` in the chiplet table and are shuffled (deterministically, using the seed
+from `chiplet_table.get_rand_seed`) before being divided into shards. A JSON index
+describes the years and data type of each data source, and the subset and chiplet
+indices of each shard.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import pathlib
+import tarfile
+import typing
+
+import numpy as np
+import numpy.typing as npt
+
+import tqdm
+
+import themeda_preproc.chiplet_table
+import themeda_preproc.chiplets
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+def run(
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int,
+    source_names: typing.Sequence[themeda_preproc.source.DataSourceName],
+    shard_size: int = 256,
+    base_size_pix: int = 160,
+    protect: bool = True,
+    show_progress: bool = True,
+) -> None:
+    shard_dir = get_shard_dir(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    (index_path, key_path) = (
+        shard_dir / filename for filename in ["shard_index.json", "shard_key.txt"]
+    )
+
+    source_years = {
+        source_name: themeda_preproc.chiplets.get_chiplet_years(
+            source_name=source_name,
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+            base_output_dir=base_output_dir,
+            denan=True,
+        )
+        for source_name in source_names
+    }
+
+    key = get_shard_key(
+        source_years=source_years,
+        shard_size=shard_size,
+        base_size_pix=base_size_pix,
+        table_path=themeda_preproc.chiplet_table.get_table_path(
+            roi_name=roi_name,
+            base_output_dir=base_output_dir,
+            pad_size_pix=pad_size_pix,
+        ),
+    )
+
+    previous_key = key_path.read_text() if key_path.exists() else None
+
+    # protected shards are reused, so they need to have been exported the same way
+    if previous_key != key and any(
+        themeda_preproc.utils.is_path_existing_and_read_only(path=path)
+        for path in [index_path, *shard_dir.glob("*.tar")]
+    ):
+        raise ValueError(
+            f"Protected shards in {shard_dir} were exported with different settings; "
+            + "remove them to export again"
+        )
+
+    # the index is written last, so its presence means that the export is complete
+    if themeda_preproc.utils.is_path_existing_and_read_only(path=index_path):
+        print(f"Path {index_path} exists and is protected; skipping")
+        return
+
+    index_path.unlink(missing_ok=True)
+
+    key_path.unlink(missing_ok=True)
+    key_path.write_text(key)
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=key_path)
+
+    table = themeda_preproc.chiplet_table.load_table(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    shard_indices = get_shard_indices(
+        indices=table["index"].to_numpy(),
+        subset_nums=table["subset_num"].to_numpy(),
+        shard_size=shard_size,
+        rand_seed=themeda_preproc.chiplet_table.get_rand_seed(
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+        ),
+    )
+
+    pool = themeda_preproc.chiplets.ChipletsPool(
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+        max_handles=sum(len(years) for years in source_years.values()),
+    )
+
+    shard_paths = [
+        shard_dir
+        / (
+            f"shard_roi_{roi_name.value}_pad_{pad_size_pix}_"
+            + f"subset_{subset_num}_{i_shard:05d}.tar"
+        )
+        for (i_shard, (subset_num, _)) in enumerate(shard_indices)
+    ]
+
+    # remove any shards that are left over from an export with different settings
+    for path in set(shard_dir.glob("*.tar")) - set(shard_paths):
+        if not themeda_preproc.utils.is_path_existing_and_read_only(path=path):
+            path.unlink()
+
+    shards = []
+
+    with contextlib.closing(
+        tqdm.tqdm(
+            iterable=None,
+            total=len(shard_indices),
+            disable=not show_progress,
+        )
+    ) as progress_bar:
+        for shard_path, (subset_num, indices) in zip(shard_paths, shard_indices):
+            if not themeda_preproc.utils.is_path_existing_and_read_only(
+                path=shard_path
+            ):
+                write_shard(
+                    shard_path=shard_path,
+                    indices=indices,
+                    source_years=source_years,
+                    roi_name=roi_name,
+                    pad_size_pix=pad_size_pix,
+                    pool=pool,
+                )
+
+                if protect:
+                    themeda_preproc.utils.protect_path(path=shard_path)
+
+            shards.append(
+                {
+                    "filename": shard_path.name,
+                    "subset_num": subset_num,
+                    "indices": indices.tolist(),
+                }
+            )
+
+            progress_bar.update()
+
+    index = {
+        "key": key,
+        "sources": {
+            source_name.value: {
+                "years": years,
+                "dtype": np.dtype(
+                    themeda_preproc.source.DATA_SOURCE_DTYPE[source_name]
+                ).name,
+            }
+            for (source_name, years) in source_years.items()
+        },
+        "shards": shards,
+    }
+
+    index_path.write_text(json.dumps(index))
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=index_path)
+
+
+def get_shard_key(
+    source_years: typing.Mapping[themeda_preproc.source.DataSourceName, list[int]],
+    shard_size: int,
+    base_size_pix: int,
+    table_path: pathlib.Path,
+) -> str:
+    "Forms a key that changes if the settings or inputs of the shard export change"
+
+    inputs = {
+        "sources": {
+            source_name.value: years for (source_name, years) in source_years.items()
+        },
+        "shard_size": shard_size,
+        "base_size_pix": base_size_pix,
+        "table": themeda_preproc.chiplet_table.get_table_key(table_path=table_path),
+    }
+
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def get_shard_indices(
+    indices: npt.NDArray[np.int64],
+    subset_nums: npt.NDArray[np.int64],
+    shard_size: int,
+    rand_seed: int,
+) -> list[tuple[int, npt.NDArray[np.int64]]]:
+    """
+    Splits the chiplet indices by their subset number, shuffles them, and divides
+    them into shards of (up to) `shard_size` chiplets, as (subset number, indices).
+    """
+
+    rand = np.random.RandomState(rand_seed)
+
+    shard_indices: list[tuple[int, npt.NDArray[np.int64]]] = []
+
+    for subset_num in np.unique(subset_nums):
+        subset_indices = rand.permutation(indices[subset_nums == subset_num])
+
+        shard_indices.extend(
+            (int(subset_num), subset_indices[i_start : i_start + shard_size])
+            for i_start in range(0, len(subset_indices), shard_size)
+        )
+
+    return shard_indices
+
+
+def write_shard(
+    shard_path: pathlib.Path,
+    indices: npt.NDArray[np.int64],
+    source_years: typing.Mapping[themeda_preproc.source.DataSourceName, list[int]],
+    roi_name: themeda_preproc.roi.ROIName,
+    pad_size_pix: int,
+    pool: themeda_preproc.chiplets.ChipletsPool,
+    block_size: int = 16,
+) -> None:
+    """
+    Writes the chiplets to a shard in the (shuffled) order of `indices`. The chiplets
+    are read in blocks of up to `block_size`, with each block gathered from each data
+    source and year in a single read of the sorted indices, to limit both the number
+    of scattered reads and the memory that is required.
+    """
+
+    partial_path = themeda_preproc.utils.get_partial_path(path=shard_path)
+
+    with tarfile.open(name=partial_path, mode="w") as shard:
+        for i_block_start in range(0, len(indices), block_size):
+            block_indices = indices[i_block_start : i_block_start + block_size]
+
+            order = np.argsort(block_indices)
+
+            # the position of each chiplet within the sorted block
+            positions = np.empty_like(order)
+            positions[order] = np.arange(len(order))
+
+            # with dimensions of (chiplet, year, y, x)
+            block_data = {
+                source_name: np.stack(
+                    [
+                        pool.get(
+                            source_name=source_name,
+                            year=year,
+                            roi_name=roi_name,
+                            pad_size_pix=pad_size_pix,
+                        )[block_indices[order]]
+                        for year in years
+                    ],
+                    axis=1,
+                )
+                for (source_name, years) in source_years.items()
+            }
+
+            for index, position in zip(block_indices, positions):
+                for source_name, data in block_data.items():
+                    add_array(
+                        shard=shard,
+                        name=f"{index:07d}.{source_name.value}.npy",
+                        array=data[position],
+                    )
+
+    partial_path.replace(target=shard_path)
+
+
+def add_array(
+    shard: tarfile.TarFile, name: str, array: npt.NDArray[typing.Any]
+) -> None:
+    buffer = io.BytesIO()
+    np.save(file=buffer, arr=array)
+
+    info = tarfile.TarInfo(name=name)
+    info.size = buffer.tell()
+
+    buffer.seek(0)
+    shard.addfile(tarinfo=info, fileobj=buffer)
+
+
+def iter_shard(
+    shard_path: pathlib.Path,
+) -> typing.Iterator[tuple[int, dict[str, npt.NDArray[typing.Any]]]]:
+    """
+    Reads a shard sequentially, yielding the index of each chiplet and its data (with
+    dimensions of (year, y, x)) for each data source.
+    """
+
+    with tarfile.open(name=shard_path, mode="r|") as shard:
+        (current_index, current_data) = (None, {})
+
+        for member in shard:
+            (index_str, source_name_str, _) = member.name.split(".")
+
+            index = int(index_str)
+
+            if current_index is not None and index != current_index:
+                yield (current_index, current_data)
+                current_data = {}
+
+            handle = shard.extractfile(member)
+            assert handle is not None
+
+            current_index = index
+            current_data[source_name_str] = np.load(file=io.BytesIO(handle.read()))
+
+        if current_index is not None:
+            yield (current_index, current_data)
+
+
+def load_shard_index(
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int,
+) -> dict[str, typing.Any]:
+    shard_dir = get_shard_dir(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    index: dict[str, typing.Any] = json.loads(
+        (shard_dir / "shard_index.json").read_text()
+    )
+
+    return index
+
+
+def get_shard_dir(
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    pad_size_pix: int,
+) -> pathlib.Path:
+    shard_dir = (
+        base_output_dir / "shards" / f"roi_{roi_name.value}" / f"pad_{pad_size_pix}"
+    )
+
+    shard_dir.mkdir(exist_ok=True, parents=True)
+
+    return shard_dir
@@ -15,6 +15,7 @@ def run(
     protect: bool = True,
     resolution: typing.Optional[typing.Union[float, int]] = 1_000,
     headless: bool = True,
+    cores: int = 4,
 ) -> None:
     if source_name == themeda_preproc.source.DataSourceName.SOIL_DEPTH:
         cbar_label = "Depth of soil (0-200cm)"
@@ -38,4 +39,5 @@ def run(
         protect=protect,
         resolution=resolution,
         headless=headless,
+        cores=cores,
     )
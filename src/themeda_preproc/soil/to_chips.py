@@ -3,10 +3,12 @@ import contextlib
 
 import xarray as xr
 
-import odc.geo.xr  # noqa
+import odc.geo.xr
+import odc.geo.geobox
 
 import tqdm
 
+import themeda_preproc.chips
 import themeda_preproc.source
 import themeda_preproc.roi
 import themeda_preproc.utils
@@ -17,6 +19,7 @@ def run(
     source_name: themeda_preproc.source.DataSourceName,
     roi_name: themeda_preproc.roi.ROIName,
     base_output_dir: pathlib.Path,
+    codec: themeda_preproc.chips.Codec = themeda_preproc.chips.Codec.LZW,
     protect: bool = True,
     show_progress: bool = True,
 ) -> None:
@@ -25,8 +28,8 @@ def run(
     chip_dir = base_output_dir / "chips" / f"roi_{roi_name.value}" / source_name.value
     chip_dir.mkdir(exist_ok=True, parents=True)
 
-    # load all the DEA chips
-    ref_chips = themeda_preproc.land_cover.utils.load_reference_chips(
+    # load the geometry of all the DEA chips
+    ref_geoboxes = themeda_preproc.land_cover.utils.load_reference_geoboxes(
         base_output_dir=base_output_dir,
         roi_name=roi_name,
     )
@@ -39,7 +42,7 @@ def run(
         ]
     )
 
-    n_total_conversions = len(ref_chips)
+    n_total_conversions = len(ref_geoboxes)
 
     with contextlib.closing(
         tqdm.tqdm(
@@ -62,7 +65,7 @@ def run(
             masked=True,
         )
 
-        for grid_ref, base_chip in ref_chips.items():
+        for grid_ref, ref_geobox in ref_geoboxes.items():
             output_path = (
                 chip_dir
                 / f"{source_name.value}_roi_{roi_name.value}_{year}_{grid_ref}.tif"
@@ -73,13 +76,17 @@ def run(
             ):
                 converted_chip = convert_chip(
                     soil_chip=soil_chip,
-                    dea_chip=base_chip,
+                    ref_geobox=ref_geobox,
                     source_name=source_name,
                 )
 
-                converted_chip.rio.to_raster(
-                    raster_path=output_path,
-                    compress="lzw",
+                themeda_preproc.chips.write_chip(
+                    chip=converted_chip,
+                    path=output_path,
+                    resampling=themeda_preproc.source.DATA_SOURCE_RESAMPLERS[
+                        source_name
+                    ],
+                    codec=codec,
                 )
 
                 if protect:
@@ -90,13 +97,13 @@ def run(
 
 def convert_chip(
     soil_chip: xr.DataArray,
-    dea_chip: xr.DataArray,
+    ref_geobox: odc.geo.geobox.GeoBox,
     source_name: themeda_preproc.source.DataSourceName,
 ) -> xr.DataArray:
     interp_method = themeda_preproc.source.DATA_SOURCE_RESAMPLERS[source_name]
 
     soil_chip_resampled = soil_chip.odc.reproject(
-        how=dea_chip.odc.geobox,
+        how=ref_geobox,
         resampling=interp_method,
     ).compute()
 
@@ -1,4 +1,6 @@
+import concurrent.futures
 import dataclasses
+import functools
 import pathlib
 
 import numpy as np
@@ -12,7 +14,9 @@ import shapely
 import themeda_preproc.roi
 import themeda_preproc.utils
 import themeda_preproc.source
-import themeda_preproc.packet
+import themeda_preproc.chiplets
+import themeda_preproc.chiplet_table
+import themeda_preproc.query
 
 
 @dataclasses.dataclass
@@ -25,6 +29,8 @@ def run(
     source_name: themeda_preproc.source.DataSourceName,
     roi_name: themeda_preproc.roi.ROIName,
     base_output_dir: pathlib.Path,
+    cores: int = 4,
+    base_size_pix: int = 160,
     protect: bool = True,
 ) -> None:
     output_path = get_transect_path(
@@ -43,50 +49,55 @@ def run(
 
     natt_coords = get_natt_coords(roi=roi)
 
-    chiplet_base_dir = (
-        base_output_dir
-        / "chiplets_geotiff"
-        / f"roi_{roi_name.value}"
-        / source_name.value
+    lattice = themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=0,
+        base_size_pix=base_size_pix,
     )
 
-    years = themeda_preproc.utils.get_years_in_path(path=chiplet_base_dir)
-
-    transects = []
-
-    for year in years:
-        year_chiplet_base_dir = chiplet_base_dir / str(year)
-
-        chiplet_paths = sorted(year_chiplet_base_dir.glob("*.tif"))
-
-        packet = themeda_preproc.packet.form_packet(
-            paths=chiplet_paths,
-            form_via_rioxarray=True,
-            chunks=None,
-        )
+    # work out where each transect point is in the chiplets, which is common to all
+    # the years
+    (indices, i_rows, i_cols) = themeda_preproc.chiplet_table.get_point_locations(
+        lattice=lattice,
+        x=natt_coords.x.values,
+        y=natt_coords.y.values,
+    )
 
-        transect = packet.sel(
-            x=natt_coords.x,
-            y=natt_coords.y,
-            method="nearest",
+    years = themeda_preproc.chiplets.get_chiplet_years(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=base_output_dir,
+        denan=True,
+    )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=cores) as executor:
+        year_values = executor.map(
+            functools.partial(
+                themeda_preproc.query.sample_year_chiplets,
+                source_name=source_name,
+                roi_name=roi_name,
+                base_output_dir=base_output_dir,
+                indices=indices,
+                i_rows=i_rows,
+                i_cols=i_cols,
+                base_size_pix=base_size_pix,
+            ),
+            years,
         )
 
-        transects.append(
+        transects = [
             xr.DataArray(
-                data=transect.values[np.newaxis, :],
+                data=values[np.newaxis, :],
                 dims=("year", "distance"),
                 coords={
                     "year": np.array(year, ndmin=1),
                     "distance": natt_coords.distance.values,
                 },
-            ),
-        )
-
-        transect.close()
-        packet.close()
-
-        del transect
-        del packet
+            )
+            for (year, values) in zip(years, year_values)
+        ]
 
     transect = xr.concat(objs=transects, dim="year")
 
@@ -1,6 +1,11 @@
 import pathlib
 import typing
 import os
+import contextlib
+import concurrent.futures
+import threading
+import enum
+import shutil
 
 import numpy as np
 import numpy.typing as npt
@@ -11,6 +16,23 @@ import pyproj
 import shapely
 
 
+HTTP_PARTIAL_CONTENT: typing.Final = 206
+HTTP_RANGE_NOT_SATISFIABLE: typing.Final = 416
+
+# from `linux/fs.h`; clones the extents of one file into another
+FICLONE: typing.Final = 0x40049409
+
+
+class MaterialiseStrategy(enum.Enum):
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+    SYMLINK = "symlink"
+    COPY = "copy"
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+
 def get_years_in_path(
     path: pathlib.Path,
     error_if_no_years: bool = True,
@@ -86,13 +108,94 @@ def protect_path(
     path.chmod(mode=permissions)
 
 
+def materialise_file(
+    src: pathlib.Path,
+    dst: pathlib.Path,
+    strategy: MaterialiseStrategy = MaterialiseStrategy.REFLINK,
+    protect: bool = False,
+) -> MaterialiseStrategy:
+    """
+    Makes the file at `src` available at `dst`, replacing any existing file at `dst`,
+    via the given strategy. If the filesystem does not support the strategy (e.g.,
+    hard links across devices), a copy is made instead. Returns the strategy that
+    was actually used.
+
+    If `protect` is set, `dst` is protected - unless it shares its permissions with
+    `src` (a hard link or symbolic link), so that `src` is left unchanged.
+    """
+
+    dst.unlink(missing_ok=True)
+
+    try:
+        if strategy == MaterialiseStrategy.HARDLINK:
+            os.link(src=src, dst=dst)
+        elif strategy == MaterialiseStrategy.SYMLINK:
+            dst.symlink_to(target=src.resolve())
+        elif strategy == MaterialiseStrategy.REFLINK:
+            reflink_file(src=src, dst=dst)
+        else:
+            shutil.copy2(src=src, dst=dst)
+    except OSError:
+        if strategy == MaterialiseStrategy.COPY:
+            raise
+
+        dst.unlink(missing_ok=True)
+        shutil.copy2(src=src, dst=dst)
+
+        strategy = MaterialiseStrategy.COPY
+
+    if protect and strategy not in [
+        MaterialiseStrategy.HARDLINK,
+        MaterialiseStrategy.SYMLINK,
+    ]:
+        protect_path(path=dst)
+
+    return strategy
+
+
+def reflink_file(src: pathlib.Path, dst: pathlib.Path) -> None:
+    """
+    Makes a copy-on-write clone of a file, on filesystems that support it; on
+    platforms without `fcntl` (i.e., not POSIX), a copy is made instead.
+    """
+
+    try:
+        import fcntl
+    except ImportError:
+        shutil.copy2(src=src, dst=dst)
+        return
+
+    with src.open("rb") as src_handle, dst.open("wb") as dst_handle:
+        fcntl.ioctl(dst_handle.fileno(), FICLONE, src_handle.fileno())
+
+    shutil.copystat(src=src, dst=dst)
+
+
 def download_file(
     url: str,
     output_path: typing.Union[pathlib.Path, str],
     overwrite: bool = True,
+    resume: bool = True,
+    n_parallel: int = 1,
+    range_size: int = 64 * 1024 * 1024,
+    expected_size: typing.Optional[int] = None,
+    session: typing.Optional[requests.Session] = None,
 ) -> None:
     """
     Downloads a file from a URL, raising a `ValueError` if there is a problem.
+
+    The data is written to a '.part' file alongside `output_path`, which is renamed
+    to `output_path` once its size has been verified against the length reported by
+    the server (and `expected_size`, if provided). If the download fails, the partial
+    file is left in place and, if `resume` is set, a subsequent call will request only
+    the remaining data (if the server supports range requests). If `n_parallel` is
+    greater than one and the server supports range requests, the file is fetched as
+    separate byte ranges (of `range_size` bytes) across that many threads.
+
+    A download is only resumed if the server identifies the file with a validator
+    (an `ETag` or `Last-Modified` header) that matches the one recorded when the
+    download was started, and the validator is sent as an `If-Range` header so that
+    the server will return the whole file if it has since changed.
     """
 
     output_path = pathlib.Path(output_path)
@@ -100,13 +203,285 @@ def download_file(
     if output_path.exists() and not overwrite:
         raise FileExistsError(f"Output file {output_path} already exists")
 
-    response = requests.get(url=url, stream=True)
+    partial_path = get_partial_path(path=output_path)
+    ranges_path = partial_path.with_name(partial_path.name + ".ranges")
+    validator_path = partial_path.with_name(partial_path.name + ".validator")
 
-    if not response.ok:
-        raise ValueError(
-            f"Error downloading {url}; response code was {response.status_code}"
+    if not resume:
+        partial_path.unlink(missing_ok=True)
+
+    # the records of a partial download are stale if its data is missing
+    if not partial_path.exists():
+        for path in (ranges_path, validator_path):
+            path.unlink(missing_ok=True)
+
+    with contextlib.ExitStack() as stack:
+        if session is None:
+            session = stack.enter_context(requests.Session())
+
+        (remote_size, accepts_ranges, validator) = get_remote_file_info(
+            url=url,
+            session=session,
         )
 
-    with output_path.open("wb") as handle:
-        for chunk in response.iter_content(chunk_size=1024 * 1024):
-            handle.write(chunk)
+        if (
+            n_parallel > 1
+            and accepts_ranges
+            and remote_size is not None
+            # a sequentially-downloaded partial file can only be resumed sequentially
+            and (ranges_path.exists() or not partial_path.exists())
+        ):
+            download_file_ranges(
+                url=url,
+                partial_path=partial_path,
+                ranges_path=ranges_path,
+                total_size=remote_size,
+                range_size=range_size,
+                n_parallel=n_parallel,
+                session=session,
+                validator=validator,
+            )
+            ranges_path.unlink()
+            total_size: typing.Optional[int] = remote_size
+        else:
+            total_size = download_file_sequential(
+                url=url,
+                partial_path=partial_path,
+                validator_path=validator_path,
+                session=session,
+            )
+            validator_path.unlink(missing_ok=True)
+
+    n_bytes = partial_path.stat().st_size
+
+    for size in (total_size, expected_size):
+        if size is not None and n_bytes != size:
+            # if we have too much data, something has gone wrong with the resumption
+            # and it will need to be started afresh
+            if n_bytes > size:
+                partial_path.unlink()
+
+            raise ValueError(
+                f"Incomplete download of {url}; received {n_bytes} of {size} bytes"
+            )
+
+    partial_path.replace(target=output_path)
+
+
+def download_file_sequential(
+    url: str,
+    partial_path: pathlib.Path,
+    validator_path: pathlib.Path,
+    session: requests.Session,
+    chunk_size: int = 1024 * 1024,
+) -> typing.Optional[int]:
+    """
+    Downloads a file from a URL into `partial_path`, continuing on from any existing
+    data in `partial_path` if the validator of the file when it was started has been
+    recorded in `validator_path`. Returns the total size of the file, if it is known.
+    """
+
+    offset = partial_path.stat().st_size if partial_path.exists() else 0
+
+    # without a validator, we can't know that the existing data is still current
+    if offset > 0 and not validator_path.exists():
+        offset = 0
+
+    headers = (
+        {"Range": f"bytes={offset}-", "If-Range": validator_path.read_text()}
+        if offset > 0
+        else {}
+    )
+
+    with session.get(url=url, stream=True, headers=headers) as response:
+        # nothing left to download
+        if offset > 0 and response.status_code == HTTP_RANGE_NOT_SATISFIABLE:
+            return get_content_range_total(response=response)
+
+        if not response.ok:
+            raise ValueError(
+                f"Error downloading {url}; response code was {response.status_code}"
+            )
+
+        if response.status_code == HTTP_PARTIAL_CONTENT:
+            if not response.headers.get("Content-Range", "").startswith(
+                f"bytes {offset}-"
+            ):
+                raise ValueError(f"Unexpected range in response from {url}")
+
+            total_size = get_content_range_total(response=response)
+            mode = "ab"
+
+        else:
+            # the server has ignored the range request (or the file has changed), so
+            # start from the beginning
+            total_size = get_content_length(response=response)
+            mode = "wb"
+
+            validator = get_validator(response=response)
+
+            if validator is None:
+                validator_path.unlink(missing_ok=True)
+            else:
+                validator_path.write_text(validator)
+
+        with partial_path.open(mode) as handle:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                handle.write(chunk)
+
+    return total_size
+
+
+def download_file_ranges(
+    url: str,
+    partial_path: pathlib.Path,
+    ranges_path: pathlib.Path,
+    total_size: int,
+    range_size: int,
+    n_parallel: int,
+    session: requests.Session,
+    validator: typing.Optional[str] = None,
+    chunk_size: int = 1024 * 1024,
+) -> None:
+    """
+    Downloads a file from a URL into `partial_path` as byte ranges fetched in
+    parallel. The validator of the file is recorded on the first line of
+    `ranges_path`, followed by the start of each completed range, so that an
+    interrupted download can be resumed if the file has not changed.
+    """
+
+    completed = set()
+
+    if validator is not None and partial_path.exists() and ranges_path.exists():
+        (recorded_validator, *range_lines) = ranges_path.read_text().split("\n")
+
+        if (
+            recorded_validator == validator
+            and partial_path.stat().st_size == total_size
+        ):
+            completed = {int(line) for line in range_lines if line}
+
+    if not completed:
+        # pre-allocate the file so that each range can be written in place
+        with partial_path.open("wb") as handle:
+            handle.truncate(total_size)
+
+        ranges_path.write_text(f"{validator or ''}\n")
+
+    range_starts = [
+        range_start
+        for range_start in range(0, total_size, range_size)
+        if range_start not in completed
+    ]
+
+    lock = threading.Lock()
+
+    def fetch_range(range_start: int) -> None:
+        range_end = min(range_start + range_size, total_size) - 1
+
+        headers = {"Range": f"bytes={range_start}-{range_end}"}
+
+        if validator is not None:
+            headers["If-Range"] = validator
+
+        n_bytes = 0
+
+        with session.get(url=url, stream=True, headers=headers) as response:
+            if response.status_code != HTTP_PARTIAL_CONTENT:
+                raise ValueError(
+                    f"Error downloading range from {url} (it may have changed); "
+                    + f"response code was {response.status_code}"
+                )
+
+            with partial_path.open("r+b") as handle:
+                handle.seek(range_start)
+
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    handle.write(chunk)
+                    n_bytes += len(chunk)
+
+        if n_bytes != range_end - range_start + 1:
+            raise ValueError(f"Incomplete range received from {url}")
+
+        with lock, ranges_path.open("a") as handle:
+            handle.write(f"{range_start}\n")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=n_parallel) as executor:
+        # evaluate so that any exceptions are raised
+        list(executor.map(fetch_range, range_starts))
+
+
+def get_remote_file_info(
+    url: str,
+    session: requests.Session,
+) -> tuple[typing.Optional[int], bool, typing.Optional[str]]:
+    """
+    Returns the size of a remote file (if known), if it supports range requests, and
+    its validator (if any).
+    """
+
+    response = session.head(url=url, allow_redirects=True)
+
+    # not all servers support HEAD requests, so let any problems surface later
+    if not response.ok:
+        return (None, False, None)
+
+    size = get_content_length(response=response)
+
+    accepts_ranges = response.headers.get("Accept-Ranges", "none") == "bytes"
+
+    return (size, accepts_ranges, get_validator(response=response))
+
+
+def get_validator(response: requests.Response) -> typing.Optional[str]:
+    "Gets a value that identifies the version of a remote file, for `If-Range`"
+
+    etag = response.headers.get("ETag")
+
+    # weak entity tags can't be used with `If-Range`
+    if etag is not None and not etag.startswith("W/"):
+        return str(etag)
+
+    last_modified = response.headers.get("Last-Modified")
+
+    return None if last_modified is None else str(last_modified)
+
+
+def get_content_length(response: requests.Response) -> typing.Optional[int]:
+    # the length refers to the encoded data, which isn't what we receive
+    if "Content-Encoding" in response.headers:
+        return None
+
+    content_length = response.headers.get("Content-Length")
+
+    return None if content_length is None else int(content_length)
+
+
+def get_content_range_total(response: requests.Response) -> typing.Optional[int]:
+    # e.g., "bytes 100-199/1000" or "bytes */1000"
+    (*_, total) = response.headers.get("Content-Range", "*").split("/")
+
+    return None if total == "*" else int(total)
+
+
+def get_partial_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(path.name + ".part")
+
+
+@contextlib.contextmanager
+def replacing_path(path: pathlib.Path) -> typing.Iterator[pathlib.Path]:
+    """
+    Provides a path, unique to this process and thread, to write to in place of
+    `path` - which is replaced once the writing is complete. Writers that run at the
+    same time therefore don't interfere, and readers only see complete files.
+    """
+
+    temp_path = path.with_name(
+        f"{path.name}.{os.getpid()}.{threading.get_ident()}.part"
+    )
+
+    try:
+        yield temp_path
+        temp_path.replace(target=path)
+    finally:
+        temp_path.unlink(missing_ok=True)
@@ -1,13 +1,19 @@
+import functools
+import multiprocessing
 import pathlib
+import tempfile
 import typing
 
 import xarray as xr
 
+import pypdf
+
 import veusz.embed
 
 import themeda_preproc.source
 import themeda_preproc.roi
-import themeda_preproc.packet
+import themeda_preproc.chiplets
+import themeda_preproc.mosaic
 import themeda_preproc.vis.utils
 
 
@@ -29,14 +35,8 @@ def plot_years(
     resolution: typing.Union[float, int] = 1_000,
     headless: bool = True,
     set_minmax_across_years: bool = False,
+    cores: int = 4,
 ) -> None:
-    chiplets_path = (
-        base_output_dir
-        / "chiplets_geotiff"
-        / f"roi_{roi_name.value}"
-        / source_name.value
-    )
-
     output_path = (
         base_output_dir
         / "plot_maps"
@@ -52,64 +52,167 @@ def plot_years(
 
     output_path.parent.mkdir(exist_ok=True, parents=True)
 
-    years = themeda_preproc.utils.get_years_in_path(path=chiplets_path)
+    years = themeda_preproc.chiplets.get_chiplet_years(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=base_output_dir,
+        denan=True,
+    )
 
-    embed = veusz.embed.Embedded(hidden=headless)
-    themeda_preproc.vis.utils.set_veusz_style(embed=embed)
+    # see https://pola-rs.github.io/polars-book/user-guide/misc/multiprocessing/
+    mp = multiprocessing.get_context(method="spawn")
 
-    if set_minmax_across_years:
-        min_val = None
-        max_val = None
-
-    for year in years:
-        packet = render_year(
-            embed=embed,
-            year=year,
-            source_name=source_name,
-            chiplets_path=chiplets_path,
-            resolution=resolution,
-            customiser=customiser,
-        )
+    with mp.Pool(processes=cores) as pool, tempfile.TemporaryDirectory(
+        dir=output_path.parent
+    ) as page_dir:
+        minmax_vals = None
 
         if set_minmax_across_years:
-            packet_min = packet.min().item()
-            packet_max = packet.max().item()
+            # this also forms any mosaics that are not yet cached, in parallel
+            year_minmax_vals = pool.map(
+                functools.partial(
+                    get_year_minmax_vals,
+                    source_name=source_name,
+                    roi_name=roi_name,
+                    base_output_dir=base_output_dir,
+                    resolution=resolution,
+                ),
+                years,
+            )
+
+            (year_min_vals, year_max_vals) = zip(*year_minmax_vals)
+
+            minmax_vals = (min(year_min_vals), max(year_max_vals))
+
+        # the years are rendered in parallel, with the loading of each year's data
+        # overlapping with the rendering of others
+        page_paths = pool.map(
+            functools.partial(
+                render_year_page,
+                source_name=source_name,
+                roi_name=roi_name,
+                base_output_dir=base_output_dir,
+                resolution=resolution,
+                customiser=customiser,
+                page_dir=pathlib.Path(page_dir),
+                headless=headless,
+                minmax_vals=minmax_vals,
+            ),
+            years,
+            chunksize=1,
+        )
+
+        partial_path = themeda_preproc.utils.get_partial_path(path=output_path)
+
+        combine_pdfs(paths=page_paths, output_path=partial_path)
+
+        partial_path.replace(target=output_path)
+
+    if protect:
+        themeda_preproc.utils.protect_path(path=output_path)
+
 
-            if min_val is None:
-                min_val = packet_min
-            if max_val is None:
-                max_val = packet_max
+def get_year_minmax_vals(
+    year: int,
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int],
+) -> tuple[typing.Union[int, float], typing.Union[int, float]]:
+    mosaic = themeda_preproc.mosaic.get_mosaic(
+        source_name=source_name,
+        roi_name=roi_name,
+        year=year,
+        base_output_dir=base_output_dir,
+        resolution=resolution,
+    )
+
+    mosaic.data.close()
+
+    return (mosaic.min_val, mosaic.max_val)
+
+
+def render_year_page(
+    year: int,
+    source_name: themeda_preproc.source.DataSourceName,
+    roi_name: themeda_preproc.roi.ROIName,
+    base_output_dir: pathlib.Path,
+    resolution: typing.Union[float, int],
+    customiser: typing.Callable[
+        [
+            veusz.embed.Embedded,
+            veusz.embed.WidgetNode,
+            xr.DataArray,
+            themeda_preproc.source.DataSourceName,
+            int,
+        ],
+        None,
+    ],
+    page_dir: pathlib.Path,
+    headless: bool = True,
+    minmax_vals: typing.Optional[
+        tuple[typing.Union[int, float], typing.Union[int, float]]
+    ] = None,
+) -> pathlib.Path:
+    "Renders the map for a year as a single-page PDF in `page_dir`"
+
+    mosaic = themeda_preproc.mosaic.get_mosaic(
+        source_name=source_name,
+        roi_name=roi_name,
+        year=year,
+        base_output_dir=base_output_dir,
+        resolution=resolution,
+    )
 
-            min_val = min(min_val, packet_min)
-            max_val = max(max_val, packet_max)
+    embed = veusz.embed.Embedded(hidden=headless)
+    themeda_preproc.vis.utils.set_veusz_style(embed=embed)
 
-        packet.close()
+    packet = render_year(
+        embed=embed,
+        year=year,
+        source_name=source_name,
+        customiser=customiser,
+        packet=mosaic.data,
+    )
 
-        del packet
+    packet.close()
 
-    if set_minmax_across_years:
-        assert min_val is not None
-        assert max_val is not None
+    del packet
 
+    if minmax_vals is not None:
+        (min_val, max_val) = minmax_vals
         set_img_minmax_vals(embed=embed, min_val=min_val, max_val=max_val)
 
     embed.WaitForClose()
 
-    embed.Export(
-        str(output_path),
-        page=themeda_preproc.vis.utils.get_page_list(embed=embed),
-    )
+    page_path = page_dir / f"{source_name.value}_{year}.pdf"
+
+    embed.Export(str(page_path), page=[0])
+
+    embed.Close()
+
+    return page_path
 
-    if protect:
-        themeda_preproc.utils.protect_path(path=output_path)
+
+def combine_pdfs(paths: list[pathlib.Path], output_path: pathlib.Path) -> None:
+    "Combines the pages of the PDF files, in order, into a single file"
+
+    writer = pypdf.PdfWriter()
+
+    for path in paths:
+        writer.append(fileobj=path)
+
+    with output_path.open("wb") as handle:
+        writer.write(handle)
+
+    writer.close()
 
 
 def render_year(
     embed: veusz.embed.Embedded,
     year: int,
     source_name: themeda_preproc.source.DataSourceName,
-    chiplets_path: pathlib.Path,
-    resolution: typing.Union[float, int],
     customiser: typing.Callable[
         [
             veusz.embed.Embedded,
@@ -120,15 +223,9 @@ def render_year(
         ],
         None,
     ],
-    packet: typing.Optional[xr.DataArray] = None,
+    packet: xr.DataArray,
 ) -> xr.DataArray:
-    if packet is None:
-        packet = get_packet(
-            year=year,
-            source_name=source_name,
-            chiplets_path=chiplets_path,
-            resolution=resolution,
-        )
+    "Draws a year's data (from its mosaic) on a new page"
 
     packet = packet.sortby(variables="y")
 
@@ -228,27 +325,3 @@ def generic_continuous_customiser(
     cbar.MajorTicks.width.val = "0.5pt"
     cbar.outerticks.val = True
     cbar.horzPosn.val = "manual"
-
-
-def get_packet(
-    year: int,
-    source_name: themeda_preproc.source.DataSourceName,
-    chiplets_path: pathlib.Path,
-    resolution: typing.Optional[typing.Union[float, int]],
-    form_via_rioxarray: bool = True,
-) -> xr.DataArray:
-    paths = sorted((chiplets_path / str(year)).glob("*.tif"))
-
-    nodata = themeda_preproc.source.DATA_SOURCE_SENTINEL[source_name]
-
-    resampling = themeda_preproc.source.DATA_SOURCE_RESAMPLERS[source_name]
-
-    packet = themeda_preproc.packet.form_packet(
-        paths=paths,
-        form_via_rioxarray=form_via_rioxarray,
-        new_resolution=resolution,
-        nodata=nodata,
-        resampling=resampling,
-    )
-
-    return packet
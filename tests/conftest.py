@@ -1,7 +1,239 @@
+import hashlib
+import http.server
+import pathlib
+import re
+import threading
+
+import numpy as np
+
+import polars as pl
+
+import rasterio
+import rasterio.transform
+
 import pytest
 
+import themeda_preproc.chiplet_table
+import themeda_preproc.chiplets
+import themeda_preproc.source
+
 
 @pytest.fixture(scope="session", autouse=True)
 def base_output_dir(tmp_path_factory):
     tmp_path = tmp_path_factory.mktemp("data")
     return tmp_path
+
+
+class RangeRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves files from `directory`, with support for single byte-range requests
+    (conditional on `If-Range`, with an `ETag` derived from the file contents). If
+    `truncate_next` is set, the next response body is cut short after that many bytes
+    to simulate an interrupted transfer.
+    """
+
+    directory = pathlib.Path()
+    received_ranges = []
+    truncate_next = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        path = self.directory / self.path.lstrip("/")
+
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        data = path.read_bytes()
+        n_total = len(data)
+
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+
+        range_header = self.headers.get("Range")
+
+        if send_body:
+            type(self).received_ranges.append(range_header)
+
+        # the range only applies if the file hasn't changed
+        if self.headers.get("If-Range", etag) != etag:
+            range_header = None
+
+        if range_header is None:
+            self.send_response(200)
+            (start, end) = (0, n_total - 1)
+        else:
+            (start, end) = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header).groups()
+            start = int(start)
+            end = n_total - 1 if end == "" else min(int(end), n_total - 1)
+
+            if start >= n_total:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{n_total}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{n_total}")
+
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+
+        if send_body:
+            body = data[start : end + 1]
+
+            if type(self).truncate_next is not None:
+                body = body[: type(self).truncate_next]
+                type(self).truncate_next = None
+                self.close_connection = True
+
+            self.wfile.write(body)
+
+
+@pytest.fixture()
+def http_server(tmp_path):
+    "Serves the contents of a temporary directory over HTTP"
+
+    serve_dir = tmp_path / "remote"
+    serve_dir.mkdir()
+
+    handler = type(
+        "Handler",
+        (RangeRequestHandler,),
+        {"directory": serve_dir, "received_ranges": []},
+    )
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    (host, port) = server.server_address
+
+    yield (f"http://{host}:{port}", serve_dir, handler)
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture()
+def write_raster():
+    "Provides a function that writes a single-band, zero-valued GeoTIFF"
+    return write_raster_file
+
+
+def write_raster_file(path, left, top, size_pix, res):
+    path.parent.mkdir(exist_ok=True, parents=True)
+
+    with rasterio.open(
+        path,
+        mode="w",
+        driver="GTiff",
+        height=size_pix,
+        width=size_pix,
+        count=1,
+        dtype="uint8",
+        crs="EPSG:3577",
+        transform=rasterio.transform.from_origin(left, top, res, res),
+        nodata=255,
+    ) as handle:
+        handle.write(np.zeros((1, size_pix, size_pix), dtype=np.uint8))
+
+
+@pytest.fixture()
+def form_table():
+    "Provides a function that forms a minimal chiplet table from lattice positions"
+    return form_lattice_table
+
+
+@pytest.fixture()
+def write_table():
+    "Provides a function that writes a chiplet table to its standard path"
+    return write_chiplet_table
+
+
+@pytest.fixture()
+def write_chiplets():
+    "Provides a function that writes an array as a chiplet memmap"
+    return write_chiplet_array
+
+
+def form_lattice_table(positions, base_size_pix=4, pixel_size_m=25.0):
+    "Forms a minimal chiplet table with chiplets at the (column, row) positions"
+
+    chiplet_size_m = base_size_pix * pixel_size_m
+
+    return pl.DataFrame(
+        {
+            "index": np.arange(len(positions)),
+            "bbox_left": [i_col * chiplet_size_m for (i_col, _) in positions],
+            "bbox_top": [-i_row * chiplet_size_m for (_, i_row) in positions],
+            "chip_transform_i_to_coords_coeff_a": [pixel_size_m] * len(positions),
+        }
+    )
+
+
+def write_chiplet_table(base_output_dir, roi_name, table, pad_size_pix=0):
+    "Writes a table (or, if an integer, a table of that many indices)"
+
+    if isinstance(table, int):
+        table = pl.DataFrame({"index": np.arange(table)})
+
+    table_path = themeda_preproc.chiplet_table.get_table_path(
+        roi_name=roi_name,
+        base_output_dir=base_output_dir,
+        pad_size_pix=pad_size_pix,
+    )
+
+    table.write_parquet(file=table_path)
+
+    return table_path
+
+
+def write_chiplet_array(
+    base_output_dir,
+    source_name,
+    year,
+    roi_name,
+    data,
+    pad_size_pix=0,
+    denan=False,
+    dtype=None,
+):
+    chiplet_path = themeda_preproc.chiplets.get_chiplet_path(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        denan=denan,
+    )
+
+    chiplets = np.memmap(
+        filename=chiplet_path,
+        dtype=(
+            themeda_preproc.source.DATA_SOURCE_DTYPE[source_name]
+            if dtype is None
+            else dtype
+        ),
+        mode="w+",
+        shape=np.shape(data),
+    )
+
+    chiplets[:] = data
+    chiplets.flush()
+
+    del chiplets
+
+    return chiplet_path
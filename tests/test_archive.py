@@ -0,0 +1,55 @@
+import zipfile
+
+import themeda_preproc.archive
+
+
+def test_extract_archives(tmp_path):
+    archive_dir = tmp_path / "archives"
+    archive_dir.mkdir()
+
+    archive_paths = []
+    expected = {}
+
+    for i_archive in range(3):
+        archive_path = archive_dir / f"archive_{i_archive}.zip"
+
+        with zipfile.ZipFile(
+            file=archive_path, mode="w", compression=zipfile.ZIP_DEFLATED
+        ) as archive:
+            data = bytes([i_archive]) * (10_000 * (i_archive + 1))
+            archive.writestr(f"nested/dir/NLUM_{i_archive}.tif", data)
+            archive.writestr(f"nested/NLUM_{i_archive}.tif.xml", b"metadata")
+            archive.writestr("README.txt", b"unneeded")
+
+        expected[f"NLUM_{i_archive}.tif"] = data
+        archive_paths.append(archive_path)
+
+    output_dir = tmp_path / "output"
+
+    # a previous, interrupted, extraction of the correct size
+    output_dir.mkdir()
+    (output_dir / "NLUM_1.tif").write_bytes(b"\xff" * len(expected["NLUM_1.tif"]))
+
+    output_paths = themeda_preproc.archive.extract_archives(
+        archive_paths=archive_paths,
+        output_dir=output_dir,
+        member_filter=lambda filename: filename.endswith(".tif"),
+        n_workers=2,
+    )
+
+    assert sorted(path.name for path in output_paths) == sorted(expected)
+    assert sorted(path.name for path in output_dir.iterdir()) == sorted(expected)
+
+    for path in output_paths:
+        assert path.read_bytes() == expected[path.name]
+
+    # a repeat run shouldn't need to extract anything
+    mtimes = [path.stat().st_mtime_ns for path in output_paths]
+
+    themeda_preproc.archive.extract_archives(
+        archive_paths=archive_paths,
+        output_dir=output_dir,
+        member_filter=lambda filename: filename.endswith(".tif"),
+    )
+
+    assert [path.stat().st_mtime_ns for path in output_paths] == mtimes
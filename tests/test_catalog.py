@@ -0,0 +1,139 @@
+import pytest
+
+import themeda_preproc.catalog
+import themeda_preproc.chips
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.land_cover.utils
+
+
+@pytest.fixture()
+def chip_tree(tmp_path, write_raster):
+    land_cover_dir = tmp_path / "chips" / "roi_savanna" / "land_cover"
+
+    for year in [1988, 1989]:
+        for x, y in [(9, -24), (10, -24)]:
+            write_raster(
+                path=(
+                    land_cover_dir
+                    / str(year)
+                    / (
+                        f"ga_ls_landcover_class_cyear_2_1-0-0_au_x{x}y{y}_"
+                        + f"{year}-01-01_level4.tif"
+                    )
+                ),
+                left=x * 100_000,
+                top=(y + 1) * 100_000,
+                size_pix=100,
+                res=1000,
+            )
+
+    # a continental raster, which doesn't have a grid reference
+    write_raster(
+        path=tmp_path / "prep" / "rain" / "1988" / "rain_1988.tif",
+        left=-2_000_000,
+        top=-1_000_000,
+        size_pix=50,
+        res=5000,
+    )
+
+    return tmp_path
+
+
+def test_form_catalog(chip_tree, write_raster, monkeypatch):
+    catalog = themeda_preproc.catalog.form_catalog(
+        base_output_dir=chip_tree,
+        show_progress=False,
+    )
+
+    assert len(catalog) == 5
+
+    (rain_entry,) = themeda_preproc.catalog.query(
+        catalog=catalog,
+        stage="prep",
+        source_name=themeda_preproc.source.DataSourceName("rain"),
+    ).iter_rows(named=True)
+
+    assert rain_entry["year"] == 1988
+    assert rain_entry["roi_name"] is None
+    assert rain_entry["grid_ref_x"] is None
+    assert (rain_entry["height"], rain_entry["width"]) == (50, 50)
+
+    (chip_entry,) = themeda_preproc.catalog.query(
+        catalog=catalog,
+        roi_name=themeda_preproc.roi.ROIName("savanna"),
+        year=1989,
+        grid_ref=themeda_preproc.chips.GridRef(x=10, y=-24),
+    ).iter_rows(named=True)
+
+    assert chip_entry["stage"] == "chips"
+    assert chip_entry["dtype"] == "uint8"
+    assert chip_entry["nodata"] == 255
+
+    geobox = themeda_preproc.catalog.get_geobox(entry=chip_entry)
+
+    assert geobox.shape == (100, 100)
+    assert geobox.crs.epsg == 3577
+    assert tuple(geobox.boundingbox) == (1_000_000, -2_400_000, 1_100_000, -2_300_000)
+
+    themeda_preproc.catalog.write_catalog(catalog=catalog, base_output_dir=chip_tree)
+
+    # only the headers of files that have changed should need to be read again
+    changed_path = chip_tree / rain_entry["path"]
+
+    write_raster(
+        path=changed_path,
+        left=-2_000_000,
+        top=-1_000_000,
+        size_pix=60,
+        res=5000,
+    )
+
+    read_paths = []
+
+    original_read_entry = themeda_preproc.catalog.read_entry
+
+    def recording_read_entry(path, base_output_dir):
+        read_paths.append(path)
+        return original_read_entry(path=path, base_output_dir=base_output_dir)
+
+    monkeypatch.setattr(themeda_preproc.catalog, "read_entry", recording_read_entry)
+
+    updated_catalog = themeda_preproc.catalog.form_catalog(
+        base_output_dir=chip_tree,
+        previous_catalog=themeda_preproc.catalog.load_catalog(
+            base_output_dir=chip_tree
+        ),
+        show_progress=False,
+    )
+
+    assert read_paths == [changed_path]
+    assert len(updated_catalog) == 5
+
+    (updated_rain_entry,) = themeda_preproc.catalog.query(
+        catalog=updated_catalog,
+        source_name=themeda_preproc.source.DataSourceName("rain"),
+    ).iter_rows(named=True)
+
+    assert updated_rain_entry["width"] == 60
+
+
+def test_load_reference_geoboxes(chip_tree):
+    geoboxes = themeda_preproc.land_cover.utils.load_reference_geoboxes(
+        base_output_dir=chip_tree,
+        roi_name=themeda_preproc.roi.ROIName("savanna"),
+    )
+
+    assert list(geoboxes) == [
+        themeda_preproc.chips.GridRef(x=10, y=-24),
+        themeda_preproc.chips.GridRef(x=9, y=-24),
+    ]
+
+    for grid_ref, geobox in geoboxes.items():
+        assert (
+            themeda_preproc.chips.get_grid_ref_from_bounds(
+                left=geobox.boundingbox.left,
+                bottom=geobox.boundingbox.bottom,
+            )
+            == grid_ref
+        )
@@ -0,0 +1,108 @@
+import numpy as np
+
+import polars as pl
+
+import rioxarray.merge
+
+import themeda_preproc.chiplet_geotiff
+import themeda_preproc.chiplets
+import themeda_preproc.chips
+
+
+BASE_SIZE_PIX = 4
+
+
+def form_table(chiplet_positions):
+    "Forms a minimal chiplet table from (grid ref x, grid ref y, i x, i y) positions"
+
+    n = len(chiplet_positions)
+
+    (grid_ref_xs, grid_ref_ys, i_xs, i_ys) = zip(*chiplet_positions)
+
+    return pl.DataFrame(
+        {
+            "index": np.arange(n),
+            "chip_grid_ref_x_base": grid_ref_xs,
+            "chip_grid_ref_y_base": grid_ref_ys,
+            "chip_i_x_base": i_xs,
+            "chip_i_y_base": i_ys,
+            **{
+                f"chip_transform_i_to_coords_coeff_{letter}": [
+                    [grid_ref_x * 100_000.0 for grid_ref_x in grid_ref_xs]
+                    if letter == "c"
+                    else [(grid_ref_y + 1) * 100_000.0 for grid_ref_y in grid_ref_ys]
+                    if letter == "f"
+                    else [value] * n
+                ][0]
+                for (letter, value) in zip(
+                    "abcdefghi", [25.0, 0.0, None, 0.0, -25.0, None, 0.0, 0.0, 1.0]
+                )
+            },
+        }
+    )
+
+
+def test_partition_table():
+    table = form_table(
+        chiplet_positions=[(1, -20, 0, 0), (0, -20, 0, 0), (1, -20, 4, 0)]
+    )
+
+    chip_tables = themeda_preproc.chiplet_geotiff.partition_table(table=table)
+
+    assert list(chip_tables) == [
+        themeda_preproc.chips.GridRef(x=0, y=-20),
+        themeda_preproc.chips.GridRef(x=1, y=-20),
+    ]
+
+    assert chip_tables[themeda_preproc.chips.GridRef(x=1, y=-20)][
+        "index"
+    ].to_list() == [0, 2]
+
+
+def test_assemble_chip():
+    # a 3 x 2 block of chiplets, offset within the chip, with one missing
+    chiplet_positions = [
+        (1, -20, i_x, i_y)
+        for i_y in [8, 12]
+        for i_x in [4, 8, 12]
+        if (i_x, i_y) != (8, 12)
+    ]
+
+    table = form_table(chiplet_positions=chiplet_positions).sample(
+        fraction=1.0, shuffle=True, seed=0
+    )
+
+    chiplets = (
+        np.arange(len(table) * BASE_SIZE_PIX**2)
+        .reshape(len(table), BASE_SIZE_PIX, BASE_SIZE_PIX)
+        .astype(np.float32)
+    )
+
+    data = themeda_preproc.chiplet_geotiff.assemble_chip(
+        chiplets=chiplets,
+        chip_table=table,
+        base_size_pix=BASE_SIZE_PIX,
+        fill_value=np.nan,
+    )
+
+    assert data.shape == (BASE_SIZE_PIX * 2, BASE_SIZE_PIX * 3)
+
+    expected = rioxarray.merge.merge_arrays(
+        dataarrays=[
+            themeda_preproc.chiplets.convert_chiplet_to_data_array(
+                chiplet=chiplets[row["index"]],
+                metadata=row,
+                pad_size_pix=0,
+                base_size_pix=BASE_SIZE_PIX,
+                nodata=np.nan,
+            )
+            for row in table.iter_rows(named=True)
+        ],
+        nodata=np.nan,
+    )
+
+    np.testing.assert_array_equal(data.values, expected.values)
+    np.testing.assert_allclose(data.x.values, expected.x.values)
+    np.testing.assert_allclose(data.y.values, expected.y.values)
+
+    assert np.all(np.isnan(data.values[BASE_SIZE_PIX:, BASE_SIZE_PIX:-BASE_SIZE_PIX]))
@@ -0,0 +1,192 @@
+import concurrent.futures
+import os
+
+import numpy as np
+
+import polars as pl
+
+import themeda_preproc.chiplet_table
+import themeda_preproc.roi
+
+
+BASE_SIZE_PIX = 4
+
+
+def test_load_lattice(tmp_path, form_table, write_table):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+
+    positions = [(3, 2), (4, 2), (3, 4)]
+
+    table_path = write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=form_table(positions=positions),
+    )
+
+    lattice = themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        base_size_pix=BASE_SIZE_PIX,
+    )
+
+    assert isinstance(lattice.indices, np.memmap)
+    assert (lattice.col_offset, lattice.row_offset) == (2, 1)
+
+    assert lattice.indices.tolist() == [
+        [-1, -1, -1, -1],
+        [-1, 0, 1, -1],
+        [-1, -1, -1, -1],
+        [-1, 2, -1, -1],
+        [-1, -1, -1, -1],
+    ]
+
+    (lattice_path, _) = themeda_preproc.chiplet_table.get_lattice_paths(
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        pad_size_pix=0,
+    )
+
+    lattice_mtime_ns = lattice_path.stat().st_mtime_ns
+
+    del lattice
+
+    # the stored lookup is re-used while the table is unchanged
+    themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        base_size_pix=BASE_SIZE_PIX,
+    )
+
+    assert lattice_path.stat().st_mtime_ns == lattice_mtime_ns
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=form_table(positions=positions + [(5, 2)]),
+    )
+
+    stat = table_path.stat()
+    os.utime(table_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    lattice = themeda_preproc.chiplet_table.load_lattice(
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        base_size_pix=BASE_SIZE_PIX,
+    )
+
+    assert lattice.indices[1].tolist() == [-1, 0, 1, 3, -1]
+
+    stat = table_path.stat()
+    os.utime(table_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    # readers that all form the outdated lookup at once
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        lattices = list(
+            executor.map(
+                lambda _: themeda_preproc.chiplet_table.load_lattice(
+                    roi_name=roi_name,
+                    base_output_dir=tmp_path,
+                    base_size_pix=BASE_SIZE_PIX,
+                ),
+                range(16),
+            )
+        )
+
+    assert all(curr.indices.tolist() == lattice.indices.tolist() for curr in lattices)
+
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_load_table_cache(tmp_path, monkeypatch, form_table, write_table):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+
+    table_path = write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=form_table(positions=[(0, 0), (1, 0)]),
+    )
+
+    n_reads = 0
+    read_parquet = pl.read_parquet
+
+    def counting_read_parquet(*args, **kwargs):
+        nonlocal n_reads
+        n_reads += 1
+        return read_parquet(*args, **kwargs)
+
+    monkeypatch.setattr(pl, "read_parquet", counting_read_parquet)
+
+    for _ in range(3):
+        table = themeda_preproc.chiplet_table.load_table(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+        )
+
+        assert len(table) == 2
+
+    assert n_reads == 1
+
+    # the number of chiplets is available without reading the table
+    assert (
+        themeda_preproc.chiplet_table.get_n_chiplets(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+        )
+        == 2
+    )
+
+    themeda_preproc.chiplet_table.clear_table_cache()
+
+    assert (
+        themeda_preproc.chiplet_table.get_n_chiplets(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+        )
+        == 2
+    )
+
+    assert n_reads == 1
+
+    # a changed table is read again
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=form_table(positions=[(0, 0), (1, 0), (2, 0)]),
+    )
+
+    stat = table_path.stat()
+    os.utime(table_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert (
+        themeda_preproc.chiplet_table.get_n_chiplets(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+        )
+        == 3
+    )
+
+    assert n_reads == 2
+
+    stat = table_path.stat()
+    os.utime(table_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    # readers that all re-form the outdated info file at once
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        n_chiplets = list(
+            executor.map(
+                lambda _: themeda_preproc.chiplet_table.get_n_chiplets(
+                    roi_name=roi_name,
+                    base_output_dir=tmp_path,
+                    pad_size_pix=0,
+                ),
+                range(16),
+            )
+        )
+
+    assert n_chiplets == [3] * 16
+
+    assert not list(tmp_path.rglob("*.part"))
@@ -1,3 +1,6 @@
+import concurrent.futures
+import multiprocessing
+import pickle
 import types
 
 import numpy as np
@@ -5,6 +8,7 @@ import numpy as np
 import xarray as xr
 
 import themeda_preproc.chiplets
+import themeda_preproc.denan_chiplets
 import themeda_preproc.source
 import themeda_preproc.roi
 
@@ -119,3 +123,293 @@ def convert_chiplet_to_data_array(pad_size_pix):
     assert da.y.max() == (METADATA["bbox_top"] - pixel_delta / 2)
 
     return da
+
+
+def test_padded_chiplets_reader(
+    base_output_dir, form_table, write_table, write_chiplets
+):
+    source_name = themeda_preproc.source.DataSourceName("tmax")
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    (base_size_pix, pad_size_pix, year) = (4, 2, 2001)
+
+    # a row of three chiplets, with the middle one missing, and one below the first
+    positions = [(0, 0), (2, 0), (0, 1)]
+
+    write_table(
+        base_output_dir=base_output_dir,
+        roi_name=roi_name,
+        table=form_table(positions=positions, base_size_pix=base_size_pix),
+    )
+
+    chiplets = np.arange(len(positions) * base_size_pix**2).reshape(
+        len(positions), base_size_pix, base_size_pix
+    )
+
+    write_chiplets(
+        base_output_dir=base_output_dir,
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        data=chiplets,
+        denan=True,
+    )
+
+    with themeda_preproc.chiplets.padded_chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=base_output_dir,
+        base_size_pix=base_size_pix,
+    ) as padded_chiplets:
+        assert len(padded_chiplets) == 3
+        assert padded_chiplets.shape == (3, 8, 8)
+
+        batch = padded_chiplets[[2, 0]]
+
+        assert batch.shape == (2, 8, 8)
+        np.testing.assert_array_equal(batch[1], padded_chiplets[0])
+        np.testing.assert_array_equal(padded_chiplets[-1], padded_chiplets[2])
+
+        first = padded_chiplets[0]
+
+        # the chiplet itself
+        np.testing.assert_array_equal(first[2:6, 2:6], chiplets[0])
+
+        # the chiplet below it
+        np.testing.assert_array_equal(first[6:, 2:6], chiplets[2, :2, :])
+
+        # there is no chiplet to the right or above
+        assert np.all(np.isnan(first[2:6, 6:]))
+        assert np.all(np.isnan(first[:2, :]))
+
+
+def test_chiplets_pool(tmp_path, write_table, write_chiplets):
+    source_name = themeda_preproc.source.DataSourceName("land_cover")
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    (base_size_pix, n_chiplets) = (4, 2)
+
+    write_table(base_output_dir=tmp_path, roi_name=roi_name, table=n_chiplets)
+
+    years = [2001, 2002, 2003]
+
+    for year in years:
+        write_chiplets(
+            base_output_dir=tmp_path,
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            data=np.full((n_chiplets, base_size_pix, base_size_pix), year % 100),
+        )
+
+    with themeda_preproc.chiplets.ChipletsPool(
+        base_output_dir=tmp_path,
+        base_size_pix=base_size_pix,
+        max_handles=2,
+    ) as pool:
+        handles = {
+            year: pool.get(
+                source_name=source_name,
+                year=year,
+                roi_name=roi_name,
+                pad_size_pix=0,
+            )
+            for year in years[:2]
+        }
+
+        # re-used while held, and 2001 becomes the most recently used
+        assert handles[2001] is pool.get(
+            source_name=source_name,
+            year=2001,
+            roi_name=roi_name,
+            pad_size_pix=0,
+        )
+
+        pool.get(source_name=source_name, year=2003, roi_name=roi_name, pad_size_pix=0)
+
+        assert len(pool) == 2
+
+        # 2002 was evicted, but the handle that is still referenced remains valid
+        assert handles[2002] is not pool.get(
+            source_name=source_name,
+            year=2002,
+            roi_name=roi_name,
+            pad_size_pix=0,
+        )
+        assert np.all(handles[2002] == 2)
+
+        assert pool.n_bytes == 2 * n_chiplets * base_size_pix**2
+
+    assert len(pool) == 0
+
+    # a limit on the total size of the handles
+    pool = themeda_preproc.chiplets.ChipletsPool(
+        base_output_dir=tmp_path,
+        base_size_pix=base_size_pix,
+        max_bytes=n_chiplets * base_size_pix**2,
+    )
+
+    for year in years:
+        chiplets = pool.get(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            pad_size_pix=0,
+        )
+
+        assert np.all(chiplets == year % 100)
+        assert len(pool) == 1
+
+    # a copy in another process starts empty
+    assert len(pickle.loads(pickle.dumps(pool))) == 0
+
+    # threads that open the same chiplets at once all receive the pool's handle
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        thread_handles = list(
+            executor.map(
+                lambda _: pool.get(
+                    source_name=source_name,
+                    year=2001,
+                    roi_name=roi_name,
+                    pad_size_pix=0,
+                ),
+                range(32),
+            )
+        )
+
+    assert all(handle is thread_handles[-1] for handle in thread_handles)
+
+    # a worker that is forked while another thread holds the lock can still use it
+    with pool._lock:
+        worker = multiprocessing.get_context("fork").Process(
+            daemon=True,
+            target=pool.get,
+            kwargs={
+                "source_name": source_name,
+                "year": 2002,
+                "roi_name": roi_name,
+                "pad_size_pix": 0,
+            },
+        )
+        worker.start()
+        worker.join(timeout=10)
+
+    assert worker.exitcode == 0
+
+
+def test_prepare_chiplets():
+    rand = np.random.default_rng(seed=0)
+
+    chiplets = rand.uniform(low=1.0, high=10.0, size=(3, 4, 4)).astype(np.float16)
+
+    chiplets[0, 1:3, 2] = np.nan
+    chiplets[2] = np.nan
+
+    (mean, sd) = (1.5, 0.5)
+
+    # the reference is de-NaN-ing as in `denan_chiplets`, then normalising
+    expected = chiplets.astype(np.float64)
+
+    for chiplet in expected:
+        is_nan = np.isnan(chiplet)
+        chiplet[is_nan] = 0.0 if np.all(is_nan) else np.float16(np.nanmean(chiplet))
+
+    with np.errstate(divide="ignore"):
+        expected_log = (np.log(expected) - mean) / sd
+
+    # written into a strided view, as for a batch
+    batch = np.zeros(shape=(3, 2, 4, 4), dtype=np.float32)
+
+    prepared = themeda_preproc.chiplets.prepare_chiplets(
+        chiplets=chiplets,
+        log_transform=True,
+        mean=mean,
+        sd=sd,
+        out=batch[:, 1],
+    )
+
+    assert prepared.dtype == np.float32
+    np.testing.assert_allclose(batch[:, 1], expected_log, rtol=1e-5)
+    assert np.all(batch[:, 0] == 0)
+
+    np.testing.assert_allclose(
+        themeda_preproc.chiplets.prepare_chiplets(chiplets=chiplets),
+        expected,
+        rtol=1e-5,
+    )
+
+    assert np.isnan(
+        themeda_preproc.chiplets.prepare_chiplets(chiplets=chiplets, fill_nan=False)[
+            0, 1, 2
+        ]
+    )
+
+
+def test_prepare_chiplets_matches_denan(tmp_path, write_table, write_chiplets):
+    source_name = themeda_preproc.source.DataSourceName("tmax")
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    # the de-NaN stage reads chiplets of the default size
+    (base_size_pix, n_chiplets, year) = (160, 4, 2001)
+
+    write_table(base_output_dir=tmp_path, roi_name=roi_name, table=n_chiplets)
+
+    rand = np.random.default_rng(seed=0)
+
+    chiplets = rand.uniform(
+        low=1.0, high=40.0, size=(n_chiplets, base_size_pix, base_size_pix)
+    ).astype(np.float16)
+
+    chiplets[rand.random(size=chiplets.shape) < 0.3] = np.nan
+
+    write_chiplets(
+        base_output_dir=tmp_path,
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        data=chiplets,
+    )
+
+    themeda_preproc.denan_chiplets.run_denan_year_chiplets(
+        progress_bar_position=0,
+        year=year,
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=tmp_path,
+        protect=False,
+        show_progress=False,
+    )
+
+    with themeda_preproc.chiplets.chiplets_reader(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        pad_size_pix=0,
+        base_output_dir=tmp_path,
+    ) as denan_chiplets:
+        expected = np.array(denan_chiplets, dtype=np.float32)
+
+    np.testing.assert_array_equal(
+        themeda_preproc.chiplets.prepare_chiplets(chiplets=chiplets),
+        expected,
+    )
+
+
+def test_round_to_float16():
+    rand = np.random.default_rng(seed=0)
+
+    # across the normal and subnormal ranges, and the largest finite value
+    values = np.concatenate(
+        [
+            rand.uniform(low=-10.0, high=10.0, size=1000),
+            rand.uniform(low=-1e-6, high=1e-6, size=1000),
+            [0.0, 65504.0, 65519.0, 6.1e-5, 3e-8],
+        ]
+    )
+
+    np.testing.assert_array_equal(
+        [themeda_preproc.chiplets.round_to_float16(value=value) for value in values],
+        values.astype(np.float16).astype(np.float64),
+    )
+
+    assert themeda_preproc.chiplets.round_to_float16(value=65520.0) == np.inf
@@ -0,0 +1,74 @@
+import numpy as np
+
+import xarray as xr
+
+import pytest
+
+import rasterio
+import rasterio.enums
+
+import rioxarray  # noqa
+
+import themeda_preproc.chips
+
+
+def test_write_chip_overviews(tmp_path):
+    (size_pix, res) = (2000, 25.0)
+
+    chip = xr.DataArray(
+        data=np.arange(size_pix**2, dtype=np.float32).reshape(size_pix, size_pix),
+        dims=("y", "x"),
+        coords={
+            "x": np.arange(size_pix) * res + res / 2,
+            "y": -(np.arange(size_pix) * res + res / 2),
+        },
+    )
+
+    chip.rio.write_crs(input_crs=3577, inplace=True)
+
+    path = tmp_path / "chip.tif"
+
+    themeda_preproc.chips.write_chip(
+        chip=chip,
+        path=path,
+        resampling=rasterio.enums.Resampling.bilinear,
+    )
+
+    with rasterio.open(path) as handle:
+        assert handle.profile["tiled"]
+        assert handle.block_shapes[0] == (themeda_preproc.chips.BLOCK_SIZE_PIX,) * 2
+        assert handle.overviews(1) == [2, 4]
+
+    np.testing.assert_array_equal(
+        themeda_preproc.chips.read_chip(path=path, load_data=True).values,
+        chip.values,
+    )
+
+
+@pytest.mark.parametrize("codec", list(themeda_preproc.chips.Codec))
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+def test_write_chip_codec(tmp_path, codec, dtype):
+    chip = xr.DataArray(
+        data=np.arange(64, dtype=dtype).reshape(8, 8),
+        dims=("y", "x"),
+        coords={"x": np.arange(8) * 25 + 12.5, "y": -(np.arange(8) * 25 + 12.5)},
+    )
+
+    chip.rio.write_crs(input_crs=3577, inplace=True)
+
+    path = tmp_path / "chip.tif"
+
+    themeda_preproc.chips.write_chip(chip=chip, path=path, codec=codec, n_threads=2)
+
+    with rasterio.open(path) as handle:
+        tags = handle.tags(ns="IMAGE_STRUCTURE")
+
+    assert tags["COMPRESSION"] == codec.value.upper()
+
+    if codec in themeda_preproc.chips.CODEC_LEVEL:
+        assert tags["PREDICTOR"] == ("3" if dtype == np.float32 else "2")
+
+    np.testing.assert_array_equal(
+        themeda_preproc.chips.read_chip(path=path, load_data=True).values,
+        chip.values,
+    )
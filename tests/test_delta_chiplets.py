@@ -0,0 +1,131 @@
+import numpy as np
+
+import pytest
+
+import themeda_preproc.delta_chiplets
+import themeda_preproc.roi
+import themeda_preproc.source
+
+
+def test_run(tmp_path, write_table, write_chiplets):
+    source_name = themeda_preproc.source.DataSourceName("land_cover")
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    (base_size_pix, pad_size_pix, n_chiplets) = (4, 2, 5)
+    years = [2001, 2002, 2003]
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=n_chiplets,
+        pad_size_pix=pad_size_pix,
+    )
+
+    rand = np.random.default_rng(seed=0)
+
+    size_pix = base_size_pix + pad_size_pix * 2
+
+    year_chiplets = [
+        rand.integers(low=0, high=20, size=(n_chiplets, size_pix, size_pix))
+    ]
+
+    for _ in years[1:]:
+        curr_chiplets = year_chiplets[-1].copy()
+        # changes at about a tenth of the pixels, with none in the first chiplet
+        is_changed = rand.random(size=curr_chiplets.shape) < 0.1
+        is_changed[0] = False
+        curr_chiplets[is_changed] = rand.integers(
+            low=20, high=40, size=is_changed.sum()
+        )
+        year_chiplets.append(curr_chiplets)
+
+    for year, curr_chiplets in zip(years, year_chiplets):
+        write_chiplets(
+            base_output_dir=tmp_path,
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            data=curr_chiplets,
+            pad_size_pix=pad_size_pix,
+        )
+
+    themeda_preproc.delta_chiplets.run(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=tmp_path,
+        base_size_pix=base_size_pix,
+        protect=False,
+        show_progress=False,
+    )
+
+    delta_chiplets = themeda_preproc.delta_chiplets.load_delta_chiplets(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=tmp_path,
+    )
+
+    assert delta_chiplets.years == years
+
+    assert delta_chiplets.chiplet.dtype == np.uint32
+    assert delta_chiplets.pixel.dtype == np.uint8
+    assert len(delta_chiplets.value) == delta_chiplets.n_changed.sum()
+
+    np.testing.assert_array_equal(
+        themeda_preproc.delta_chiplets.reconstruct_chiplets(
+            delta_chiplets=delta_chiplets,
+            years=years,
+        ),
+        np.stack(year_chiplets),
+    )
+
+    np.testing.assert_array_equal(
+        themeda_preproc.delta_chiplets.reconstruct_chiplets(
+            delta_chiplets=delta_chiplets,
+            years=[2003, 2002],
+            indices=[4, 0, 2],
+        ),
+        np.stack([year_chiplets[2], year_chiplets[1]])[:, [4, 0, 2]],
+    )
+
+    np.testing.assert_array_equal(
+        themeda_preproc.delta_chiplets.reconstruct_chiplets(
+            delta_chiplets=delta_chiplets,
+            years=[2002, 2001, 2003, 2002],
+        ),
+        np.stack(
+            [year_chiplets[1], year_chiplets[0], year_chiplets[2], year_chiplets[1]]
+        ),
+    )
+
+    empty = themeda_preproc.delta_chiplets.reconstruct_chiplets(
+        delta_chiplets=delta_chiplets,
+        years=[],
+        indices=[1, 3],
+    )
+
+    assert empty.shape == (0, 2, size_pix, size_pix)
+
+    n_changed = themeda_preproc.delta_chiplets.get_n_changed(
+        delta_chiplets=delta_chiplets
+    )
+
+    assert n_changed.year.values.tolist() == years[1:]
+
+    np.testing.assert_array_equal(
+        n_changed.values,
+        [
+            (curr_chiplets != prev_chiplets).sum(axis=(-1, -2))
+            for (prev_chiplets, curr_chiplets) in zip(
+                year_chiplets[:-1], year_chiplets[1:]
+            )
+        ],
+    )
+
+    assert (n_changed.sel(chiplet=0) == 0).all()
+
+    with pytest.raises(ValueError):
+        themeda_preproc.delta_chiplets.reconstruct_chiplets(
+            delta_chiplets=delta_chiplets,
+            years=[2004],
+        )
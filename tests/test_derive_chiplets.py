@@ -0,0 +1,142 @@
+import numpy as np
+
+import polars as pl
+
+import pytest
+
+import themeda_preproc.chiplets
+import themeda_preproc.chips
+import themeda_preproc.derive_chiplets
+import themeda_preproc.roi
+import themeda_preproc.source
+
+
+(BASE_SIZE_PIX, PAD_SIZE_PIX, CHIP_SIZE_PIX) = (4, 2, 8)
+
+
+def form_table(chiplet_positions):
+    "Forms a minimal chiplet table from (grid ref x, grid ref y, i x, i y) positions"
+
+    return pl.DataFrame(
+        {
+            "index": np.arange(len(chiplet_positions)),
+            **{
+                column: [position[i_column] for position in chiplet_positions]
+                for (i_column, column) in enumerate(
+                    themeda_preproc.derive_chiplets.MATCH_COLUMNS
+                )
+            },
+            "chip_transform_i_to_coords_coeff_a": (
+                [themeda_preproc.chips.CHIP_SIZE_M / CHIP_SIZE_PIX]
+                * len(chiplet_positions)
+            ),
+        }
+    )
+
+
+def test_derive_year_chiplets(tmp_path, write_table, write_chiplets):
+    source_name = themeda_preproc.source.DataSourceName("tmax")
+    (roi_name, parent_roi_name) = (
+        themeda_preproc.roi.ROIName("savanna"),
+        themeda_preproc.roi.ROIName("australia"),
+    )
+    year = 2001
+
+    # the parent has two chips side-by-side, each with a 2 x 2 grid of chiplets
+    parent_positions = [
+        (grid_ref_x, 0, i_x, i_y)
+        for grid_ref_x in [0, 1]
+        for i_y in range(0, CHIP_SIZE_PIX, BASE_SIZE_PIX)
+        for i_x in range(0, CHIP_SIZE_PIX, BASE_SIZE_PIX)
+    ]
+
+    # the derived ROI only has some of the chiplets from the first chip
+    positions = [(0, 0, 4, 0), (0, 0, 0, 4), (0, 0, 4, 4)]
+
+    table = form_table(chiplet_positions=positions)
+    parent_table = form_table(chiplet_positions=parent_positions)
+
+    parent_indices = themeda_preproc.derive_chiplets.get_parent_indices(
+        table=table,
+        parent_table=parent_table.sample(fraction=1.0, shuffle=True, seed=0),
+    )
+
+    assert parent_indices.tolist() == [1, 2, 3]
+
+    padded_size_pix = BASE_SIZE_PIX + PAD_SIZE_PIX * 2
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=parent_roi_name,
+        table=parent_table,
+        pad_size_pix=PAD_SIZE_PIX,
+    )
+
+    parent_chiplets = np.arange(
+        len(parent_positions) * padded_size_pix**2,
+        dtype=themeda_preproc.source.DATA_SOURCE_DTYPE[source_name],
+    ).reshape(len(parent_positions), padded_size_pix, padded_size_pix)
+
+    write_chiplets(
+        base_output_dir=tmp_path,
+        source_name=source_name,
+        year=year,
+        roi_name=parent_roi_name,
+        data=parent_chiplets,
+        pad_size_pix=PAD_SIZE_PIX,
+    )
+
+    themeda_preproc.derive_chiplets.derive_year_chiplets(
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        parent_roi_name=parent_roi_name,
+        pad_size_pix=PAD_SIZE_PIX,
+        base_output_dir=tmp_path,
+        parent_indices=parent_indices,
+        pad_masks=themeda_preproc.derive_chiplets.get_pad_masks(
+            table=table,
+            base_size_pix=BASE_SIZE_PIX,
+            pad_size_pix=PAD_SIZE_PIX,
+        ),
+        base_size_pix=BASE_SIZE_PIX,
+        protect=False,
+        block_size=2,
+    )
+
+    chiplets = np.memmap(
+        filename=themeda_preproc.chiplets.get_chiplet_path(
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            pad_size_pix=PAD_SIZE_PIX,
+            base_output_dir=tmp_path,
+        ),
+        dtype=themeda_preproc.source.DATA_SOURCE_DTYPE[source_name],
+        mode="r",
+        shape=(len(positions), padded_size_pix, padded_size_pix),
+    )
+
+    for chiplet, parent_index, (_, _, i_x, i_y) in zip(
+        chiplets, parent_indices, positions
+    ):
+        # only the pixels that are within the chip should be retained
+        i_chip_rows = np.arange(padded_size_pix) + i_y - PAD_SIZE_PIX
+        i_chip_cols = np.arange(padded_size_pix) + i_x - PAD_SIZE_PIX
+
+        is_in_chip = np.logical_and.outer(
+            (i_chip_rows >= 0) & (i_chip_rows < CHIP_SIZE_PIX),
+            (i_chip_cols >= 0) & (i_chip_cols < CHIP_SIZE_PIX),
+        )
+
+        expected = np.where(is_in_chip, parent_chiplets[parent_index], np.nan)
+
+        np.testing.assert_array_equal(chiplet, expected)
+
+
+def test_get_parent_indices_unmatched():
+    with pytest.raises(ValueError):
+        themeda_preproc.derive_chiplets.get_parent_indices(
+            table=form_table(chiplet_positions=[(0, 0, 0, 0), (5, 5, 0, 0)]),
+            parent_table=form_table(chiplet_positions=[(0, 0, 0, 0)]),
+        )
@@ -0,0 +1,126 @@
+import pytest
+
+import requests
+
+import themeda_preproc.download
+import themeda_preproc.utils
+
+
+def test_download_files(http_server, tmp_path):
+    (url, serve_dir, _) = http_server
+
+    output_dir = tmp_path / "local"
+    output_dir.mkdir()
+
+    items = []
+
+    for i_file in range(10):
+        filename = f"file_{i_file}.nc"
+        (serve_dir / filename).write_bytes(bytes([i_file]) * (1000 * (i_file + 1)))
+
+        items.append(
+            themeda_preproc.download.DownloadItem(
+                url=f"{url}/{filename}",
+                path=output_dir / filename,
+            )
+        )
+
+    # a truncated download, as might be left by an interrupted run
+    items[3].path.write_bytes(b"\x03" * 10)
+
+    # and a complete one, that shouldn't be downloaded again
+    items[4].path.write_bytes((serve_dir / items[4].path.name).read_bytes())
+    items[4].path.chmod(0o440)
+    complete_mtime = items[4].path.stat().st_mtime_ns
+
+    themeda_preproc.download.download_files(
+        items=items,
+        n_workers=4,
+        protect=False,
+        show_progress=False,
+    )
+
+    for item in items:
+        assert item.path.read_bytes() == (serve_dir / item.path.name).read_bytes()
+
+    assert items[4].path.stat().st_mtime_ns == complete_mtime
+
+    assert not list(output_dir.glob("*.part"))
+
+
+def test_download_files_failure(http_server, tmp_path):
+    (url, _, _) = http_server
+
+    item = themeda_preproc.download.DownloadItem(
+        url=f"{url}/absent.nc",
+        path=tmp_path / "absent.nc",
+    )
+
+    with pytest.raises(ValueError, match="absent.nc"):
+        themeda_preproc.download.download_files(
+            items=[item],
+            n_attempts=2,
+            backoff_s=0.0,
+            protect=False,
+            show_progress=False,
+        )
+
+    assert not item.path.exists()
+
+
+def test_download_item_check_retried(http_server, tmp_path, monkeypatch):
+    (url, serve_dir, _) = http_server
+
+    (serve_dir / "data.nc").write_bytes(b"\x01" * 100)
+
+    item = themeda_preproc.download.DownloadItem(
+        url=f"{url}/data.nc",
+        path=tmp_path / "data.nc",
+    )
+
+    # an existing file, whose size needs to be checked with the server
+    item.path.write_bytes(b"\x01" * 10)
+
+    get_remote_size = themeda_preproc.download.get_remote_size
+    n_calls = []
+
+    def flaky_get_remote_size(url, session):
+        n_calls.append(url)
+        if len(n_calls) == 1:
+            raise requests.ConnectionError("Transient failure")
+        return get_remote_size(url=url, session=session)
+
+    monkeypatch.setattr(
+        themeda_preproc.download, "get_remote_size", flaky_get_remote_size
+    )
+
+    with themeda_preproc.download.get_session(pool_size=1) as session:
+        themeda_preproc.download.download_item(
+            item=item,
+            session=session,
+            n_attempts=2,
+            backoff_s=0.0,
+            protect=False,
+        )
+
+    assert len(n_calls) == 2
+    assert item.path.read_bytes() == b"\x01" * 100
+
+
+def test_download_file_atomic_size_check(http_server, tmp_path):
+    (url, serve_dir, _) = http_server
+
+    (serve_dir / "data.nc").write_bytes(b"\x00" * 100)
+
+    output_path = tmp_path / "data.nc"
+
+    with themeda_preproc.download.get_session(pool_size=1) as session:
+        with pytest.raises(ValueError):
+            themeda_preproc.utils.download_file(
+                url=f"{url}/data.nc",
+                output_path=output_path,
+                session=session,
+                expected_size=101,
+            )
+
+    assert not output_path.exists()
@@ -0,0 +1,164 @@
+import hashlib
+import http.server
+import threading
+import urllib.parse
+import xml.sax.saxutils
+
+import pytest
+
+import botocore.exceptions
+
+import themeda_preproc.land_cover.acquire
+
+
+BUCKET = "test-bucket"
+
+
+class S3Handler(http.server.BaseHTTPRequestHandler):
+    "A minimal, anonymous, path-style S3 stand-in for listing and getting objects"
+
+    objects = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        (bucket, _, key) = url.path.lstrip("/").partition("/")
+
+        if bucket != BUCKET:
+            self.send_error(404)
+        elif key == "":
+            self.send_listing(query=urllib.parse.parse_qs(url.query))
+        elif key in self.objects:
+            data = self.objects[key]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", f'"{hashlib.md5(data).hexdigest()}"')
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_error(404)
+
+    def send_listing(self, query):
+        (prefix,) = query.get("prefix", [""])
+
+        contents = "".join(
+            "<Contents>"
+            + f"<Key>{xml.sax.saxutils.escape(key)}</Key>"
+            + f"<Size>{len(data)}</Size>"
+            + f"<ETag>&quot;{hashlib.md5(data).hexdigest()}&quot;</ETag>"
+            + "</Contents>"
+            for (key, data) in sorted(self.objects.items())
+            if key.startswith(prefix)
+        )
+
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            + '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            + f"<Name>{BUCKET}</Name><Prefix>{prefix}</Prefix>"
+            + "<IsTruncated>false</IsTruncated>"
+            + contents
+            + "</ListBucketResult>"
+        ).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture()
+def s3_client():
+    S3Handler.objects = {
+        f"product/x{i}y-1_{year}_level4.tif": bytes([i]) * (100 * (i + 1) + year)
+        for i in range(4)
+        for year in (1988, 1989)
+    }
+    S3Handler.objects["product/x0y-1_1988_level3.tif"] = b"not needed"
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), S3Handler)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    (host, port) = server.server_address
+
+    client = themeda_preproc.land_cover.acquire.get_client(
+        endpoint_url=f"http://{host}:{port}",
+    )
+
+    yield client
+
+    client.close()
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_download_objects(s3_client, tmp_path):
+    expected = {
+        key.split("/")[-1]: data
+        for (key, data) in S3Handler.objects.items()
+        if key.endswith("level4.tif")
+    }
+
+    # an interrupted download, of the correct size but with incorrect contents
+    (stale_name, stale_data) = sorted(expected.items())[0]
+    (tmp_path / stale_name).write_bytes(b"\xff" * len(stale_data))
+
+    themeda_preproc.land_cover.acquire.download_objects(
+        client=s3_client,
+        bucket=BUCKET,
+        prefix="product/",
+        output_dir=tmp_path,
+        key_filter=lambda key: key.endswith("level4.tif"),
+        n_workers=3,
+        protect=True,
+        show_progress=False,
+    )
+
+    local_paths = sorted(tmp_path.iterdir())
+
+    assert [path.name for path in local_paths] == sorted(expected)
+
+    for path in local_paths:
+        assert path.read_bytes() == expected[path.name]
+
+    # a repeat run shouldn't need to fetch anything
+    mtimes = [path.stat().st_mtime_ns for path in local_paths]
+
+    themeda_preproc.land_cover.acquire.download_objects(
+        client=s3_client,
+        bucket=BUCKET,
+        prefix="product/",
+        output_dir=tmp_path,
+        key_filter=lambda key: key.endswith("level4.tif"),
+        show_progress=False,
+    )
+
+    assert [path.stat().st_mtime_ns for path in local_paths] == mtimes
+
+
+@pytest.mark.parametrize(
+    "code,status,expected",
+    [
+        ("SlowDown", 503, True),
+        ("InternalError", 500, True),
+        ("RequestTimeout", 400, True),
+        ("BadGateway", 502, True),
+        ("AccessDenied", 403, False),
+        ("NoSuchKey", 404, False),
+    ],
+)
+def test_is_retryable_error(code, status, expected):
+    exception = botocore.exceptions.ClientError(
+        error_response={
+            "Error": {"Code": code},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        operation_name="GetObject",
+    )
+
+    assert themeda_preproc.land_cover.acquire.is_retryable_error(exception) == expected
@@ -0,0 +1,43 @@
+import themeda_preproc.chips
+import themeda_preproc.land_cover.utils
+import themeda_preproc.land_cover.prep
+
+
+def test_get_valid_grid_refs(tmp_path, write_raster):
+    raw_dir = tmp_path / "raw" / "land_cover"
+
+    raw_chip_path_info = {}
+
+    for x in [9, 10, 11]:
+        grid_ref = themeda_preproc.chips.GridRef(x=x, y=-24)
+        raw_chip_path_info[grid_ref] = []
+
+        # the 11 location is missing a year
+        for year in [1988, 1989] if x != 11 else [1988]:
+            path = raw_dir / (
+                f"ga_ls_landcover_class_cyear_2_1-0-0_au_x{x}y-24_"
+                + f"{year}-01-01_level4.tif"
+            )
+
+            # the 10 location has a different resolution in one of the years
+            res = 500 if (x == 10 and year == 1989) else 1000
+
+            write_raster(
+                path=path,
+                left=x * 100_000,
+                top=-23 * 100_000,
+                size_pix=100_000 // res,
+                res=res,
+            )
+
+            raw_chip_path_info[grid_ref].append(
+                themeda_preproc.land_cover.utils.parse_chip_path(path=path)
+            )
+
+    valid_grid_refs = themeda_preproc.land_cover.prep.get_valid_grid_refs(
+        raw_chip_path_info=raw_chip_path_info,
+        expected_n_years=2,
+        base_output_dir=tmp_path,
+    )
+
+    assert valid_grid_refs == {themeda_preproc.chips.GridRef(x=9, y=-24)}
@@ -0,0 +1,147 @@
+import dataclasses
+import json
+
+import numpy as np
+
+import themeda_preproc.loader
+import themeda_preproc.roi
+import themeda_preproc.source
+import themeda_preproc.summary_stats
+
+
+(BASE_SIZE_PIX, N_CHIPLETS) = (4, 10)
+
+
+def get_chiplets(year, denan=True):
+    # each chiplet is filled with its index plus the year offset
+    chiplets = np.tile(
+        (np.arange(N_CHIPLETS) + year % 100 * 10)[:, None, None].astype(np.float32),
+        (1, BASE_SIZE_PIX, BASE_SIZE_PIX),
+    )
+
+    if not denan:
+        chiplets[:, 0, 0] = np.nan
+
+    return chiplets
+
+
+def test_iter_batches(tmp_path, write_table, write_chiplets):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+
+    (tmax, land_cover) = (
+        themeda_preproc.source.DataSourceName(source_name_str)
+        for source_name_str in ["tmax", "land_cover"]
+    )
+
+    write_table(base_output_dir=tmp_path, roi_name=roi_name, table=N_CHIPLETS)
+
+    for source_name, years in {tmax: [2001, 2002], land_cover: [2002]}.items():
+        for year in years:
+            write_chiplets(
+                base_output_dir=tmp_path,
+                source_name=source_name,
+                year=year,
+                roi_name=roi_name,
+                data=get_chiplets(year=year),
+                denan=True,
+            )
+
+    stats = themeda_preproc.summary_stats.SummaryStats(
+        source_name="tmax",
+        years=[2001, 2002],
+        min_val=0.0,
+        max_val=30.0,
+        mean=10.0,
+        sd=2.0,
+    )
+
+    themeda_preproc.summary_stats.get_output_path(
+        source_name=tmax,
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+    ).write_text(json.dumps(dataclasses.asdict(stats)))
+
+    indices = [7, 2, 9, 0, 4]
+
+    batches = list(
+        themeda_preproc.loader.iter_batches(
+            indices=indices,
+            source_names=[tmax, land_cover],
+            years=[2001, 2002],
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            batch_size=2,
+            base_size_pix=BASE_SIZE_PIX,
+            normalise=True,
+            n_workers=2,
+            n_prefetch=1,
+        )
+    )
+
+    assert [batch.indices.tolist() for batch in batches] == [[2, 7], [0, 9], [4]]
+
+    batch = batches[0]
+
+    assert batch.data.shape == (2, 2, 2, BASE_SIZE_PIX, BASE_SIZE_PIX)
+    assert batch.data.dtype == np.float32
+
+    # (batch, year, source) at the first pixel
+    np.testing.assert_array_equal(
+        batch.data[..., 0, 0],
+        [
+            [[(12 - 10) / 2, np.nan], [(22 - 10) / 2, 22]],
+            [[(17 - 10) / 2, np.nan], [(27 - 10) / 2, 27]],
+        ],
+    )
+
+    shuffled_batches = list(
+        themeda_preproc.loader.iter_batches(
+            indices=indices,
+            source_names=[land_cover],
+            years=[2002],
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            batch_size=2,
+            base_size_pix=BASE_SIZE_PIX,
+            shuffle=True,
+            rand_seed=0,
+            drop_last=True,
+        )
+    )
+
+    assert len(shuffled_batches) == 2
+
+    for shuffled_batch in shuffled_batches:
+        assert np.all(np.diff(shuffled_batch.indices) > 0)
+        np.testing.assert_array_equal(
+            shuffled_batch.data[:, 0, 0, 0, 0],
+            shuffled_batch.indices + 20,
+        )
+
+
+def test_iter_batches_denan_at_read(tmp_path, write_table, write_chiplets):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    tmax = themeda_preproc.source.DataSourceName("tmax")
+
+    write_table(base_output_dir=tmp_path, roi_name=roi_name, table=N_CHIPLETS)
+
+    write_chiplets(
+        base_output_dir=tmp_path,
+        source_name=tmax,
+        year=2001,
+        roi_name=roi_name,
+        data=get_chiplets(year=2001, denan=False),
+    )
+
+    (batch,) = themeda_preproc.loader.iter_batches(
+        indices=[3, 1],
+        source_names=[tmax],
+        years=[2001],
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        base_size_pix=BASE_SIZE_PIX,
+        denan_at_read=True,
+    )
+
+    # the NaN is filled with the mean of the rest of its chiplet
+    assert batch.data[:, 0, 0, 0, 0].tolist() == [11, 13]
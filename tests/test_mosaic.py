@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+
+import pytest
+
+import themeda_preproc.mosaic
+import themeda_preproc.roi
+import themeda_preproc.source
+
+
+(BASE_SIZE_PIX, PIXEL_SIZE_M, RESOLUTION) = (4, 25.0, 50.0)
+
+
+@pytest.mark.parametrize("source_name_str", ["tmax", "land_cover"])
+def test_get_mosaic(
+    tmp_path, monkeypatch, source_name_str, form_table, write_table, write_chiplets
+):
+    source_name = themeda_preproc.source.DataSourceName(source_name_str)
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    year = 2001
+
+    # an L-shaped arrangement, with the top-right chiplet missing
+    positions = [(0, 0), (0, 1), (1, 1)]
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=form_table(
+            positions=positions,
+            base_size_pix=BASE_SIZE_PIX,
+            pixel_size_m=PIXEL_SIZE_M,
+        ),
+    )
+
+    chiplets = (
+        (np.arange(len(positions) * BASE_SIZE_PIX**2) % 200)
+        .reshape(len(positions), BASE_SIZE_PIX, BASE_SIZE_PIX)
+        .astype(themeda_preproc.source.DATA_SOURCE_DTYPE[source_name])
+    )
+
+    chiplet_path = write_chiplets(
+        base_output_dir=tmp_path,
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        data=chiplets,
+        denan=True,
+    )
+
+    mosaic = themeda_preproc.mosaic.get_mosaic(
+        source_name=source_name,
+        roi_name=roi_name,
+        year=year,
+        base_output_dir=tmp_path,
+        resolution=RESOLUTION,
+        base_size_pix=BASE_SIZE_PIX,
+    )
+
+    assert mosaic.data.shape == (4, 4)
+    assert mosaic.data.x.values.tolist() == [25.0, 75.0, 125.0, 175.0]
+    assert mosaic.data.y.values.tolist() == [-25.0, -75.0, -125.0, -175.0]
+
+    if source_name_str == "tmax":
+        expected_first = (
+            chiplets[0].astype(np.float32).reshape(2, 2, 2, 2).mean(axis=(1, 3))
+        )
+        assert np.all(np.isnan(mosaic.data.values[:2, 2:]))
+    else:
+        expected_first = chiplets[0][1::2, 1::2]
+        assert np.all(mosaic.data.values[:2, 2:] == 255)
+
+    np.testing.assert_array_equal(mosaic.data.values[:2, :2], expected_first)
+
+    assert (mosaic.min_val, mosaic.max_val) == (
+        np.nanmin(mosaic.data.values[mosaic.data.values != 255]),
+        np.nanmax(mosaic.data.values[mosaic.data.values != 255]),
+    )
+
+    def failing_form_mosaic(*args, **kwargs):
+        raise AssertionError("The cached mosaic should have been used")
+
+    with monkeypatch.context() as patcher:
+        patcher.setattr(themeda_preproc.mosaic, "form_mosaic", failing_form_mosaic)
+
+        cached_mosaic = themeda_preproc.mosaic.get_mosaic(
+            source_name=source_name,
+            roi_name=roi_name,
+            year=year,
+            base_output_dir=tmp_path,
+            resolution=RESOLUTION,
+            base_size_pix=BASE_SIZE_PIX,
+        )
+
+    np.testing.assert_array_equal(cached_mosaic.data.values, mosaic.data.values)
+    assert (cached_mosaic.min_val, cached_mosaic.max_val) == (
+        mosaic.min_val,
+        mosaic.max_val,
+    )
+
+    # the mosaic should be formed again once its inputs change
+    stat = chiplet_path.stat()
+    os.utime(chiplet_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    with monkeypatch.context() as patcher:
+        patcher.setattr(themeda_preproc.mosaic, "form_mosaic", failing_form_mosaic)
+
+        with pytest.raises(AssertionError):
+            themeda_preproc.mosaic.get_mosaic(
+                source_name=source_name,
+                roi_name=roi_name,
+                year=year,
+                base_output_dir=tmp_path,
+                resolution=RESOLUTION,
+                base_size_pix=BASE_SIZE_PIX,
+            )
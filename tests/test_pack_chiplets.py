@@ -0,0 +1,113 @@
+import numpy as np
+
+import pytest
+
+import themeda_preproc.chiplets
+import themeda_preproc.pack_chiplets
+import themeda_preproc.roi
+import themeda_preproc.source
+
+
+def test_pack_chiplets():
+    rand = np.random.default_rng(seed=0)
+
+    chiplets = rand.integers(low=0, high=4, size=(3, 8, 12), dtype=np.uint8)
+
+    packed = themeda_preproc.chiplets.pack_chiplets(chiplets=chiplets)
+
+    assert packed.shape == (3, 8, 3)
+    assert packed.dtype == np.uint8
+
+    # the first pixel is in the lowest bits
+    assert packed[0, 0, 0] == sum(
+        int(value) << (2 * i_pix) for (i_pix, value) in enumerate(chiplets[0, 0, :4])
+    )
+
+    np.testing.assert_array_equal(
+        themeda_preproc.chiplets.unpack_chiplets(packed=packed),
+        chiplets,
+    )
+
+    chiplets[1, 2, 3] = 4
+
+    with pytest.raises(ValueError):
+        themeda_preproc.chiplets.pack_chiplets(chiplets=chiplets)
+
+    with pytest.raises(ValueError):
+        themeda_preproc.chiplets.pack_chiplets(chiplets=chiplets[..., :-1] % 4)
+
+
+def test_run(tmp_path, write_table, write_chiplets):
+    source_name = themeda_preproc.source.DataSourceName("fire_scar_early")
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    (base_size_pix, pad_size_pix, n_chiplets) = (4, 2, 5)
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=n_chiplets,
+        pad_size_pix=pad_size_pix,
+    )
+
+    rand = np.random.default_rng(seed=0)
+
+    size_pix = base_size_pix + pad_size_pix * 2
+
+    chiplets = rand.integers(
+        low=0, high=4, size=(n_chiplets, size_pix, size_pix), dtype=np.uint8
+    )
+
+    write_chiplets(
+        base_output_dir=tmp_path,
+        source_name=source_name,
+        year=2001,
+        roi_name=roi_name,
+        data=chiplets,
+        pad_size_pix=pad_size_pix,
+    )
+
+    themeda_preproc.pack_chiplets.run(
+        source_name=source_name,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=tmp_path,
+        base_size_pix=base_size_pix,
+        protect=False,
+        show_progress=False,
+    )
+
+    packed_path = themeda_preproc.chiplets.get_chiplet_path(
+        source_name=source_name,
+        year=2001,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=tmp_path,
+        packed=True,
+    )
+
+    assert packed_path.stat().st_size == chiplets.nbytes // 4
+    assert themeda_preproc.chiplets.parse_chiplet_filename(filename=packed_path).packed
+
+    with themeda_preproc.chiplets.packed_chiplets_reader(
+        source_name=source_name,
+        year=2001,
+        roi_name=roi_name,
+        pad_size_pix=pad_size_pix,
+        base_output_dir=tmp_path,
+        base_size_pix=base_size_pix,
+    ) as packed_chiplets:
+        assert len(packed_chiplets) == n_chiplets
+        assert packed_chiplets.shape == chiplets.shape
+
+        np.testing.assert_array_equal(packed_chiplets[[3, 1]], chiplets[[3, 1]])
+        np.testing.assert_array_equal(packed_chiplets[2], chiplets[2])
+
+    with pytest.raises(ValueError):
+        themeda_preproc.chiplets.get_chiplet_path(
+            source_name=themeda_preproc.source.DataSourceName("land_cover"),
+            year=2001,
+            roi_name=roi_name,
+            pad_size_pix=pad_size_pix,
+            base_output_dir=tmp_path,
+            packed=True,
+        )
@@ -0,0 +1,115 @@
+import numpy as np
+
+import pytest
+
+import themeda_preproc.chiplet_table
+import themeda_preproc.pad_chiplets
+
+
+BASE_SIZE_PIX = 4
+
+
+def get_expected_padded_chiplets(chiplets, positions, pad_size_pix, nodata):
+    "Cuts padded chiplets out of a mosaic of all the chiplets"
+
+    (i_cols, i_rows) = np.array(positions).T
+
+    mosaic = np.full(
+        shape=(
+            *chiplets.shape[1:-2],
+            (i_rows.max() + 1) * BASE_SIZE_PIX + pad_size_pix * 2,
+            (i_cols.max() + 1) * BASE_SIZE_PIX + pad_size_pix * 2,
+        ),
+        fill_value=nodata,
+        dtype=chiplets.dtype,
+    )
+
+    for chiplet, (i_col, i_row) in zip(chiplets, positions):
+        i_y = pad_size_pix + i_row * BASE_SIZE_PIX
+        i_x = pad_size_pix + i_col * BASE_SIZE_PIX
+
+        mosaic[..., i_y : i_y + BASE_SIZE_PIX, i_x : i_x + BASE_SIZE_PIX] = chiplet
+
+    padded_size_pix = BASE_SIZE_PIX + pad_size_pix * 2
+
+    return np.stack(
+        [
+            mosaic[
+                ...,
+                i_row * BASE_SIZE_PIX : i_row * BASE_SIZE_PIX + padded_size_pix,
+                i_col * BASE_SIZE_PIX : i_col * BASE_SIZE_PIX + padded_size_pix,
+            ]
+            for (i_col, i_row) in positions
+        ]
+    )
+
+
+def test_get_neighbour_indices(form_table):
+    positions = [(10, 5), (11, 5), (10, 6), (12, 7)]
+
+    neighbour_indices = themeda_preproc.chiplet_table.get_neighbour_indices(
+        lattice=themeda_preproc.chiplet_table.get_lattice(
+            table=form_table(positions=positions),
+            base_size_pix=BASE_SIZE_PIX,
+        )
+    )
+
+    assert neighbour_indices.shape == (4, 3, 3)
+
+    assert neighbour_indices[:, 1, 1].tolist() == [0, 1, 2, 3]
+
+    assert neighbour_indices[0].tolist() == [[-1, -1, -1], [-1, 0, 1], [-1, 2, -1]]
+
+    assert neighbour_indices[3].tolist() == [[-1, -1, -1], [-1, 3, -1], [-1, -1, -1]]
+
+
+@pytest.mark.parametrize("n_in_extra_dim", [0, 3])
+@pytest.mark.parametrize("pad_size_pix", [1, 4])
+def test_pad_chiplets(n_in_extra_dim, pad_size_pix, form_table):
+    # a 4 x 3 grid with a hole and a separate chiplet
+    positions = [
+        (i_col, i_row)
+        for i_row in range(3)
+        for i_col in range(4)
+        if (i_col, i_row) != (1, 1)
+    ] + [(6, 4)]
+
+    rand = np.random.default_rng(seed=0)
+
+    extra_shape = (n_in_extra_dim,) if n_in_extra_dim > 0 else ()
+
+    chiplets = rand.random(
+        size=(len(positions), *extra_shape, BASE_SIZE_PIX, BASE_SIZE_PIX)
+    ).astype(np.float32)
+
+    table = form_table(positions=positions)
+
+    neighbour_indices = themeda_preproc.chiplet_table.get_neighbour_indices(
+        lattice=themeda_preproc.chiplet_table.get_lattice(
+            table=table.sample(fraction=1.0, shuffle=True, seed=1),
+            base_size_pix=BASE_SIZE_PIX,
+        )
+    )
+
+    padded_chiplets = np.zeros(
+        shape=(len(positions), *extra_shape) + (BASE_SIZE_PIX + pad_size_pix * 2,) * 2,
+        dtype=chiplets.dtype,
+    )
+
+    themeda_preproc.pad_chiplets.pad_chiplets(
+        chiplets=chiplets,
+        padded_chiplets=padded_chiplets,
+        neighbour_indices=neighbour_indices,
+        pad_size_pix=pad_size_pix,
+        nodata=np.nan,
+        block_size=5,
+    )
+
+    expected = get_expected_padded_chiplets(
+        chiplets=chiplets,
+        positions=positions,
+        pad_size_pix=pad_size_pix,
+        nodata=np.nan,
+    )
+
+    np.testing.assert_array_equal(padded_chiplets, expected)
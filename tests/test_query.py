@@ -0,0 +1,190 @@
+import numpy as np
+
+import shapely
+
+import themeda_preproc.chiplet_table
+import themeda_preproc.query
+import themeda_preproc.roi
+import themeda_preproc.source
+
+
+(BASE_SIZE_PIX, PIXEL_SIZE_M) = (4, 25.0)
+
+
+def test_sample_year_chiplets(tmp_path, form_table, write_table, write_chiplets):
+    source_name = themeda_preproc.source.DataSourceName("tmax")
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    year = 2001
+
+    # a 3 x 2 arrangement, away from the origin, with one chiplet missing
+    positions = [(i_col, i_row) for i_row in [4, 5] for i_col in [-2, -1, 0]][:-1]
+
+    table = form_table(
+        positions=positions,
+        base_size_pix=BASE_SIZE_PIX,
+        pixel_size_m=PIXEL_SIZE_M,
+    ).sample(fraction=1.0, shuffle=True, seed=0)
+
+    write_table(base_output_dir=tmp_path, roi_name=roi_name, table=table)
+
+    chiplets = np.arange(len(positions) * BASE_SIZE_PIX**2).reshape(
+        len(positions), BASE_SIZE_PIX, BASE_SIZE_PIX
+    )
+
+    write_chiplets(
+        base_output_dir=tmp_path,
+        source_name=source_name,
+        year=year,
+        roi_name=roi_name,
+        data=chiplets,
+        denan=True,
+    )
+
+    # the reference is a mosaic, with its top-left at (-200, -400)
+    mosaic = np.full((BASE_SIZE_PIX * 2, BASE_SIZE_PIX * 3), np.nan, dtype=np.float32)
+
+    for chiplet, (i_col, i_row) in zip(chiplets, positions):
+        i_y = (i_row - 4) * BASE_SIZE_PIX
+        i_x = (i_col + 2) * BASE_SIZE_PIX
+        mosaic[i_y : i_y + BASE_SIZE_PIX, i_x : i_x + BASE_SIZE_PIX] = chiplet
+
+    rand = np.random.default_rng(seed=0)
+
+    # including some points that are outside of all the chiplets
+    x = rand.uniform(low=-250, high=150, size=500)
+    y = rand.uniform(low=-650, high=-350, size=500)
+
+    (indices, i_rows, i_cols) = themeda_preproc.chiplet_table.get_point_locations(
+        lattice=themeda_preproc.chiplet_table.get_lattice(
+            table=table,
+            base_size_pix=BASE_SIZE_PIX,
+        ),
+        x=x,
+        y=y,
+    )
+
+    values = themeda_preproc.query.sample_year_chiplets(
+        year=year,
+        source_name=source_name,
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        indices=indices,
+        i_rows=i_rows,
+        i_cols=i_cols,
+        base_size_pix=BASE_SIZE_PIX,
+    )
+
+    assert values.dtype == np.float32
+
+    i_mosaic_cols = np.floor((x + 200) / PIXEL_SIZE_M).astype(int)
+    i_mosaic_rows = np.floor((-400 - y) / PIXEL_SIZE_M).astype(int)
+
+    (n_rows, n_cols) = mosaic.shape
+
+    is_in_mosaic = (
+        (i_mosaic_cols >= 0)
+        & (i_mosaic_cols < n_cols)
+        & (i_mosaic_rows >= 0)
+        & (i_mosaic_rows < n_rows)
+    )
+
+    expected = np.full(len(x), np.nan, dtype=np.float32)
+    expected[is_in_mosaic] = mosaic[
+        i_mosaic_rows[is_in_mosaic], i_mosaic_cols[is_in_mosaic]
+    ]
+
+    np.testing.assert_array_equal(values, expected)
+
+    # make sure the test covers points in and out of the chiplets
+    assert 0 < np.sum(indices == -1) < len(x)
+
+
+def test_query_points(tmp_path, form_table, write_table, write_chiplets):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+
+    positions = [(0, 0), (1, 0)]
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=form_table(
+            positions=positions,
+            base_size_pix=BASE_SIZE_PIX,
+            pixel_size_m=PIXEL_SIZE_M,
+        ),
+    )
+
+    source_years = {
+        themeda_preproc.source.DataSourceName("tmax"): [2001, 2002],
+        themeda_preproc.source.DataSourceName("land_cover"): [2002],
+    }
+
+    for source_name, years in source_years.items():
+        for year in years:
+            chiplets = np.full(
+                (len(positions), BASE_SIZE_PIX, BASE_SIZE_PIX), year % 100
+            )
+            chiplets[1, 2, 3] = year % 100 + 1
+
+            write_chiplets(
+                base_output_dir=tmp_path,
+                source_name=source_name,
+                year=year,
+                roi_name=roi_name,
+                data=chiplets,
+                denan=True,
+            )
+
+    # the second point is in the second chiplet and the third is outside
+    data = themeda_preproc.query.query_points(
+        x=[10.0, 190.0, 500.0],
+        y=[-10.0, -60.0, -10.0],
+        source_names=list(source_years),
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        crs=3577,
+        base_size_pix=BASE_SIZE_PIX,
+    )
+
+    assert data.dims == ("source_name", "year", "point")
+    assert data.year.values.tolist() == [2001, 2002]
+
+    np.testing.assert_array_equal(
+        data.values,
+        [
+            [[1, 2, np.nan], [2, 3, np.nan]],
+            [[np.nan, np.nan, np.nan], [2, 3, np.nan]],
+        ],
+    )
+
+
+def test_get_line_points():
+    line = shapely.LineString([(0, 0), (100, 0)])
+
+    (x, y, distance) = themeda_preproc.query.get_line_points(
+        line=line,
+        crs=3577,
+        spacing_m=30,
+    )
+
+    assert x.tolist() == [0, 30, 60, 90, 100]
+    assert y.tolist() == [0] * 5
+    assert distance.tolist() == [0, 30, 60, 90, 100]
+
+
+def test_get_polygon_points():
+    polygon = shapely.box(0, -50, 60, 0)
+
+    (x, y) = themeda_preproc.query.get_polygon_points(
+        polygon=polygon,
+        crs=3577,
+        pixel_size_m=25,
+    )
+
+    # north to south, then west to east
+    assert list(zip(x, y)) == [
+        (12.5, -12.5),
+        (37.5, -12.5),
+        (12.5, -37.5),
+        (37.5, -37.5),
+    ]
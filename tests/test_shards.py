@@ -0,0 +1,235 @@
+import stat
+
+import numpy as np
+
+import polars as pl
+
+import pytest
+
+import themeda_preproc.chiplets
+import themeda_preproc.roi
+import themeda_preproc.shards
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+(BASE_SIZE_PIX, N_CHIPLETS) = (4, 11)
+
+
+def test_get_shard_indices():
+    indices = np.arange(N_CHIPLETS)
+    subset_nums = np.array([1, 2] * 5 + [1])
+
+    shard_indices = themeda_preproc.shards.get_shard_indices(
+        indices=indices,
+        subset_nums=subset_nums,
+        shard_size=4,
+        rand_seed=0,
+    )
+
+    assert [(subset_num, len(curr)) for (subset_num, curr) in shard_indices] == [
+        (1, 4),
+        (1, 2),
+        (2, 4),
+        (2, 1),
+    ]
+
+    # shuffled, but all present and within their subset
+    subset_one = np.concatenate([curr for (_, curr) in shard_indices[:2]])
+    assert subset_one.tolist() != indices[subset_nums == 1].tolist()
+
+    for subset_num, curr in shard_indices:
+        assert np.all(subset_nums[curr] == subset_num)
+
+    assert sorted(np.concatenate([curr for (_, curr) in shard_indices])) == list(
+        indices
+    )
+
+    # deterministic
+    for (_, curr), (_, repeat) in zip(
+        shard_indices,
+        themeda_preproc.shards.get_shard_indices(
+            indices=indices,
+            subset_nums=subset_nums,
+            shard_size=4,
+            rand_seed=0,
+        ),
+    ):
+        np.testing.assert_array_equal(curr, repeat)
+
+
+def test_run(tmp_path, monkeypatch, write_table, write_chiplets):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+
+    (tmax, land_cover) = (
+        themeda_preproc.source.DataSourceName(source_name_str)
+        for source_name_str in ["tmax", "land_cover"]
+    )
+
+    source_years = {tmax: [2001, 2002], land_cover: [2002]}
+
+    write_table(
+        base_output_dir=tmp_path,
+        roi_name=roi_name,
+        table=pl.DataFrame(
+            {
+                "index": np.arange(N_CHIPLETS),
+                "subset_num": [1, 2] * 5 + [1],
+            }
+        ),
+    )
+
+    for source_name, years in source_years.items():
+        for year in years:
+            write_chiplets(
+                base_output_dir=tmp_path,
+                source_name=source_name,
+                year=year,
+                roi_name=roi_name,
+                data=np.tile(
+                    (np.arange(N_CHIPLETS) + year % 100 * 10)[:, None, None],
+                    (1, BASE_SIZE_PIX, BASE_SIZE_PIX),
+                ),
+                denan=True,
+            )
+
+    # an earlier export with smaller shards, which leaves more shard files
+    for shard_size in [2, 4]:
+        themeda_preproc.shards.run(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+            source_names=[tmax, land_cover],
+            shard_size=shard_size,
+            base_size_pix=BASE_SIZE_PIX,
+            protect=False,
+            show_progress=False,
+        )
+
+    index = themeda_preproc.shards.load_shard_index(
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        pad_size_pix=0,
+    )
+
+    shard_dir = themeda_preproc.shards.get_shard_dir(
+        roi_name=roi_name,
+        base_output_dir=tmp_path,
+        pad_size_pix=0,
+    )
+
+    assert index["key"] == (shard_dir / "shard_key.txt").read_text()
+
+    assert index["sources"] == {
+        "tmax": {"years": [2001, 2002], "dtype": "float16"},
+        "land_cover": {"years": [2002], "dtype": "uint8"},
+    }
+
+    assert [shard["subset_num"] for shard in index["shards"]] == [1, 1, 2, 2]
+
+    assert sorted(path.name for path in shard_dir.glob("*.tar")) == sorted(
+        shard["filename"] for shard in index["shards"]
+    )
+
+    all_indices = []
+
+    for shard in index["shards"]:
+        records = list(
+            themeda_preproc.shards.iter_shard(shard_path=shard_dir / shard["filename"])
+        )
+
+        # in the (shuffled) order of the index
+        assert [chiplet_index for (chiplet_index, _) in records] == shard["indices"]
+
+        for chiplet_index, data in records:
+            assert data["tmax"].shape == (2, BASE_SIZE_PIX, BASE_SIZE_PIX)
+            assert data["tmax"].dtype == np.float16
+            assert data["tmax"][:, 0, 0].tolist() == [
+                chiplet_index + 10,
+                chiplet_index + 20,
+            ]
+            assert data["land_cover"][:, 0, 0].tolist() == [chiplet_index + 20]
+
+        all_indices.extend(shard["indices"])
+
+    assert sorted(all_indices) == list(range(N_CHIPLETS))
+
+    # root can write to protected paths, so check the permissions themselves
+    monkeypatch.setattr(
+        themeda_preproc.utils,
+        "is_path_existing_and_read_only",
+        lambda path: path.exists() and not path.stat().st_mode & stat.S_IWUSR,
+    )
+
+    # the second run reuses the protected export
+    for _ in range(2):
+        themeda_preproc.shards.run(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+            source_names=[tmax, land_cover],
+            shard_size=4,
+            base_size_pix=BASE_SIZE_PIX,
+            show_progress=False,
+        )
+
+    # the protected shards don't contain the same sources
+    with pytest.raises(ValueError, match="different settings"):
+        themeda_preproc.shards.run(
+            roi_name=roi_name,
+            base_output_dir=tmp_path,
+            pad_size_pix=0,
+            source_names=[tmax],
+            shard_size=4,
+            base_size_pix=BASE_SIZE_PIX,
+            show_progress=False,
+        )
+
+
+def test_write_shard(tmp_path, write_table, write_chiplets):
+    roi_name = themeda_preproc.roi.ROIName("savanna")
+    source_name = themeda_preproc.source.DataSourceName("land_cover")
+    years = [2001, 2002]
+
+    write_table(base_output_dir=tmp_path, roi_name=roi_name, table=N_CHIPLETS)
+
+    for year in years:
+        write_chiplets(
+            base_output_dir=tmp_path,
+            source_name=source_name,
+            year=year,
+            roi_name=roi_name,
+            data=np.tile(
+                (np.arange(N_CHIPLETS) + year % 100 * 10)[:, None, None],
+                (1, BASE_SIZE_PIX, BASE_SIZE_PIX),
+            ),
+            denan=True,
+        )
+
+    indices = np.array([7, 2, 9, 0, 5, 3, 10])
+
+    shard_path = tmp_path / "shard.tar"
+
+    # blocks that don't divide the chiplets evenly
+    themeda_preproc.shards.write_shard(
+        shard_path=shard_path,
+        indices=indices,
+        source_years={source_name: years},
+        roi_name=roi_name,
+        pad_size_pix=0,
+        pool=themeda_preproc.chiplets.ChipletsPool(
+            base_output_dir=tmp_path,
+            base_size_pix=BASE_SIZE_PIX,
+        ),
+        block_size=3,
+    )
+
+    records = list(themeda_preproc.shards.iter_shard(shard_path=shard_path))
+
+    assert [chiplet_index for (chiplet_index, _) in records] == indices.tolist()
+
+    for chiplet_index, data in records:
+        assert data["land_cover"][:, 0, 0].tolist() == [
+            chiplet_index + 10,
+            chiplet_index + 20,
+        ]
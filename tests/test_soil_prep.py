@@ -0,0 +1,39 @@
+import stat
+
+import pytest
+
+import themeda_preproc.soil.prep
+import themeda_preproc.source
+import themeda_preproc.utils
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    list(themeda_preproc.utils.MaterialiseStrategy),
+)
+def test_run_protect(strategy, tmp_path):
+    source_name = themeda_preproc.source.DataSourceName("soil_depth")
+
+    raw_dir = tmp_path / "raw" / source_name.value
+    raw_dir.mkdir(parents=True)
+
+    raw_path = raw_dir / "DES_000_200_EV_N_P_AU_TRN_C_20190901.tif"
+    raw_path.write_bytes(b"chip data")
+    raw_path.chmod(0o644)
+
+    themeda_preproc.soil.prep.run(
+        source_name=source_name,
+        base_output_dir=tmp_path,
+        protect=True,
+        materialise_strategy=strategy,
+    )
+
+    output_path = tmp_path / "prep" / source_name.value / "2019" / "soil_depth_2019.tif"
+
+    assert output_path.read_bytes() == raw_path.read_bytes()
+
+    # protecting the output leaves the raw file as it was
+    assert stat.S_IMODE(raw_path.stat().st_mode) == 0o644
+
+    if not output_path.samefile(raw_path):
+        assert stat.S_IMODE(output_path.stat().st_mode) == 0o440
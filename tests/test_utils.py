@@ -1,5 +1,9 @@
+import sys
+
 import pytest
 
+import requests
+
 import shapely
 
 import themeda_preproc.utils
@@ -88,3 +92,246 @@ def test_transform_shape():
     )
 
     assert backwards.equals_exact(other=example_4326, tolerance=10)
+
+
+def test_download_file(http_server, tmp_path):
+    (url, serve_dir, handler) = http_server
+
+    data = bytes(range(256)) * 40_000
+
+    (serve_dir / "data.zip").write_bytes(data)
+
+    output_path = tmp_path / "data.zip"
+    partial_path = themeda_preproc.utils.get_partial_path(path=output_path)
+
+    # interrupt the transfer part-way through
+    handler.truncate_next = len(data) // 2
+
+    with pytest.raises(requests.RequestException):
+        themeda_preproc.utils.download_file(
+            url=f"{url}/data.zip",
+            output_path=output_path,
+        )
+
+    assert not output_path.exists()
+
+    n_partial = partial_path.stat().st_size
+
+    assert 0 < n_partial <= len(data) // 2
+
+    # and then resume, which should only request the remainder
+    themeda_preproc.utils.download_file(url=f"{url}/data.zip", output_path=output_path)
+
+    assert handler.received_ranges[-1] == f"bytes={n_partial}-"
+    assert output_path.read_bytes() == data
+    assert not partial_path.exists()
+
+    # the size can also be checked against an expected value
+    with pytest.raises(ValueError):
+        themeda_preproc.utils.download_file(
+            url=f"{url}/data.zip",
+            output_path=tmp_path / "other.zip",
+            expected_size=len(data) + 1,
+        )
+
+    assert not (tmp_path / "other.zip").exists()
+
+
+def test_download_file_parallel(http_server, tmp_path):
+    (url, serve_dir, handler) = http_server
+
+    data = bytes(range(256)) * 1000
+
+    (serve_dir / "data.zip").write_bytes(data)
+
+    output_path = tmp_path / "data.zip"
+
+    # fail part-way through
+    handler.truncate_next = 100
+
+    with pytest.raises(requests.RequestException):
+        themeda_preproc.utils.download_file(
+            url=f"{url}/data.zip",
+            output_path=output_path,
+            n_parallel=4,
+            range_size=10_000,
+        )
+
+    n_requests = len(handler.received_ranges)
+
+    ranges_path = tmp_path / "data.zip.part.ranges"
+
+    # the first line is the validator of the file
+    (validator, *range_lines) = ranges_path.read_text().split("\n")
+    assert validator.startswith('"')
+
+    completed = {int(line) for line in range_lines if line}
+
+    assert completed
+
+    themeda_preproc.utils.download_file(
+        url=f"{url}/data.zip",
+        output_path=output_path,
+        n_parallel=4,
+        range_size=10_000,
+    )
+
+    assert output_path.read_bytes() == data
+
+    assert not ranges_path.exists()
+
+    # only the ranges that weren't completed should have been requested again
+    resumed_starts = [
+        int(range_header.removeprefix("bytes=").split("-")[0])
+        for range_header in handler.received_ranges[n_requests:]
+    ]
+
+    assert len(resumed_starts) == len(range(0, len(data), 10_000)) - len(completed)
+    assert not completed.intersection(resumed_starts)
+
+
+def test_download_file_changed(http_server, tmp_path):
+    (url, serve_dir, handler) = http_server
+
+    data = bytes(range(256)) * 40_000
+
+    (serve_dir / "data.zip").write_bytes(data)
+
+    output_path = tmp_path / "data.zip"
+    partial_path = themeda_preproc.utils.get_partial_path(path=output_path)
+
+    handler.truncate_next = len(data) // 2
+
+    with pytest.raises(requests.RequestException):
+        themeda_preproc.utils.download_file(
+            url=f"{url}/data.zip",
+            output_path=output_path,
+        )
+
+    assert partial_path.stat().st_size > 0
+
+    # the file changes on the server before the download is resumed
+    new_data = bytes(range(255, -1, -1)) * 40_000
+    (serve_dir / "data.zip").write_bytes(new_data)
+
+    themeda_preproc.utils.download_file(url=f"{url}/data.zip", output_path=output_path)
+
+    # a range was requested, but the whole (new) file was sent instead
+    assert handler.received_ranges[-1] is not None
+    assert output_path.read_bytes() == new_data
+
+
+def test_download_file_parallel_stale(http_server, tmp_path):
+    (url, serve_dir, handler) = http_server
+
+    data = bytes(range(256)) * 1000
+
+    (serve_dir / "data.zip").write_bytes(data)
+
+    output_path = tmp_path / "data.zip"
+    partial_path = themeda_preproc.utils.get_partial_path(path=output_path)
+    ranges_path = tmp_path / "data.zip.part.ranges"
+
+    n_ranges = len(range(0, len(data), 10_000))
+
+    # a record of completed ranges, but without the partial file that they are in
+    ranges_path.write_text("\n".join(["", "0", "10000", ""]))
+
+    themeda_preproc.utils.download_file(
+        url=f"{url}/data.zip",
+        output_path=output_path,
+        n_parallel=4,
+        range_size=10_000,
+    )
+
+    assert output_path.read_bytes() == data
+    assert len(handler.received_ranges) == n_ranges
+    assert not ranges_path.exists()
+
+    # a partial file whose ranges were received from a different version of the file
+    output_path.unlink()
+    partial_path.write_bytes(b"\x00" * len(data))
+    ranges_path.write_text("\n".join(['"stale"', "0", "10000", ""]))
+
+    themeda_preproc.utils.download_file(
+        url=f"{url}/data.zip",
+        output_path=output_path,
+        n_parallel=4,
+        range_size=10_000,
+    )
+
+    assert output_path.read_bytes() == data
+    assert len(handler.received_ranges) == n_ranges * 2
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    list(themeda_preproc.utils.MaterialiseStrategy),
+)
+def test_materialise_file(strategy, tmp_path):
+    src = tmp_path / "src.tif"
+    src.write_bytes(b"chip data")
+
+    dst = tmp_path / "dst.tif"
+
+    # an existing file should be replaced
+    dst.write_bytes(b"stale")
+
+    used_strategy = themeda_preproc.utils.materialise_file(
+        src=src,
+        dst=dst,
+        strategy=strategy,
+    )
+
+    # reflinks aren't supported on many filesystems, so may fall back to a copy
+    assert used_strategy in [strategy, themeda_preproc.utils.MaterialiseStrategy.COPY]
+
+    assert dst.read_bytes() == src.read_bytes()
+
+    assert dst.is_symlink() == (
+        used_strategy == themeda_preproc.utils.MaterialiseStrategy.SYMLINK
+    )
+
+    assert dst.samefile(src) == (
+        used_strategy
+        in [
+            themeda_preproc.utils.MaterialiseStrategy.HARDLINK,
+            themeda_preproc.utils.MaterialiseStrategy.SYMLINK,
+        ]
+    )
+
+
+def test_materialise_file_fallback(tmp_path, monkeypatch):
+    src = tmp_path / "src.tif"
+    src.write_bytes(b"chip data")
+
+    dst = tmp_path / "dst.tif"
+
+    def failing_link(src, dst):
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr(themeda_preproc.utils.os, "link", failing_link)
+
+    used_strategy = themeda_preproc.utils.materialise_file(
+        src=src,
+        dst=dst,
+        strategy=themeda_preproc.utils.MaterialiseStrategy.HARDLINK,
+    )
+
+    assert used_strategy == themeda_preproc.utils.MaterialiseStrategy.COPY
+    assert dst.read_bytes() == src.read_bytes()
+    assert not dst.samefile(src)
+
+
+def test_reflink_file_without_fcntl(tmp_path, monkeypatch):
+    src = tmp_path / "src.tif"
+    src.write_bytes(b"chip data")
+
+    dst = tmp_path / "dst.tif"
+
+    # as on platforms that don't provide the module
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+
+    themeda_preproc.utils.reflink_file(src=src, dst=dst)
+
+    assert dst.read_bytes() == src.read_bytes()